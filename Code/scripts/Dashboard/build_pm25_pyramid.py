@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Build a multi-resolution tile pyramid of one year's PM2.5 grid
+
+Instead of striding (keeping every Nth cell), every level aggregates blocks
+of source cells: level z pools 2**(levels - 1 - z) x 2**(levels - 1 - z)
+cells into their NaN-aware mean and max, so the finest level is the source
+grid and the coarsest fits in about one tile. The grid is read in bands of
+latitude rows (a multiple of the coarsest block); each band is pooled with
+reshape + sum by 2 x 2 steps, keeping per-cell sums, counts and maxima so
+the means are exact at every level.
+
+Each level is split into TILE_SIZE x TILE_SIZE tiles written as
+z{level}/{row}_{col}.bin: the mean plane then the max plane, in the uint16
+encoding of the binary grid (0.1 µg/m³ steps, 65535 = no data). Tiles
+without data are not written. index.json gives the shape, origin and step
+of every level and the tiles present; PM25DataLoader.loadPyramid() fetches
+only the tiles visible at the current zoom.
+
+Usage:
+    python build_pm25_pyramid.py
+    python build_pm25_pyramid.py --year 2015 --tile-size 256 --levels 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import netCDF4 as nc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core.fileio import write_bytes_atomic, write_json_atomic
+from extract_pm25_2022 import (BAND_ROWS, GRID_NODATA, GRID_SCALE, INPUT_FILE, YEAR, PM25Source,
+                               axis_step, clean_values, quantize)
+
+# —— Configuration ——
+OUTPUT_DIR = 'public/pm25_tiles'  # One sub-folder per year
+TILE_SIZE = 256  # Cells per tile side
+# —— end Configuration ——
+
+
+def pool2(sums, counts, maxima):
+    """2 x 2 block pooling of (sums, counts, maxima); odd edges are padded with empty cells"""
+    rows, cols = counts.shape
+    pad = ((0, rows % 2), (0, cols % 2))
+    if any(p for _, p in pad):
+        sums = np.pad(sums, pad)
+        counts = np.pad(counts, pad)
+        maxima = np.pad(maxima, pad, constant_values=-np.inf)
+    shape = (sums.shape[0] // 2, 2, sums.shape[1] // 2, 2)
+    return (sums.reshape(shape).sum(axis=(1, 3)),
+            counts.reshape(shape).sum(axis=(1, 3)),
+            maxima.reshape(shape).max(axis=(1, 3)))
+
+
+def pool_levels(values, n_levels):
+    """(mean, max) of a band at every level, finest first; empty blocks are NaN"""
+    valid = ~np.isnan(values)
+    sums = np.where(valid, values, 0.0)
+    counts = valid.astype(np.int32)
+    maxima = np.where(valid, values, -np.inf)
+    pooled = []
+    for level in range(n_levels):
+        if level:
+            sums, counts, maxima = pool2(sums, counts, maxima)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts
+        pooled.append((np.where(counts > 0, mean, np.nan), np.where(counts > 0, maxima, np.nan)))
+    return pooled
+
+
+class LevelTiler:
+    """Collects the pooled rows of one level and writes them out a row of tiles at a time"""
+
+    def __init__(self, level_dir, tile_size):
+        self.level_dir = level_dir
+        self.tile_size = tile_size
+        self.pending = []
+        self.pending_rows = 0
+        self.tile_row = 0
+        self.tiles = []
+        self.bytes = 0
+        os.makedirs(level_dir, exist_ok=True)
+
+    def add(self, mean, maxima):
+        self.pending.append((quantize(mean), quantize(maxima)))
+        self.pending_rows += len(mean)
+        while self.pending_rows >= self.tile_size:
+            self._flush(self.tile_size)
+
+    def finish(self):
+        if self.pending_rows:
+            self._flush(self.pending_rows)
+
+    def _flush(self, rows):
+        means = np.concatenate([m for m, _ in self.pending])
+        maxima = np.concatenate([x for _, x in self.pending])
+        for col, start in enumerate(range(0, means.shape[1], self.tile_size)):
+            tile_mean = means[:rows, start:start + self.tile_size]
+            if np.all(tile_mean == GRID_NODATA):
+                continue
+            tile_max = maxima[:rows, start:start + self.tile_size]
+            data = np.ascontiguousarray(tile_mean).tobytes() + np.ascontiguousarray(tile_max).tobytes()
+            write_bytes_atomic(os.path.join(self.level_dir, f"{self.tile_row}_{col}.bin"), data)
+            self.tiles.append([self.tile_row, col])
+            self.bytes += len(data)
+        self.pending = [(means[rows:], maxima[rows:])] if rows < len(means) else []
+        self.pending_rows = len(means) - rows
+        self.tile_row += 1
+
+
+def default_levels(n_lats, n_lons, tile_size):
+    """Levels down to the first whose grid fits in a tile"""
+    levels = 1
+    while max(n_lats, n_lons) > tile_size * 2 ** (levels - 1):
+        levels += 1
+    return levels
+
+
+def build_pyramid(input_file=INPUT_FILE, year=YEAR, output_dir=OUTPUT_DIR, tile_size=TILE_SIZE,
+                  levels=None, band_rows=BAND_ROWS):
+    """Write the tiles and index.json of one year under output_dir/year; returns the index"""
+    with nc.Dataset(input_file, 'r') as dataset:
+        source = PM25Source(dataset)
+        source.assume_last_step(year)
+        lats, lons = source.lats, source.lons
+        lat_step, lon_step = axis_step(lats), axis_step(lons)
+        if lat_step is None or lon_step is None:
+            raise ValueError("The pyramid needs an evenly spaced lat/lon grid")
+        levels = levels or default_levels(len(lats), len(lons), tile_size)
+        coarsest = 2 ** (levels - 1)
+        # Bands aligned on the coarsest block, so every band pools into whole cells at all levels
+        band_rows = max(coarsest, band_rows // coarsest * coarsest)
+
+        year_dir = os.path.join(output_dir, str(year))
+        # Level z = 0 is the coarsest; the finest (z = levels - 1) is the source grid
+        tilers = [LevelTiler(os.path.join(year_dir, f"z{levels - 1 - i}"), tile_size) for i in range(levels)]
+        reader = source.reader(year)
+        print(f"Pooling {len(lats)} x {len(lons)} cells into {levels} levels, bands of {band_rows} rows...")
+        for start in range(0, len(lats), band_rows):
+            values = clean_values(reader.band(start, min(start + band_rows, len(lats))))
+            for tiler, (mean, maxima) in zip(tilers, pool_levels(values, levels)):
+                tiler.add(mean, maxima)
+        for tiler in tilers:
+            tiler.finish()
+
+    index = {
+        'format': 'pm25-pyramid',
+        'version': 1,
+        'year': year,
+        'source': os.path.basename(input_file),
+        'units': 'µg/m³',
+        'dtype': 'uint16',
+        'byte_order': 'little',
+        'scale': GRID_SCALE,
+        'nodata': GRID_NODATA,
+        'planes': ['mean', 'max'],
+        'tile_size': tile_size,
+        'levels': [],
+    }
+    for i, tiler in reversed(list(enumerate(tilers))):
+        factor = 2 ** i
+        # A pooled cell sits at the centre of its source block
+        index['levels'].append({
+            'level': levels - 1 - i,
+            'factor': factor,
+            'shape': [-(-len(lats) // factor), -(-len(lons) // factor)],
+            'origin': {'lat': float(lats[0]) + (factor - 1) / 2 * lat_step,
+                       'lon': float(lons[0]) + (factor - 1) / 2 * lon_step},
+            'step': {'lat': lat_step * factor, 'lon': lon_step * factor},
+            'path': f"z{levels - 1 - i}/{{row}}_{{col}}.bin",
+            'tiles': tiler.tiles,
+        })
+        print(f"  level {levels - 1 - i}: 1/{factor} resolution, {len(tiler.tiles)} tiles, "
+              f"{tiler.bytes / 1024 / 1024:.2f} MB")
+    write_json_atomic(os.path.join(year_dir, 'index.json'), index)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a mean/max tile pyramid of the PM2.5 grid.")
+    parser.add_argument('--input', default=INPUT_FILE, help='NetCDF file (default: %(default)s)')
+    parser.add_argument('--year', type=int, default=YEAR, help='Calendar year (default: %(default)s)')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR,
+                        help='Folder for the pyramids, one sub-folder per year (default: %(default)s)')
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE, help='Cells per tile side (default: %(default)s)')
+    parser.add_argument('--levels', type=int, default=None,
+                        help='Number of levels (default: down to the first that fits in one tile)')
+    parser.add_argument('--band-rows', type=int, default=BAND_ROWS,
+                        help='Latitude rows read at a time; bounds memory use (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"File not found: {args.input}")
+    start = time.perf_counter()
+    try:
+        build_pyramid(args.input, args.year, args.output_dir, args.tile_size, args.levels, args.band_rows)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Build the stripe atlas: every city's stripe in one palette-indexed PNG
+
+The year x city matrix of V1pt6_Cities_Data_PM2pt5.csv (or of a city
+store) is classified into the 12 classes of the colour scale in one
+vectorized pass (aqs_core/stripe_raster.py) and written as a single 8-bit
+palette PNG with one row per city and one column per year; missing years
+are transparent. stripe_atlas.json maps each "City, Country" name to its
+row and gives the first year (column 0), the palette and the bounds, so a
+city's stripe is the 1-pixel-high crop at its row and the whole set is
+fetched in one cacheable request (src/StripeAtlas.js).
+
+A few thousand cities x 173 years is a PNG of tens of kilobytes. Re-run
+after a new data release; the atlas is rebuilt from scratch every time.
+
+Usage:
+    python build_stripe_atlas.py
+    python build_stripe_atlas.py --input ../air-quality-static-ui/cities_store -o public
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store, scale, stripe_raster
+from aqs_core.fileio import write_json_atomic
+
+# —— Configuration ——
+INPUT_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'  # Or a city store folder
+OUTPUT_DIR = 'public'
+ATLAS_NAME = 'stripe_atlas'  # {ATLAS_NAME}.png and {ATLAS_NAME}.json
+YEAR_COL = 'Year'
+# —— end Configuration ——
+
+ATLAS_VERSION = 1
+
+
+def read_matrix(path, year_col=YEAR_COL):
+    """(years, names, year x city matrix) of a city CSV or a city store folder"""
+    if os.path.isdir(path):
+        store = city_store.CityStore(path)
+        return store.years, store.names, store.values
+    import pandas as pd
+    frame = pd.read_csv(path)
+    names = [col for col in frame.columns if col != year_col]
+    return frame[year_col].to_numpy(), names, frame[names].to_numpy(dtype=float)
+
+
+def build_atlas(input_path, output_dir=OUTPUT_DIR, name=ATLAS_NAME):
+    """Write {name}.png and {name}.json to output_dir; returns the index"""
+    years, names, values = read_matrix(input_path)
+    if len(years) == 0 or len(names) == 0:
+        raise ValueError(f"{input_path} has no data")
+    if any(b <= a for a, b in zip(years, years[1:])):
+        raise ValueError(f"The years of {input_path} are not in increasing order")
+    indices, year_origin = stripe_raster.atlas(years, values)
+
+    os.makedirs(output_dir, exist_ok=True)
+    image = f"{name}.png"
+    stripe_raster.write_png(os.path.join(output_dir, image), indices)
+    index = {
+        'format': 'aqs-stripe-atlas',
+        'version': ATLAS_VERSION,
+        'image': image,
+        'width': indices.shape[1],
+        'height': indices.shape[0],
+        'year_origin': year_origin,  # Year of column 0; column = year - year_origin
+        'bounds': scale.BOUNDS,
+        'palette': stripe_raster.PALETTE[:stripe_raster.NAN_INDEX].tolist(),
+        'nodata_index': stripe_raster.NAN_INDEX,
+        'rows': {city: row for row, city in enumerate(names)},
+    }
+    write_json_atomic(os.path.join(output_dir, f"{name}.json"), index)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the stripe atlas of every city.")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help='City CSV or city store folder (default: %(default)s)')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR, help='Output folder (default: %(default)s)')
+    parser.add_argument('--name', default=ATLAS_NAME, help='Base name of the files (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"File not found: {args.input}")
+    start = time.perf_counter()
+    try:
+        index = build_atlas(args.input, args.output_dir, args.name)
+    except ValueError as e:
+        parser.error(str(e))
+    size = os.path.getsize(os.path.join(args.output_dir, index['image']))
+    print(f"{index['height']} cities x {index['width']} years ({index['year_origin']}-"
+          f"{index['year_origin'] + index['width'] - 1}) -> {index['image']} ({size / 1024:.0f} KB) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
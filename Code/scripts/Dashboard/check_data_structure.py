@@ -1,77 +1,470 @@
 #!/usr/bin/env python3
 """
 Script to check PM2.5 data structure
+
+Validates the map exports of extract_pm25_2022.py in one pass with constant
+memory, whatever their size:
+- the JSON point list is streamed: the top-level keys before "data"
+  (metadata, coordinates) are decoded one by one and the points a block at
+  a time; a file whose data array comes before the coordinates is loaded
+  in full instead
+- the binary grid (pm25_2022_grid.json + .bin) is read a band of rows at a
+  time
+
+Statistics are accumulated with NumPy per block. Besides printing the
+structure, it checks that the coordinates agree with metadata.grid_size and
+the ranges, that every point sits on the grid once (no duplicates), and that
+values are finite and within [0, MAX_PLAUSIBLE].
+
+Usage:
+    python check_data_structure.py
+    python check_data_structure.py public/pm25_2022_grid.json public/pm25_2022_data.json
 """
 
+import argparse
 import json
+import os
+import re
 import sys
 
-def check_data_structure():
-    """Check the structure of PM2.5 data"""
-    
+import numpy as np
+
+# —— Configuration ——
+DATA_FILES = ['public/pm25_2022_grid.json', 'public/pm25_2022_data.json']  # Checked when present
+MAX_PLAUSIBLE = 1000.0  # µg/m³; anything above is reported as out of range
+READ_BYTES = 4 * 1024 * 1024  # JSON text decoded per block
+GRID_ROWS = 256  # Binary grid rows read per block
+COORD_TOLERANCE = 1e-6  # Degrees between a point and its grid coordinate
+# —— end Configuration ——
+
+POINTS_PER_BLOCK = 100000  # Points per block when the file is loaded in full
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'\s*')
+
+
+class Accumulator:
+    """Count, sum, sum of squares, min and max of a stream of arrays"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.squares += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    @property
+    def std(self):
+        if not self.count:
+            return float('nan')
+        return float(np.sqrt(max(self.squares / self.count - self.mean ** 2, 0.0)))
+
+
+class Report:
+    """Check results: errors fail the validation, warnings are only printed"""
+
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def check(self, ok, message, warning=False):
+        if not ok:
+            (self.warnings if warning else self.errors).append(message)
+        return ok
+
+
+def axis_index(coords, values):
+    """Position of each value on a coordinate axis, -1 where it is not a grid coordinate"""
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return np.full(len(values), -1)
+    order = np.argsort(coords, kind='stable')
+    sorted_coords = coords[order]
+    pos = np.clip(np.searchsorted(sorted_coords, values), 1, max(len(coords) - 1, 1))
+    left = sorted_coords[pos - 1]
+    right = sorted_coords[np.minimum(pos, len(coords) - 1)]
+    nearest = np.where(np.abs(values - left) <= np.abs(values - right), pos - 1, pos)
+    nearest = np.minimum(nearest, len(coords) - 1)
+    on_grid = np.abs(sorted_coords[nearest] - values) <= COORD_TOLERANCE
+    return np.where(on_grid, order[nearest], -1)
+
+
+def check_metadata(header, n_lats, n_lons, lat_range, lon_range, report):
+    metadata = header.get('metadata', {})
+    report.check('metadata' in header, "No metadata", warning=True)
+    if 'grid_size' in metadata:
+        report.check(list(metadata['grid_size']) == [n_lats, n_lons],
+                     f"metadata.grid_size {metadata['grid_size']} does not match the {n_lats} x {n_lons} coordinates")
+    for key, actual in (('lat_range', lat_range), ('lon_range', lon_range)):
+        if key in metadata and actual is not None:
+            report.check(np.allclose(metadata[key], actual, atol=1e-6),
+                         f"metadata.{key} {metadata[key]} does not match the coordinates {actual}")
+
+
+def print_header(header):
+    print(f"Top-level keys: {list(header.keys())}")
+
+    # Check metadata
+    if 'metadata' in header:
+        print("\n--- Metadata ---")
+        for key, value in header['metadata'].items():
+            print(f"{key}: {value}")
+
+
+class JSONReader:
+    """JSON text of a file read a block at a time, decoded value by value"""
+
+    def __init__(self, f):
+        self.f = f
+        self.text = ''
+        self.pos = 0
+
+    def _more(self):
+        block = self.f.read(READ_BYTES)
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        return bool(block)
+
+    def peek(self):
+        """Next non-whitespace character, '' at the end of the file"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self._more():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, chars, what):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected {what}, found {char or 'the end of the file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+                # A number may go on in the next block
+                if end < len(self.text) or not self._more():
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+
+    def rest(self):
+        return self.text[self.pos:]
+
+
+def read_header(f):
+    """
+    Decode the top-level keys of a JSON object up to its "data" key. Returns
+    (header, data), data being the text after the '[' of the data array, or
+    None when the object has no data key.
+    """
+    reader = JSONReader(f)
+    header = {}
+    reader.expect('{', 'a JSON object')
+    if reader.peek() == '}':
+        return header, None
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise ValueError(f"Expected a key, found {key!r}")
+        reader.expect(':', f"':' after {key!r}")
+        if key == 'data':
+            reader.expect('[', 'the data array')
+            return header, reader.rest()
+        header[key] = reader.value()
+        if reader.expect(',}', "',' or '}'") == '}':
+            return header, None
+
+
+def iter_json_points(f, report):
+    """
+    Parse the header of a pm25 JSON export and yield its points as
+    (n, 3) lat/lon/value arrays, one block at a time
+    """
+    header, text = read_header(f)
+    if text is None:
+        raise ValueError('No "data" array found')
+    if 'coordinates' not in header:
+        # The points come before the coordinates needed to check them
+        report.check(False, "The data array comes before the coordinates: file loaded in full", warning=True)
+        f.seek(0)
+        header = json.load(f)
+        points, header['data'] = header['data'], []
+        if not isinstance(points, list):
+            raise ValueError('"data" is not an array')
+        yield header
+        for start in range(0, len(points), POINTS_PER_BLOCK):
+            yield points_array(points[start:start + POINTS_PER_BLOCK], report)
+        return
+    header['data'] = []
+    yield header
+
+    while True:
+        # Points are flat objects, so the first ']' closes the array
+        close = text.find(']')
+        if close >= 0:
+            head, tail = text[:close], text[close + 1:] + f.read()
+        else:
+            block = f.read(READ_BYTES)
+            if not block and text.rfind('}') < 0:
+                raise ValueError("The data array is not closed")
+            # Everything up to the last '}' is a run of whole points
+            end = text.rfind('}')
+            if end < 0:
+                text += block
+                continue
+            head, text = text[:end + 1], text[end + 1:] + block
+        head = head.strip().lstrip(',').strip()
+        if head:
+            yield points_array(json.loads(f"[{head}]"), report)
+        if close >= 0:
+            tail = tail.strip()
+            report.check(tail == '}' or tail.startswith(','), f"Unexpected text after the data array: {tail[:40]!r}")
+            return
+
+
+def points_array(points, report):
+    """(n, 3) lat/lon/value array of a list of point dicts; malformed points become NaN rows"""
     try:
-        with open('public/pm25_2022_data.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        print("=== PM2.5 Data Structure Analysis ===")
-        print(f"Top-level keys: {list(data.keys())}")
-        
-        # Check metadata
-        if 'metadata' in data:
-            print("\n--- Metadata ---")
-            for key, value in data['metadata'].items():
-                print(f"{key}: {value}")
-        
+        return np.array([(p['lat'], p['lon'], p['value']) for p in points], dtype=np.float64).reshape(-1, 3)
+    except (KeyError, TypeError, ValueError):
+        rows = []
+        for p in points:
+            ok = isinstance(p, dict) and all(isinstance(p.get(k), (int, float)) for k in ('lat', 'lon', 'value'))
+            report.check(ok, f"Malformed data point: {str(p)[:80]}")
+            rows.append((p['lat'], p['lon'], p['value']) if ok else (np.nan, np.nan, np.nan))
+        return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def check_json(path, report):
+    with open(path, 'r', encoding='utf-8') as f:
+        blocks = iter_json_points(f, report)
+        header = next(blocks)
+        print_header(header)
+
         # Check coordinates
-        if 'coordinates' in data:
-            print("\n--- Coordinate Information ---")
-            if 'lats' in data['coordinates']:
-                lats = data['coordinates']['lats']
-                print(f"Number of latitudes: {len(lats)}")
-                print(f"Latitude range: {min(lats):.2f} to {max(lats):.2f}")
-            
-            if 'lons' in data['coordinates']:
-                lons = data['coordinates']['lons']
-                print(f"Number of longitudes: {len(lons)}")
-                print(f"Longitude range: {min(lons):.2f} to {max(lons):.2f}")
-        
-        # Check data
-        if 'data' in data:
-            print("\n--- Data Point Information ---")
-            data_points = data['data']
-            print(f"Total number of data points: {len(data_points)}")
-            
-            if len(data_points) > 0:
-                print(f"Data point structure: {list(data_points[0].keys())}")
-                print("\nFirst 5 data points example:")
-                for i, point in enumerate(data_points[:5]):
-                    print(f"  {i+1}: lat={point['lat']:.2f}, lon={point['lon']:.2f}, value={point['value']:.2f}")
-                
-                # Calculate data distribution statistics
-                values = [point['value'] for point in data_points]
-                print(f"\nPM2.5 Value Statistics:")
-                print(f"  Minimum: {min(values):.2f}")
-                print(f"  Maximum: {max(values):.2f}")
-                print(f"  Average: {sum(values)/len(values):.2f}")
-                
-                # Check geographical distribution
-                lats = [point['lat'] for point in data_points]
-                lons = [point['lon'] for point in data_points]
-                print(f"\nActual Data Geographical Distribution:")
-                print(f"  Latitude range: {min(lats):.2f} to {max(lats):.2f}")
-                print(f"  Longitude range: {min(lons):.2f} to {max(lons):.2f}")
-        
-        print("\n=== Data Unit Description ===")
-        print("This data represents global PM2.5 concentration on a grid basis, not by country or city.")
-        print("Each data point represents the PM2.5 concentration (unit: µg/m³) at a latitude-longitude grid point.")
-        print("When coloring the map, the PM2.5 value is obtained by finding the nearest grid point for each geographical location.")
-        
-        return True
-        
+        coords = header.get('coordinates', {})
+        lats = np.asarray(coords.get('lats', []), dtype=np.float64)
+        lons = np.asarray(coords.get('lons', []), dtype=np.float64)
+        report.check(len(lats) and len(lons), "coordinates.lats / coordinates.lons missing or empty")
+        print("\n--- Coordinate Information ---")
+        print(f"Number of latitudes: {len(lats)}")
+        print(f"Number of longitudes: {len(lons)}")
+        lat_range = [float(lats.min()), float(lats.max())] if len(lats) else None
+        lon_range = [float(lons.min()), float(lons.max())] if len(lons) else None
+        if lat_range and lon_range:
+            print(f"Latitude range: {lat_range[0]:.2f} to {lat_range[1]:.2f}")
+            print(f"Longitude range: {lon_range[0]:.2f} to {lon_range[1]:.2f}")
+        check_metadata(header, len(lats), len(lons), lat_range, lon_range, report)
+
+        # One pass over the points
+        values, point_lats, point_lons = Accumulator(), Accumulator(), Accumulator()
+        occupied = np.zeros((len(lats), len(lons)), dtype=bool)
+        counts = {'off_grid': 0, 'duplicates': 0, 'non_finite': 0, 'negative': 0, 'too_high': 0}
+        examples = []
+        for block in blocks:
+            if len(examples) < 5:
+                examples.extend(block[:5 - len(examples)].tolist())
+            finite = np.isfinite(block).all(axis=1)
+            counts['non_finite'] += int((~finite).sum())
+            block = block[finite]
+            values.add(block[:, 2])
+            point_lats.add(block[:, 0])
+            point_lons.add(block[:, 1])
+            counts['negative'] += int((block[:, 2] < 0).sum())
+            counts['too_high'] += int((block[:, 2] > MAX_PLAUSIBLE).sum())
+
+            i, j = axis_index(lats, block[:, 0]), axis_index(lons, block[:, 1])
+            on_grid = (i >= 0) & (j >= 0)
+            counts['off_grid'] += int((~on_grid).sum())
+            cells = i[on_grid] * len(lons) + j[on_grid]
+            unique_cells = np.unique(cells)
+            flat = occupied.reshape(-1)
+            counts['duplicates'] += len(cells) - len(unique_cells) + int(flat[unique_cells].sum())
+            flat[unique_cells] = True
+
+    # Check data
+    print("\n--- Data Point Information ---")
+    print(f"Total number of data points: {values.count + counts['non_finite']}")
+    if examples:
+        print("Data point structure: ['lat', 'lon', 'value']")
+        print("\nFirst 5 data points example:")
+        for n, (lat, lon, value) in enumerate(examples):
+            print(f"  {n + 1}: lat={lat:.2f}, lon={lon:.2f}, value={value:.2f}")
+    print_value_stats(values)
+    if point_lats.count:
+        # Check geographical distribution
+        print(f"\nActual Data Geographical Distribution:")
+        print(f"  Latitude range: {point_lats.min:.2f} to {point_lats.max:.2f}")
+        print(f"  Longitude range: {point_lons.min:.2f} to {point_lons.max:.2f}")
+        if occupied.size:
+            print(f"  Grid cells with data: {int(occupied.sum())} / {occupied.size} ({occupied.mean():.1%})")
+
+    report.check(values.count > 0, "No valid data points")
+    report.check(counts['non_finite'] == 0, f"{counts['non_finite']} points with missing or non-finite numbers")
+    report.check(counts['off_grid'] == 0, f"{counts['off_grid']} points not on the coordinate grid")
+    report.check(counts['duplicates'] == 0, f"{counts['duplicates']} duplicate points")
+    report.check(counts['negative'] == 0, f"{counts['negative']} negative values")
+    report.check(counts['too_high'] == 0, f"{counts['too_high']} values above {MAX_PLAUSIBLE:g} µg/m³")
+
+
+def check_grid(path, header, report):
+    print_header(header)
+    shape = header.get('shape', [0, 0])
+    n_lats, n_lons = shape
+    origin, step = header.get('origin', {}), header.get('step', {})
+    nodata, scale = header.get('nodata'), header.get('scale')
+
+    print("\n--- Grid Information ---")
+    print(f"Shape: {n_lats} x {n_lons}, {header.get('dtype')} ({header.get('byte_order')}-endian), "
+          f"scale {scale}, nodata {nodata}")
+    report.check(header.get('dtype') == 'uint16' and header.get('byte_order') == 'little',
+                 f"Unsupported dtype {header.get('dtype')} / {header.get('byte_order')}")
+    report.check(nodata is not None and scale, "scale / nodata missing")
+
+    def axis(key, n, listed):
+        if listed in header:
+            coords = np.asarray(header[listed], dtype=np.float64)
+            report.check(len(coords) == n, f"{len(coords)} {listed} for {n} grid rows/columns")
+            return coords
+        if step.get(key) is None or key not in origin:
+            report.check(False, f"No origin/step for {key}")
+            return np.zeros(0)
+        return origin[key] + step[key] * np.arange(n)
+
+    lats, lons = axis('lat', n_lats, 'lats'), axis('lon', n_lons, 'lons')
+    lat_range = [float(lats.min()), float(lats.max())] if len(lats) else None
+    lon_range = [float(lons.min()), float(lons.max())] if len(lons) else None
+    if lat_range and lon_range:
+        print(f"Latitude range: {lat_range[0]:.2f} to {lat_range[1]:.2f}")
+        print(f"Longitude range: {lon_range[0]:.2f} to {lon_range[1]:.2f}")
+    check_metadata(header, n_lats, n_lons, lat_range, lon_range, report)
+
+    data_path = os.path.join(os.path.dirname(path), header.get('data', ''))
+    if not report.check(os.path.isfile(data_path), f"Grid data {data_path} not found"):
+        return
+    expected = n_lats * n_lons * 2
+    size = os.path.getsize(data_path)
+    if not report.check(size == expected, f"{data_path} has {size} bytes, expected {expected}"):
+        return
+    for method, name in header.get('encodings', {}).items():
+        report.check(os.path.isfile(os.path.join(os.path.dirname(path), name)),
+                     f"{method} copy {name} listed but missing", warning=True)
+
+    # One pass over the rows
+    values = Accumulator()
+    valid_lats = Accumulator()
+    saturated = 0
+    occupied_cols = np.zeros(n_lons, dtype=bool)
+    grid = np.memmap(data_path, dtype='<u2', mode='r', shape=(n_lats, n_lons))
+    for start in range(0, n_lats, GRID_ROWS):
+        band = np.asarray(grid[start:start + GRID_ROWS])
+        valid = band != nodata
+        values.add(band[valid].astype(np.float64) * scale)
+        saturated += int((band == nodata - 1).sum())
+        rows_with_data = valid.any(axis=1)
+        valid_lats.add(lats[start:start + len(band)][rows_with_data])
+        occupied_cols |= valid.any(axis=0)
+    del grid
+
+    print("\n--- Data Point Information ---")
+    print(f"Grid cells with data: {values.count} / {n_lats * n_lons} "
+          f"({values.count / max(n_lats * n_lons, 1):.1%})")
+    print_value_stats(values)
+    if values.count:
+        print(f"\nActual Data Geographical Distribution:")
+        print(f"  Latitude range: {valid_lats.min:.2f} to {valid_lats.max:.2f}")
+        print(f"  Longitude range: {lons[occupied_cols].min():.2f} to {lons[occupied_cols].max():.2f}")
+
+    report.check(values.count > 0, "No valid grid cells")
+    report.check(saturated == 0, f"{saturated} cells at the top of the uint16 range (clipped values)", warning=True)
+    report.check(values.max <= MAX_PLAUSIBLE if values.count else True,
+                 f"Values up to {values.max:.1f} µg/m³, above {MAX_PLAUSIBLE:g}")
+
+
+def print_value_stats(values):
+    if not values.count:
+        return
+    # Calculate data distribution statistics
+    print(f"\nPM2.5 Value Statistics:")
+    print(f"  Minimum: {values.min:.2f}")
+    print(f"  Maximum: {values.max:.2f}")
+    print(f"  Average: {values.mean:.2f}")
+    print(f"  Standard deviation: {values.std:.2f}")
+
+
+def read_grid_header(path):
+    """The header of a binary grid export, or None for a JSON point list"""
+    if os.path.getsize(path) > READ_BYTES:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    return header if header.get('format') == 'pm25-grid' else None
+
+
+def check_data_structure(path='public/pm25_2022_data.json'):
+    """Check the structure of PM2.5 data"""
+
+    report = Report()
+    try:
+        print(f"=== PM2.5 Data Structure Analysis: {path} ===")
+        header = read_grid_header(path)
+        if header is not None:
+            check_grid(path, header, report)
+        else:
+            check_json(path, report)
     except Exception as e:
-        print(f"Error: {e}")
-        return False
+        report.check(False, f"{type(e).__name__}: {e}")
+
+    print("\n=== Data Unit Description ===")
+    print("This data represents global PM2.5 concentration on a grid basis, not by country or city.")
+    print("Each data point represents the PM2.5 concentration (unit: µg/m³) at a latitude-longitude grid point.")
+    print("When coloring the map, the PM2.5 value is obtained by finding the nearest grid point for each geographical location.")
+
+    print("\n=== Checks ===")
+    for message in report.warnings:
+        print(f"  [warning] {message}")
+    for message in report.errors:
+        print(f"  [error] {message}")
+    if not report.errors:
+        print("  All checks passed")
+    return not report.errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate PM2.5 map exports (JSON point list or binary grid).")
+    parser.add_argument('paths', nargs='*',
+                        help=f"Files to check (default: those of {', '.join(DATA_FILES)} that exist)")
+    args = parser.parse_args(argv)
+    paths = args.paths or [p for p in DATA_FILES if os.path.exists(p)]
+    if not paths:
+        parser.error(f"None of {', '.join(DATA_FILES)} found")
+
+    ok = True
+    for path in paths:
+        ok = check_data_structure(path) and ok
+        print()
+    return ok
+
 
 if __name__ == "__main__":
-    success = check_data_structure()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    success = main()
+    sys.exit(0 if success else 1)
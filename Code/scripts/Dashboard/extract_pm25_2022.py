@@ -2,184 +2,498 @@
 """
 Script to extract PM2.5 data for 2022
 Extract PM2.5 data for 2022 from concat_weighted_output.nc file and save as lightweight JSON format
+
+The grid is streamed in bands of latitude rows: each band is read from the
+NetCDF file, cleaned as a float array (invalid cells become NaN), downsampled
+and appended to the output file, so memory use depends on the band size and
+not on the grid resolution. The year is found by decoding the time variable
+to calendar years (steps of a year are averaged for sub-annual data); files
+without usable time units fall back to taking the last step as 2022.
+
+Two output formats, both read by PM25DataLoader.js:
+- json: the sparse list of {lat, lon, value} points (pm25_2022_data.json)
+- grid: a dense row-major uint16 grid in 0.1 µg/m³ steps with a nodata
+  sentinel (pm25_2022_grid.bin), described by a small JSON header with the
+  origin, step and shape (pm25_2022_grid.json); optionally precompressed
+  as .bin.gz / .bin.br for static hosting
 """
 
-import netCDF4 as nc
-import numpy as np
+import argparse
+import gzip
 import json
-import sys
 import os
+import re
+import shutil
+import sys
+import warnings
 
-def extract_pm25_2022():
-    """Extract PM2.5 data for 2022"""
-    
-    # Input and output file paths
-    input_file = 'public/concat_weighted_output.nc'
-    output_file = 'public/pm25_2022_data.json'
-    
-    if not os.path.exists(input_file):
-        print(f"Error: File not found {input_file}")
-        return False
-    
-    try:
-        print("Reading NetCDF file...")
-        dataset = nc.Dataset(input_file, 'r')
-        
+import netCDF4 as nc
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # Optional: only needed for --compress brotli
+    brotli = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import trace
+from aqs_core.fileio import replace_atomic, write_json_atomic
+
+# —— Configuration ——
+INPUT_FILE = 'public/concat_weighted_output.nc'
+OUTPUT_FILE = 'public/pm25_2022_data.json'
+GRID_HEADER_FILE = 'public/pm25_2022_grid.json'  # The grid itself goes next to it, as .bin
+YEAR = 2022  # Calendar year to extract, matched against the decoded time variable
+DOWNSAMPLE_FACTOR = 4  # Keep every Nth latitude and longitude; 1 keeps the full grid
+BAND_ROWS = 256  # Latitude rows read from the NetCDF file at a time
+GRID_SCALE = 0.1  # µg/m³ per grid unit
+GRID_NODATA = 65535  # uint16 value of cells without data
+# —— end Configuration ——
+
+# One data point, laid out as json.dump(indent=2) writes it
+POINT_TEMPLATE = '    {\n      "lat": %r,\n      "lon": %r,\n      "value": %r\n    }'
+
+
+def find_variable(dataset, candidates):
+    for var_name in candidates:
+        if var_name in dataset.variables:
+            return var_name
+    return None
+
+
+def clean_values(band):
+    """Float copy of a band with missing, non-finite and negative values set to NaN"""
+    values = np.ma.filled(np.ma.asarray(band, dtype=np.float64), np.nan)
+    with np.errstate(invalid='ignore'):
+        values[~np.isfinite(values) | (values < 0)] = np.nan
+    return values
+
+
+def decode_years(time_variable):
+    """
+    Calendar year of every time step, or None when the time variable cannot
+    be decoded. Handles CF units ("days since ...", also "months/years
+    since ...", which cftime only accepts for 360-day calendars) and plain
+    year numbers without units.
+    """
+    values = np.ma.filled(np.ma.asarray(time_variable[:], dtype=np.float64), np.nan)
+    if np.isnan(values).any():
+        return None
+    units = getattr(time_variable, 'units', '') or ''
+    match = re.match(r'\s*(\w+)\s+since\s+(-?\d+)(?:-(\d+))?', units)
+    if match and match.group(1).lower() in ('year', 'years', 'common_year', 'common_years'):
+        return (int(match.group(2)) + np.floor(values)).astype(int)
+    if match and match.group(1).lower() in ('month', 'months'):
+        months = int(match.group(2)) * 12 + int(match.group(3) or 1) - 1 + np.floor(values)
+        return (months // 12).astype(int)
+    if match:
+        calendar = getattr(time_variable, 'calendar', 'standard')
+        return np.array([d.year for d in nc.num2date(values, units, calendar)], dtype=int)
+    if np.all(values == np.round(values)) and np.all((values >= 1000) & (values <= 3000)):
+        return values.astype(int)
+    return None
+
+
+class GridReader:
+    """
+    Reads the PM2.5 variable band by band as (lat, lon) arrays, whatever its
+    dimension order. time_index may list several time steps (e.g. the months
+    of a year); the band is then their mean over the valid values.
+    """
+
+    def __init__(self, variable, lat_dim, lon_dim, time_dim=None, time_index=None):
+        self.variable = variable
+        self.lat_dim = lat_dim
+        self.lon_dim = lon_dim
+        self.time_dim = time_dim
+        self.time_index = time_index
+        dims = variable.dimensions
+        if lat_dim not in dims or lon_dim not in dims:
+            raise ValueError(f"PM2.5 dimensions {dims} do not include {lat_dim} and {lon_dim}")
+        extra = [d for d in dims if d not in (lat_dim, lon_dim, time_dim)]
+        if extra or (time_dim in dims) != (time_index is not None):
+            raise ValueError(f"Data dimensions do not match expectations: {dims}")
+
+    def band(self, start, stop):
+        steps = np.atleast_1d(self.time_index) if self.time_index is not None else None
+        index = []
+        for dim in self.variable.dimensions:
+            if dim == self.lat_dim:
+                index.append(slice(start, stop))
+            elif dim == self.lon_dim:
+                index.append(slice(None))
+            elif len(steps) == 1:
+                index.append(int(steps[0]))
+            else:
+                index.append(slice(int(steps.min()), int(steps.max()) + 1))
+        data = self.variable[tuple(index)]
+        kept = [d for d in self.variable.dimensions if d in (self.lat_dim, self.lon_dim, self.time_dim)]
+        if steps is not None and len(steps) > 1:
+            # Time axis first, keeping only the requested steps of the slice read
+            data = np.moveaxis(clean_values(data), kept.index(self.time_dim), 0)[steps - steps.min()]
+            kept.remove(self.time_dim)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN cells stay NaN
+                data = np.nanmean(data, axis=0)
+        elif self.time_dim in kept:
+            kept.remove(self.time_dim)
+        if kept[0] != self.lat_dim:
+            data = np.ma.swapaxes(data, 0, 1)
+        return data
+
+
+def iter_bands(reader, n_lats, lon_indices, downsample_factor, band_rows, stats):
+    """
+    Yield (row indices, downsampled values) for every band of latitude rows,
+    accumulating the full-resolution statistics in stats on the way
+    """
+    lat_indices = np.arange(0, n_lats, downsample_factor)
+    for start in range(0, n_lats, band_rows):
+        stop = min(start + band_rows, n_lats)
+        with trace.timer('netcdf read'):
+            values = clean_values(reader.band(start, stop))
+
+        # Statistics over the full-resolution band
+        valid = ~np.isnan(values)
+        n_valid = int(valid.sum())
+        stats['cells'] += values.size
+        stats['valid'] += n_valid
+        if n_valid:
+            stats['min'] = min(stats['min'], float(np.min(values[valid])))
+            stats['max'] = max(stats['max'], float(np.max(values[valid])))
+
+        rows = lat_indices[(lat_indices >= start) & (lat_indices < stop)]
+        if len(rows):
+            yield rows, values[np.ix_(rows - start, lon_indices)]
+
+
+def write_grid_json(f, bands, lats, lons_sampled):
+    """Stream the valid points of every band to f as sparse JSON entries; returns the number written"""
+    lons_sampled = lons_sampled.tolist()
+    written = 0
+    for rows, sampled in bands:
+        # Valid cells only, in row-major order
+        row_pos, col_pos = np.nonzero(~np.isnan(sampled))
+        if len(row_pos) == 0:
+            continue
+        band_lats = lats[rows].tolist()
+        points = [POINT_TEMPLATE % (band_lats[i], lons_sampled[j], v)
+                  for i, j, v in zip(row_pos.tolist(), col_pos.tolist(), sampled[row_pos, col_pos].tolist())]
+        f.write(((',\n' if written else '\n') + ',\n'.join(points)).encode('utf-8'))
+        written += len(points)
+    return written
+
+
+def quantize(values):
+    """uint16 grid units (GRID_SCALE each); NaN becomes GRID_NODATA, values above the range saturate"""
+    units = np.rint(np.nan_to_num(values, nan=0.0) / GRID_SCALE)
+    grid = np.minimum(units, GRID_NODATA - 1).astype('<u2')
+    grid[np.isnan(values)] = GRID_NODATA
+    return grid
+
+
+def write_grid_binary(f, bands):
+    """Stream every band to f as little-endian uint16 rows; returns the number of valid cells"""
+    written = 0
+    for _, sampled in bands:
+        f.write(quantize(sampled).tobytes())
+        written += int(np.count_nonzero(~np.isnan(sampled)))
+    return written
+
+
+def axis_step(coords):
+    """Spacing of an evenly spaced axis, or None if it is irregular"""
+    if len(coords) < 2:
+        return 0.0
+    coords = coords.astype(np.float64)
+    step = (coords[-1] - coords[0]) / (len(coords) - 1)
+    # Tolerates the rounding of float32 coordinates, not real gaps
+    if np.allclose(coords, coords[0] + step * np.arange(len(coords)), rtol=0, atol=abs(step) * 1e-3):
+        return float(step)
+    return None
+
+
+def grid_header(lats_sampled, lons_sampled, data_file, encodings, metadata):
+    """JSON header of a binary grid: cell (i, j) is at origin + (i, j) * step"""
+    header = {
+        'format': 'pm25-grid',
+        'version': 1,
+        'dtype': 'uint16',
+        'byte_order': 'little',
+        'scale': GRID_SCALE,
+        'nodata': GRID_NODATA,
+        'shape': [len(lats_sampled), len(lons_sampled)],
+        'origin': {'lat': float(lats_sampled[0]), 'lon': float(lons_sampled[0])},
+        'step': {'lat': axis_step(lats_sampled), 'lon': axis_step(lons_sampled)},
+        'data': data_file,
+        'encodings': encodings,
+        'metadata': metadata,
+    }
+    # Irregular axes are listed in full; lookups then search the coordinate arrays
+    if header['step']['lat'] is None:
+        header['lats'] = lats_sampled.tolist()
+    if header['step']['lon'] is None:
+        header['lons'] = lons_sampled.tolist()
+    return header
+
+
+def can_compress(method):
+    """Whether precompress can write copies with method here (brotli is optional)"""
+    return method != 'brotli' or brotli is not None
+
+
+def precompress(path, methods):
+    """Write path.gz / path.br next to a finished file; returns {method: file name}"""
+    written = {}
+    for method in methods:
+        if method == 'gzip':
+            target = f"{path}.gz"
+            with open(path, 'rb') as src:
+                replace_atomic(target, lambda f: _gzip_copy(src, f))
+        elif method == 'brotli':
+            if brotli is None:
+                print("Warning: brotli is not installed (pip install brotli); skipping .br")
+                continue
+            target = f"{path}.br"
+            with open(path, 'rb') as src:
+                replace_atomic(target, lambda f: _brotli_copy(src, f))
+        else:
+            raise ValueError(f"Unknown compression: {method}")
+        written[method] = os.path.basename(target)
+        print(f"  {method}: {os.path.getsize(target) / 1024 / 1024:.2f} MB")
+    return written
+
+
+def _gzip_copy(src, f):
+    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+        shutil.copyfileobj(src, gz, 1 << 20)
+
+
+def _brotli_copy(src, f):
+    compressor = brotli.Compressor(quality=11)
+    for chunk in iter(lambda: src.read(1 << 20), b''):
+        f.write(compressor.process(chunk))
+    f.write(compressor.finish())
+
+
+class PM25Source:
+    """Coordinates, PM2.5 variable and decoded time steps of an open NetCDF dataset"""
+
+    def __init__(self, dataset, log=print):
         # Print file information
-        print("File variables:", list(dataset.variables.keys()))
-        print("File dimensions:", list(dataset.dimensions.keys()))
-        
+        log("File variables:", list(dataset.variables.keys()))
+        log("File dimensions:", list(dataset.dimensions.keys()))
+
         # Try to find coordinate variables
-        lat_var = None
-        lon_var = None
-        pm25_var = None
-        time_var = None
-        
-        # Find latitude variable
-        for var_name in ['lat', 'latitude', 'y']:
-            if var_name in dataset.variables:
-                lat_var = var_name
-                break
-        
-        # Find longitude variable
-        for var_name in ['lon', 'longitude', 'x']:
-            if var_name in dataset.variables:
-                lon_var = var_name
-                break
-        
-        # Find PM2.5 variable
-        for var_name in ['PM25_WEIGHTED', 'PM25', 'pm25', 'PM2_5', 'pm2_5']:
-            if var_name in dataset.variables:
-                pm25_var = var_name
-                break
-        
-        # Find time variable
-        for var_name in ['time', 't']:
-            if var_name in dataset.variables:
-                time_var = var_name
-                break
-        
-        print(f"Found variables: lat={lat_var}, lon={lon_var}, pm25={pm25_var}, time={time_var}")
-        
+        lat_var = find_variable(dataset, ['lat', 'latitude', 'y'])
+        lon_var = find_variable(dataset, ['lon', 'longitude', 'x'])
+        pm25_var = find_variable(dataset, ['PM25_WEIGHTED', 'PM25', 'pm25', 'PM2_5', 'pm2_5'])
+        time_var = find_variable(dataset, ['time', 't'])
+
+        log(f"Found variables: lat={lat_var}, lon={lon_var}, pm25={pm25_var}, time={time_var}")
+
         if not all([lat_var, lon_var, pm25_var]):
-            print("Error: Required variables not found")
-            return False
-        
-        # Read coordinate data
-        lats = dataset.variables[lat_var][:]
-        lons = dataset.variables[lon_var][:]
-        
-        print(f"Latitude range: {np.min(lats):.2f} to {np.max(lats):.2f}")
-        print(f"Longitude range: {np.min(lons):.2f} to {np.max(lons):.2f}")
-        print(f"Grid size: {len(lats)} x {len(lons)}")
-        
-        # Read PM2.5 data
-        pm25_data = dataset.variables[pm25_var]
-        print(f"PM2.5 data shape: {pm25_data.shape}")
-        print(f"PM2.5 data dimensions: {pm25_data.dimensions}")
-        
-        # Determine 2022 data index
+            raise ValueError("Required variables not found")
+
+        # Read coordinate data (1-D, small)
+        self.lats = np.asarray(dataset.variables[lat_var][:])
+        self.lons = np.asarray(dataset.variables[lon_var][:])
+
+        log(f"Latitude range: {np.min(self.lats):.2f} to {np.max(self.lats):.2f}")
+        log(f"Longitude range: {np.min(self.lons):.2f} to {np.max(self.lons):.2f}")
+        log(f"Grid size: {len(self.lats)} x {len(self.lons)}")
+
+        # PM2.5 variable (not read yet)
+        self.variable = dataset.variables[pm25_var]
+        log(f"PM2.5 data shape: {self.variable.shape}")
+        log(f"PM2.5 data dimensions: {self.variable.dimensions}")
+
+        self.lat_dim = dataset.variables[lat_var].dimensions[0]
+        self.lon_dim = dataset.variables[lon_var].dimensions[0]
+
+        # Calendar year of every time step (None when undecodable)
+        self.time_dim = self.years = None
+        self.n_times = 0
         if time_var and time_var in dataset.variables:
-            times = dataset.variables[time_var][:]
-            print(f"Time dimension length: {len(times)}")
-            
-            # Assume last time step is 2022
-            time_index = len(times) - 1
-            print(f"Using time index: {time_index} (assumed to be 2022)")
-            
-            # Extract 2022 data
-            # Data dimensions are (latitude, longitude, time)
-            pm25_2022 = pm25_data[:, :, time_index]
+            times = dataset.variables[time_var]
+            self.time_dim = times.dimensions[0]
+            self.n_times = len(times)
+            log(f"Time dimension length: {self.n_times}")
+            try:
+                self.years = decode_years(times)
+            except ValueError as e:
+                log(f"Warning: cannot decode time units ({e})")
+            if self.years is not None:
+                log(f"Years: {self.years.min()} to {self.years.max()}")
         else:
-            print("Time dimension not found, using all data")
-            if len(pm25_data.shape) == 2:  # [lat, lon]
-                pm25_2022 = pm25_data[:, :]
-            else:
-                print("Data dimensions do not match expectations")
-                return False
-        
-        # Convert to numpy array and handle missing values
-        pm25_2022 = np.array(pm25_2022)
-        
-        # Replace invalid values with None
-        pm25_2022_clean = np.where(
-            np.isnan(pm25_2022) | np.isinf(pm25_2022) | (pm25_2022 < 0),
-            None,
-            pm25_2022
-        )
-        
-        print(f"2022 PM2.5 data shape: {pm25_2022_clean.shape}")
-        
-        # Calculate valid data statistics
-        valid_data = pm25_2022_clean[pm25_2022_clean != None]
-        if len(valid_data) > 0:
-            print(f"Valid data points: {len(valid_data)} / {pm25_2022_clean.size}")
-            print(f"PM2.5 range: {np.min(valid_data):.2f} to {np.max(valid_data):.2f}")
-        
-        # To reduce file size, we can lower the resolution
-        # Sample every few points
-        downsample_factor = 4  # This value can be adjusted
-        
-        lat_indices = np.arange(0, len(lats), downsample_factor)
-        lon_indices = np.arange(0, len(lons), downsample_factor)
-        
-        lats_sampled = lats[lat_indices]
-        lons_sampled = lons[lon_indices]
-        pm25_sampled = pm25_2022_clean[np.ix_(lat_indices, lon_indices)]
-        
-        print(f"Grid size after downsampling: {len(lats_sampled)} x {len(lons_sampled)}")
-        
-        # Create output data structure
-        output_data = {
-            'metadata': {
-                'description': 'PM2.5 concentration data for 2022',
-                'units': 'µg/m³',
-                'source': 'concat_weighted_output.nc',
-                'lat_range': [float(np.min(lats_sampled)), float(np.max(lats_sampled))],
-                'lon_range': [float(np.min(lons_sampled)), float(np.max(lons_sampled))],
-                'grid_size': [len(lats_sampled), len(lons_sampled)],
-                'downsample_factor': downsample_factor
-            },
+            log("Time dimension not found, using all data")
+
+    def available_years(self):
+        """Sorted distinct years of the time steps (empty when they are unknown)"""
+        return [] if self.years is None else sorted(set(int(y) for y in self.years))
+
+    def time_steps(self, year):
+        """Time indices of a year (several for sub-annual data), or None without a time dimension"""
+        if self.time_dim is None:
+            return None
+        if self.years is None:
+            raise ValueError(f"Time steps cannot be matched to {year}: undecodable time variable")
+        steps = np.flatnonzero(self.years == year)
+        if len(steps) == 0:
+            raise ValueError(f"No time step for {year} (data covers {self.years.min()}-{self.years.max()})")
+        return steps
+
+    def assume_last_step(self, year, log=print):
+        """Old behaviour for files without usable time units: the last time step is the given year"""
+        if self.time_dim is not None and self.years is None:
+            self.years = np.full(self.n_times, -1)
+            self.years[-1] = year
+            log(f"Using the last time step as {year}")
+
+    def reader(self, year):
+        steps = self.time_steps(year)
+        if steps is not None and len(steps) == 1:
+            steps = int(steps[0])
+        return GridReader(self.variable, self.lat_dim, self.lon_dim, self.time_dim, steps)
+
+
+def extract_year(source, year, output_file, downsample_factor=DOWNSAMPLE_FACTOR, band_rows=BAND_ROWS,
+                 output_format='json', compress=(), source_name='', log=print):
+    """
+    Write the map of one year from a PM25Source. Returns a summary dict:
+    year, file names, point counts, value range and size.
+    """
+    reader = source.reader(year)
+    lats, lons = source.lats, source.lons
+    lats_sampled = lats[::downsample_factor]
+    lons_sampled = lons[::downsample_factor]
+    log(f"Grid size after downsampling: {len(lats_sampled)} x {len(lons_sampled)}")
+
+    metadata = {
+        'description': f'PM2.5 concentration data for {year}',
+        'units': 'µg/m³',
+        'source': source_name,
+        'lat_range': [float(np.min(lats_sampled)), float(np.max(lats_sampled))],
+        'lon_range': [float(np.min(lons_sampled)), float(np.max(lons_sampled))],
+        'grid_size': [len(lats_sampled), len(lons_sampled)],
+        'downsample_factor': downsample_factor
+    }
+    stats = {'cells': 0, 'valid': 0, 'min': np.inf, 'max': -np.inf}
+    bands = iter_bands(reader, len(lats), np.arange(0, len(lons), downsample_factor),
+                       downsample_factor, band_rows, stats)
+    summary = {'year': year, 'file': os.path.basename(output_file)}
+
+    if output_format == 'grid':
+        data_path = os.path.splitext(output_file)[0] + '.bin'
+
+        def write(f):
+            stats['written'] = write_grid_binary(f, bands)
+
+        log(f"Saving grid to {data_path} in bands of {band_rows} latitude rows...")
+        with trace.span('file write', file=data_path, format='grid'):
+            replace_atomic(data_path, write)
+        with trace.span('compress', methods=list(compress)):
+            encodings = precompress(data_path, compress)
+        write_json_atomic(output_file, grid_header(lats_sampled, lons_sampled, os.path.basename(data_path),
+                                                   encodings, metadata), indent=2)
+        summary.update(data=os.path.basename(data_path), encodings=encodings)
+    else:
+        # Create output data structure; the data points are streamed in band by band
+        header = {
+            'metadata': metadata,
             'coordinates': {
                 'lats': lats_sampled.tolist(),
                 'lons': lons_sampled.tolist()
             },
             'data': []
         }
-        
-        # Convert data to sparse format to save space
-        # Only save valid data points
-        for i, lat in enumerate(lats_sampled):
-            for j, lon in enumerate(lons_sampled):
-                value = pm25_sampled[i, j]
-                if value is not None and not np.isnan(value):
-                    output_data['data'].append({
-                        'lat': float(lat),
-                        'lon': float(lon),
-                        'value': float(value)
-                    })
-        
-        print(f"Number of valid data points: {len(output_data['data'])}")
-        
-        # Save as JSON file
-        print(f"Saving to {output_file}...")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
-        
-        # Check file size
-        file_size = os.path.getsize(output_file)
-        print(f"Output file size: {file_size / 1024 / 1024:.2f} MB")
-        
-        dataset.close()
-        print("Data extraction complete!")
-        return True
-        
+        head = json.dumps(header, indent=2, ensure_ascii=False)
+        assert head.endswith('[]\n}')
+        head = head[:-len(']\n}')]
+
+        def write(f):
+            f.write(head.encode('utf-8'))
+            written = write_grid_json(f, bands, lats, lons_sampled)
+            f.write(b'\n  ]\n}' if written else b']\n}')
+            stats['written'] = written
+
+        log(f"Saving to {output_file} in bands of {band_rows} latitude rows...")
+        with trace.span('file write', file=output_file, format='json'):
+            replace_atomic(output_file, write)
+        data_path = output_file
+
+    # Calculate valid data statistics
+    if stats['valid'] > 0:
+        log(f"Valid data points: {stats['valid']} / {stats['cells']}")
+        log(f"PM2.5 range: {stats['min']:.2f} to {stats['max']:.2f}")
+    log(f"Number of valid data points: {stats['written']}")
+
+    # Check file size
+    file_size = os.path.getsize(data_path)
+    log(f"Output file size: {file_size / 1024 / 1024:.2f} MB")
+
+    summary.update(points=stats['written'], valid_cells=stats['valid'], cells=stats['cells'],
+                   min=float(stats['min']) if stats['valid'] else None,
+                   max=float(stats['max']) if stats['valid'] else None, bytes=file_size)
+    return summary
+
+
+def extract_pm25_2022(input_file=INPUT_FILE, output_file=OUTPUT_FILE,
+                      downsample_factor=DOWNSAMPLE_FACTOR, band_rows=BAND_ROWS,
+                      output_format='json', compress=(), year=YEAR):
+    """
+    Extract PM2.5 data for one year (2022 by default). output_format 'grid'
+    writes the binary grid and its header (output_file is then the header
+    path); compress lists 'gzip' / 'brotli' copies to precompute for it.
+    """
+
+    if not os.path.exists(input_file):
+        print(f"Error: File not found {input_file}")
+        return False
+
+    try:
+        print("Reading NetCDF file...")
+        with nc.Dataset(input_file, 'r') as dataset:
+            with trace.span('netcdf open', file=input_file):
+                source = PM25Source(dataset)
+                source.assume_last_step(year)
+            with trace.span('extract year', year=year, format=output_format) as span:
+                summary = extract_year(source, year, output_file, downsample_factor, band_rows,
+                                       output_format, compress, os.path.basename(input_file))
+                span.set(points=summary['points'], bytes=summary['bytes'])
     except Exception as e:
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+    print("Data extraction complete!")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the 2022 PM2.5 grid from the NetCDF file as JSON.")
+    parser.add_argument('--input', default=INPUT_FILE, help='NetCDF file (default: %(default)s)')
+    parser.add_argument('--year', type=int, default=YEAR,
+                        help='Calendar year to extract (default: %(default)s); see extract_pm25_years.py for several')
+    parser.add_argument('--format', choices=['json', 'grid'], default='json', dest='output_format',
+                        help='json: sparse point list; grid: quantized uint16 grid + JSON header (default: json)')
+    parser.add_argument('--output', default=None,
+                        help=f'JSON file, or grid header (default: {OUTPUT_FILE} / {GRID_HEADER_FILE})')
+    parser.add_argument('--compress', nargs='+', choices=['gzip', 'brotli'], default=[],
+                        help='Also write precompressed copies of the grid')
+    parser.add_argument('--downsample', type=int, default=DOWNSAMPLE_FACTOR,
+                        help='Keep every Nth grid point; 1 keeps the full grid (default: %(default)s)')
+    parser.add_argument('--band-rows', type=int, default=BAND_ROWS,
+                        help='Latitude rows read at a time; bounds memory use (default: %(default)s)')
+    trace.add_argument(parser)
+    args = parser.parse_args(argv)
+    trace.from_args(args)
+    output = args.output or (GRID_HEADER_FILE if args.output_format == 'grid' else OUTPUT_FILE)
+    return extract_pm25_2022(args.input, output, args.downsample, args.band_rows,
+                             args.output_format, args.compress, args.year)
+
+
 if __name__ == "__main__":
-    success = extract_pm25_2022()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    success = main()
+    sys.exit(0 if success else 1)
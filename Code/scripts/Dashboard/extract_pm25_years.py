@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Extract the PM2.5 map of every year (or a range of years) from the NetCDF file
+
+Decodes the time variable to calendar years, then extracts the selected
+years in parallel: each worker process opens its own NetCDF handle once and
+writes one artifact per year with extract_pm25_2022.extract_year (JSON
+points or binary grid, same layout as the 2022 map). A manifest lists the
+years and their files for the dashboard's time slider. Years whose files
+are newer than the NetCDF file, already in the manifest and have the
+precompressed copies asked for are skipped, so re-runs only fill in what is
+missing.
+
+Usage:
+    python extract_pm25_years.py --years all
+    python extract_pm25_years.py --years 2000-2022 --format grid --compress gzip -j 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import netCDF4 as nc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core.fileio import write_json_atomic
+from extract_pm25_2022 import BAND_ROWS, DOWNSAMPLE_FACTOR, INPUT_FILE, PM25Source, can_compress, extract_year
+
+# —— Configuration ——
+OUTPUT_DIR = 'public/pm25_years'
+MANIFEST_FILE = 'manifest.json'
+FILE_NAMES = {'json': 'pm25_{year}_data.json', 'grid': 'pm25_{year}_grid.json'}
+# —— end Configuration ——
+
+# NetCDF handle and decoded source of the current process, opened once per worker
+_worker = {}
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def _init_worker(input_file):
+    _worker['dataset'] = nc.Dataset(input_file, 'r')
+    _worker['source'] = PM25Source(_worker['dataset'], log=_quiet)
+
+
+def _close_worker():
+    dataset = _worker.pop('dataset', None)
+    _worker.clear()
+    if dataset is not None:
+        dataset.close()
+
+
+def parse_years(specs, available):
+    """Expand "2022" / "2000-2022" / "all" specs into sorted years present in the data"""
+    if not specs or 'all' in specs:
+        return list(available)
+    selected = set()
+    for spec in specs:
+        first, _, last = spec.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        matches = [y for y in available if first <= y <= last]
+        if not matches:
+            print(f"Warning: no data for '{spec}'")
+        selected.update(matches)
+    return sorted(selected)
+
+
+def extract_one(year, input_file, output_dir, output_format, downsample_factor, band_rows, compress):
+    """
+    Extract one year with this process's NetCDF handle. Never raises:
+    returns a result dict with the status ('ok' or 'failed'), the summary
+    of extract_year and any error message.
+    """
+    if not _worker:
+        _init_worker(input_file)
+    result = {'year': year}
+    start = time.perf_counter()
+    try:
+        output_file = os.path.join(output_dir, FILE_NAMES[output_format].format(year=year))
+        result['summary'] = extract_year(_worker['source'], year, output_file, downsample_factor, band_rows,
+                                         output_format, compress, os.path.basename(input_file), log=_quiet)
+        result['status'] = 'ok'
+    except Exception as e:
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(entry, output_dir, input_mtime, compress=()):
+    """
+    Whether a manifest entry's files exist and are newer than the NetCDF
+    file, and a grid has a precompressed copy for each method in compress
+    that can be written here (so copies skipped for a missing module are
+    made once it is installed)
+    """
+    files = [entry['file']]
+    if 'data' in entry:
+        encodings = entry.get('encodings', {})
+        if any(method not in encodings for method in compress if can_compress(method)):
+            return False
+        files += [entry['data']] + list(encodings.values())
+    paths = [os.path.join(output_dir, name) for name in files]
+    return all(os.path.exists(p) and os.path.getmtime(p) >= input_mtime for p in paths)
+
+
+def extract_years(year_specs=None, input_file=INPUT_FILE, output_dir=OUTPUT_DIR, output_format='json',
+                  downsample_factor=DOWNSAMPLE_FACTOR, band_rows=BAND_ROWS, compress=(), workers=None, force=False):
+    """
+    Extract every selected year with a pool of worker processes and write
+    the manifest. Prints a line per year; returns the results.
+    """
+    with nc.Dataset(input_file, 'r') as dataset:
+        available = PM25Source(dataset).available_years()
+    if not available:
+        raise ValueError(f"{input_file} has no decodable time variable; use extract_pm25_2022.py --year")
+    years = parse_years(year_specs, available)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    # Years written with other settings are redone; the copies each year got are in its 'encodings'
+    settings = {'source': os.path.basename(input_file), 'format': output_format,
+                'downsample_factor': downsample_factor}
+    previous = load_manifest(manifest_path)
+    entries = {}
+    if previous and all(previous.get(k) == v for k, v in settings.items()):
+        entries = {e['year']: e for e in previous['years']}
+
+    input_mtime = os.path.getmtime(input_file)
+    todo = [y for y in years if force or y not in entries or not is_current(entries[y], output_dir, input_mtime, compress)]
+    results = [{'year': y, 'status': 'skipped', 'summary': entries[y], 'seconds': 0.0} for y in years if y not in todo]
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    args = (input_file, output_dir, output_format, downsample_factor, band_rows, compress)
+
+    def report(result):
+        results.append(result)
+        if result['status'] == 'ok':
+            summary = result['summary']
+            print(f"{result['year']}: {summary['points']} points, {summary['bytes'] / 1024 / 1024:.2f} MB "
+                  f"({result['seconds']:.1f}s)", flush=True)
+        else:
+            print(f"{result['year']}: [failed] {result['error']}", flush=True)
+
+    start = time.perf_counter()
+    if workers == 1:
+        # Extracted in this process, with a handle opened by the first year
+        try:
+            for year in todo:
+                report(extract_one(year, *args))
+        finally:
+            _close_worker()
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(input_file,)) as pool:
+            futures = [pool.submit(extract_one, year, *args) for year in todo]
+            for future in as_completed(futures):
+                report(future.result())
+
+    # Manifest of every year on disk, including earlier runs with the same settings
+    for r in results:
+        if r['status'] != 'failed':
+            entries[r['year']] = r['summary']
+    manifest = dict(settings, units='µg/m³', years=[entries[y] for y in sorted(entries)])
+    write_json_atomic(manifest_path, manifest, indent=2)
+
+    counts = {s: sum(r['status'] == s for r in results) for s in ('ok', 'skipped', 'failed')}
+    print(f"Done in {time.perf_counter() - start:.1f}s with {workers} worker(s): "
+          f"{counts['ok']} extracted, {counts['skipped']} up to date, {counts['failed']} failed.")
+    print(f"Manifest: {manifest_path} ({len(manifest['years'])} years)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the PM2.5 map of several years from the NetCDF file.")
+    parser.add_argument('--input', default=INPUT_FILE, help='NetCDF file (default: %(default)s)')
+    parser.add_argument('-y', '--years', nargs='+', default=['all'],
+                        help='Years or ranges such as 2022 or 2000-2022, or "all" (default: all)')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR, help='Folder for the maps (default: %(default)s)')
+    parser.add_argument('--format', choices=['json', 'grid'], default='json', dest='output_format',
+                        help='json: sparse point list; grid: quantized uint16 grid + JSON header (default: json)')
+    parser.add_argument('--compress', nargs='+', choices=['gzip', 'brotli'], default=[],
+                        help='Also write precompressed copies of the grids')
+    parser.add_argument('--downsample', type=int, default=DOWNSAMPLE_FACTOR,
+                        help='Keep every Nth grid point; 1 keeps the full grid (default: %(default)s)')
+    parser.add_argument('--band-rows', type=int, default=BAND_ROWS,
+                        help='Latitude rows read at a time; bounds memory use (default: %(default)s)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('-f', '--force', action='store_true', help='Re-extract years that are up to date')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"File not found: {args.input}")
+    try:
+        results = extract_years(args.years, args.input, args.output_dir, args.output_format, args.downsample,
+                                args.band_rows, args.compress, args.workers, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,63 +1,90 @@
+import argparse
 import csv
 import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core.city_matcher import CoordinateMatcher, load_worldcities
 
 # File paths
 cities_data_path = "V1pt6_Cities_Data_PM2pt5.csv"
-worldcities_path = "worldcities/worldcities.csv"
+worldcities_paths = ["worldcities/worldcities.csv", "worldcities/worldcities.xlsx"]  # First one found is used
 output_path = "cities_with_coords.json"
 
-# Step 1: Build (city, country) to (lat, lng) mapping from worldcities.csv
-city_coords = {}
-
-with open(worldcities_path, encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        city = row["city"].strip()
-        country = row["country"].strip()
-        lat = float(row["lat"])
-        lng = float(row["lng"])
-        city_coords[(city, country)] = {"lat": lat, "lng": lng}
-
-# Step 2: Extract cities and countries from PM2.5 data file (headers are city-country combinations)
-with open(cities_data_path, encoding="utf-8") as f:
-    reader = csv.reader(f)
-    headers = next(reader)
-
-# Extract all (city, country) pairs, skip first column "Year"
-city_country_pairs = []
-for header in headers[1:]:
-    if "," in header:
-        parts = header.strip().rsplit(",", 1)
-        if len(parts) == 2:
-            city = parts[0].strip()
-            country = parts[1].strip()
-            city_country_pairs.append((city, country))
-
-# Step 3: Match coordinates
-matched_cities = []
-unmatched_cities = []
-
-for city, country in city_country_pairs:
-    key = (city, country)
-    if key in city_coords:
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match the PM2.5 cities to worldcities coordinates.")
+    parser.add_argument('--cities', default=cities_data_path, help='PM2.5 CSV (default: %(default)s)')
+    parser.add_argument('--worldcities', default=None,
+                        help=f"worldcities CSV/TSV/XLSX (default: first of {', '.join(worldcities_paths)})")
+    parser.add_argument('-o', '--output', default=output_path, help='JSON file (default: %(default)s)')
+    args = parser.parse_args(argv)
+    worldcities_path = args.worldcities or next((p for p in worldcities_paths if os.path.exists(p)), None)
+    if worldcities_path is None:
+        parser.error(f"No worldcities file found ({', '.join(worldcities_paths)})")
+
+    # Step 1: Load worldcities (parsed once, then from its cache) and index it by country
+    start = time.perf_counter()
+    matcher = CoordinateMatcher(load_worldcities(worldcities_path))
+    loaded = time.perf_counter() - start
+
+    # Step 2: Extract cities and countries from PM2.5 data file (headers are city-country combinations)
+    with open(args.cities, encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+
+    # Extract all (city, country) pairs, skip first column "Year"
+    city_country_pairs = []
+    for header in headers[1:]:
+        if "," in header:
+            parts = header.strip().rsplit(",", 1)
+            if len(parts) == 2:
+                city = parts[0].strip()
+                country = parts[1].strip()
+                city_country_pairs.append((city, country))
+
+    # Step 3: Match coordinates (exact, then fuzzy within the country)
+    start = time.perf_counter()
+    matched_cities = []
+    fuzzy_matches = []
+    unmatched_cities = []
+
+    for city, country in city_country_pairs:
+        row, score = matcher.match(city, country)
+        if row is None:
+            unmatched_cities.append((city, country, score))
+            continue
+        lat, lng = matcher.coordinates(row)
         matched_cities.append({
             "city": city,
             "country": country,
-            "lat": city_coords[key]["lat"],
-            "lng": city_coords[key]["lng"]
+            "lat": lat,
+            "lng": lng
         })
-    else:
-        unmatched_cities.append((city, country))
+        if score < 1.0:
+            fuzzy_matches.append((city, country, matcher.table["city"][row], matcher.table["country"][row], score))
+    matched = time.perf_counter() - start
+
+    # Step 4: Write to JSON file
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(matched_cities, f, indent=2, ensure_ascii=False)
+
+    print(f"Successfully wrote to {args.output}, total matched cities: {len(matched_cities)}")
+    print(f"Loaded {worldcities_path} in {loaded:.2f}s, matched in {matched:.3f}s")
+    print(f"Number of unmatched cities: {len(unmatched_cities)}")
 
-# Step 4: Write to JSON file
-with open(output_path, "w", encoding="utf-8") as f:
-    json.dump(matched_cities, f, indent=2, ensure_ascii=False)
+    # Print fuzzy matches for review, then the unmatched cities
+    if fuzzy_matches:
+        print("Fuzzy matches (check these):")
+        for city, country, found_city, found_country, score in fuzzy_matches:
+            print(f"{city}, {country} -> {found_city}, {found_country} ({score:.2f})")
+    if unmatched_cities:
+        print("List of unmatched cities:")
+        for city, country, score in unmatched_cities:
+            print(f"{city}, {country}" + (f" (best score {score:.2f})" if score else ""))
 
-print(f"Successfully wrote to {output_path}, total matched cities: {len(matched_cities)}")
-print(f"Number of unmatched cities: {len(unmatched_cities)}")
 
-# Print list of unmatched cities
-if unmatched_cities:
-    print("List of unmatched cities:")
-    for city, country in unmatched_cities:
-        print(f"{city}, {country}")
+if __name__ == "__main__":
+    main()
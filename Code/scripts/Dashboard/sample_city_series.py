@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Sample city PM2.5 time series straight from the gridded NetCDF file
+
+Takes any list of city coordinates (cities_with_coords.json, or a
+worldcities-style CSV/TSV with city, country, lat and lng columns) and
+samples the PM2.5 grid at every city for every year in one vectorized
+operation per chunk of time steps: the fractional grid position of each
+city is computed once, then each chunk's corner cells are gathered with
+fancy indexing and blended bilinearly (or the nearest cell is taken).
+Missing corners are left out of the blend; a city is NaN only when all of
+its corners are missing. Sub-annual steps are averaged per calendar year.
+
+The output is the year x city matrix of V1pt6_Cities_Data_PM2pt5.csv (a
+Year column plus one "City, Country" column per city), as CSV and/or as a
+memory-mapped city store, so the visualizers can show stripes for any city
+with coordinates.
+
+Usage:
+    python sample_city_series.py -o cities_from_grid.csv
+    python sample_city_series.py --cities worldcities/worldcities.csv --store ../air-quality-static-ui/cities_store
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import netCDF4 as nc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store
+from extract_pm25_2022 import INPUT_FILE, YEAR, PM25Source, clean_values
+
+# —— Configuration ——
+CITIES_FILE = 'public/cities_with_coords.json'
+OUTPUT_FILE = 'cities_from_grid.csv'
+CHUNK_BYTES = 256 * 1024 * 1024  # Raw grid data read per chunk of time steps
+# —— end Configuration ——
+
+
+def load_cities(path):
+    """[(name, lat, lon)] from a cities_with_coords JSON list or a worldcities CSV/TSV"""
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        frame = pd.DataFrame(rows)
+    else:
+        # Comma or tab separated; stray non-UTF-8 bytes only affect names, not coordinates
+        frame = pd.read_csv(path, sep=None, engine='python', encoding='utf-8', encoding_errors='replace')
+    lon_col = 'lng' if 'lng' in frame.columns else 'lon'
+    missing = {'city', 'country', 'lat', lon_col} - set(frame.columns)
+    if missing:
+        raise ValueError(f"{path} has no {', '.join(sorted(missing))} column")
+    frame = frame.dropna(subset=['lat', lon_col])
+    names = unique_names(frame)
+    return names, frame['lat'].to_numpy(dtype=float), frame[lon_col].to_numpy(dtype=float)
+
+
+def unique_names(frame):
+    """"City, Country" names, told apart by admin region (then by number) when they repeat"""
+    names = (frame['city'].astype(str) + ', ' + frame['country'].astype(str)).tolist()
+    if 'admin_name' in frame.columns:
+        counts = pd.Series(names).value_counts()
+        names = [f"{c} ({a}), {k}" if counts[n] > 1 and isinstance(a, str) and a else n
+                 for n, c, a, k in zip(names, frame['city'], frame['admin_name'], frame['country'])]
+    seen = {}
+    unique = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            city, country = city_store.split_name(name)
+            name = f"{city} {seen[name]}, {country}"
+        unique.append(name)
+    return unique
+
+
+def fractional_index(coords, x):
+    """Fractional position of x along a monotonic coordinate axis"""
+    coords = np.asarray(coords, dtype=np.float64)
+    positions = np.arange(len(coords), dtype=np.float64)
+    if coords[-1] < coords[0]:
+        coords, positions = coords[::-1], positions[::-1]
+    return np.interp(x, coords, positions)
+
+
+class GridSampler:
+    """Corner cells and weights of every city on the grid, computed once"""
+
+    def __init__(self, lats, lons, city_lats, city_lons, method='bilinear'):
+        lons = np.asarray(lons, dtype=np.float64)
+        n_lat, n_lon = len(lats), len(lons)
+        step = (lons[-1] - lons[0]) / max(n_lon - 1, 1)
+        self.wraps = step > 0 and abs(step * n_lon - 360) < step / 2
+        if self.wraps:
+            # Global grid: bring every longitude into [lons[0], lons[0] + 360) and blend across the seam
+            city_lons = (np.asarray(city_lons) - lons[0]) % 360 + lons[0]
+            fj = (city_lons - lons[0]) / step
+        else:
+            fj = fractional_index(lons, city_lons)
+        fi = fractional_index(lats, city_lats)
+
+        if method == 'nearest':
+            i = np.clip(np.rint(fi).astype(int), 0, n_lat - 1)
+            j = np.rint(fj).astype(int) % n_lon if self.wraps else np.clip(np.rint(fj).astype(int), 0, n_lon - 1)
+            self.rows, self.cols, self.weights = i[None], j[None], np.ones((1, len(i)))
+            return
+
+        i0 = np.clip(np.floor(fi).astype(int), 0, max(n_lat - 2, 0))
+        wi = np.clip(fi - i0, 0, 1)
+        i1 = np.minimum(i0 + 1, n_lat - 1)
+        if self.wraps:
+            j0 = np.floor(fj).astype(int) % n_lon
+            wj = fj - np.floor(fj)
+            j1 = (j0 + 1) % n_lon
+        else:
+            j0 = np.clip(np.floor(fj).astype(int), 0, max(n_lon - 2, 0))
+            wj = np.clip(fj - j0, 0, 1)
+            j1 = np.minimum(j0 + 1, n_lon - 1)
+        self.rows = np.stack([i0, i0, i1, i1])
+        self.cols = np.stack([j0, j1, j0, j1])
+        self.weights = np.stack([(1 - wi) * (1 - wj), (1 - wi) * wj, wi * (1 - wj), wi * wj])
+
+    def sample(self, grids):
+        """Values of every city on a (time, lat, lon) block, as a (time, city) array"""
+        corners = clean_values(grids[:, self.rows, self.cols])  # (time, corner, city)
+        valid = ~np.isnan(corners)
+        weights = np.where(valid, self.weights[None], 0.0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            blended = (np.where(valid, corners, 0.0) * weights).sum(axis=1) / total
+        return np.where(total > 0, blended, np.nan)
+
+
+def read_time_chunk(source, start, stop):
+    """(time, lat, lon) block of time steps start..stop-1, whatever the variable's dimension order"""
+    variable = source.variable
+    index = tuple(slice(start, stop) if d == source.time_dim else slice(None) for d in variable.dimensions)
+    order = [d for d in (source.time_dim, source.lat_dim, source.lon_dim) if d in variable.dimensions]
+    data = np.ma.transpose(variable[index], [variable.dimensions.index(d) for d in order])
+    return data if len(order) == 3 else data[None]
+
+
+def sample_cities(source, names, city_lats, city_lons, method='bilinear', chunk_bytes=CHUNK_BYTES, log=print):
+    """Year axis and year x city matrix of the grid sampled at the cities"""
+    sampler = GridSampler(source.lats, source.lons, city_lats, city_lons, method)
+    n_times = source.n_times if source.time_dim is not None else 1
+    if source.time_dim is None:
+        step_years = np.array([YEAR])
+    elif source.years is None:
+        raise ValueError("The time variable cannot be decoded to calendar years")
+    else:
+        step_years = source.years
+    years = np.unique(step_years)
+    row_of_step = np.searchsorted(years, step_years)
+
+    sums = np.zeros((len(years), len(names)))
+    counts = np.zeros((len(years), len(names)), dtype=np.int32)
+    cell_bytes = len(source.lats) * len(source.lons) * source.variable.dtype.itemsize
+    chunk = max(1, chunk_bytes // cell_bytes)
+    for start in range(0, n_times, chunk):
+        stop = min(start + chunk, n_times)
+        values = sampler.sample(read_time_chunk(source, start, stop))
+        valid = ~np.isnan(values)
+        # Several steps may fall in one year (monthly data): accumulate per year row
+        np.add.at(sums, row_of_step[start:stop], np.where(valid, values, 0.0))
+        np.add.at(counts, row_of_step[start:stop], valid)
+        log(f"  time steps {start}-{stop - 1} of {n_times}")
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return years, np.where(counts > 0, sums / counts, np.nan)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample city PM2.5 time series from the NetCDF grid.")
+    parser.add_argument('--input', default=INPUT_FILE, help='NetCDF file (default: %(default)s)')
+    parser.add_argument('--cities', default=CITIES_FILE,
+                        help='cities_with_coords JSON or worldcities CSV/TSV (default: %(default)s)')
+    parser.add_argument('--method', choices=['bilinear', 'nearest'], default='bilinear')
+    parser.add_argument('-o', '--output', default=None, help=f'CSV in the V1pt6 layout (default: {OUTPUT_FILE})')
+    parser.add_argument('--store', default=None, help='Also (or only, without -o) write a memory-mapped city store')
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // 1024 // 1024,
+                        help='Raw grid data read per chunk of time steps (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    for path in (args.input, args.cities):
+        if not os.path.exists(path):
+            parser.error(f"File not found: {path}")
+    output = args.output or (None if args.store else OUTPUT_FILE)
+
+    start = time.perf_counter()
+    names, city_lats, city_lons = load_cities(args.cities)
+    print(f"Sampling {len(names)} cities ({args.method})...")
+    with nc.Dataset(args.input, 'r') as dataset:
+        source = PM25Source(dataset, log=lambda *a: None)
+        try:
+            years, values = sample_cities(source, names, city_lats, city_lons, args.method, args.chunk_mb << 20)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if output:
+        frame = pd.DataFrame(values, columns=names)
+        frame.insert(0, 'Year', years)
+        frame.to_csv(output, index=False)
+        print(f"Wrote {output}")
+    if args.store:
+        city_store.write_store(args.store, years, names, values)
+        print(f"Wrote store {args.store}")
+    print(f"{len(years)} years x {len(names)} cities in {time.perf_counter() - start:.1f}s "
+          f"({np.mean(np.isnan(values)):.1%} missing)")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,12 +15,39 @@ function getColor(val) {
   return c_list[c_list.length - 1];
 }
 
+// Lat/lon box shown on the canvas, from a grid of inverted screen points
+function visibleBox(projection, transform, width, height) {
+  const box = { latMin: 90, latMax: -90, lonMin: 180, lonMax: -180 };
+  let offGlobe = false;
+  for (let sx = 0; sx <= 8; sx++) {
+    for (let sy = 0; sy <= 8; sy++) {
+      const x = (sx / 8 * width - transform.x) / transform.k;
+      const y = (sy / 8 * height - transform.y) / transform.k;
+      const point = projection.invert([x, y]);
+      if (!point || !isFinite(point[0]) || !isFinite(point[1]) || Math.abs(point[0]) > 180 || Math.abs(point[1]) > 90) {
+        offGlobe = true;
+        continue;
+      }
+      box.lonMin = Math.min(box.lonMin, point[0]);
+      box.lonMax = Math.max(box.lonMax, point[0]);
+      box.latMin = Math.min(box.latMin, point[1]);
+      box.latMax = Math.max(box.latMax, point[1]);
+    }
+  }
+  // Edges of the globe in view: the sampled points may miss the poles or the antimeridian
+  if (offGlobe) {
+    return { latMin: -90, latMax: 90, lonMin: -180, lonMax: 180 };
+  }
+  return box;
+}
+
 function Map({ onCitySelect, selectedCities, maxCities = 2 }) {
   const svgRef = useRef();
   const canvasRef = useRef();
   const [cities, setCities] = useState([]);
   const [world, setWorld] = useState(null);
   const [pm25Loader, setPm25Loader] = useState(null);
+  const [tileVersion, setTileVersion] = useState(0);
   const [isLoading, setIsLoading] = useState(true);
   const [transform, setTransform] = useState({ k: 1, x: 0, y: 0 });
   const [isDragging, setIsDragging] = useState(false);
@@ -51,9 +78,10 @@ function Map({ onCitySelect, selectedCities, maxCities = 2 }) {
           setCities(citiesData);
         }
 
-        // Load PM2.5 data
+        // Load PM2.5 data: the tiles visible at the current zoom when a pyramid
+        // is deployed, otherwise the whole grid (or JSON point list)
         const loader = new PM25DataLoader();
-        const success = await loader.loadData();
+        const success = (await loader.loadPyramid()) || (await loader.load());
         if (success) {
           setPm25Loader(loader);
           console.log('PM2.5 data stats:', loader.getDataStats());
@@ -267,7 +295,7 @@ function Map({ onCitySelect, selectedCities, maxCities = 2 }) {
       });
 
       // Initial Canvas render
-      if (canvasRef.current && pm25Loader && pm25Loader.data) {
+      if (canvasRef.current && pm25Loader && (pm25Loader.pyramid || pm25Loader.data)) {
         try {
           const canvas = canvasRef.current;
           const ctx = canvas.getContext('2d');
@@ -275,7 +303,18 @@ function Map({ onCitySelect, selectedCities, maxCities = 2 }) {
             console.error('Failed to get canvas context');
             return;
           }
-          PM25Canvas.renderPM25Data(ctx, pm25Loader.data.data, mapProjection, transform, cities, width, height);
+          if (pm25Loader.pyramid) {
+            const [x0] = mapProjection([0, 0]);
+            const [x1] = mapProjection([1, 0]);
+            const pixelsPerDegree = Math.abs(x1 - x0) * transform.k;
+            const level = pm25Loader.pickLevel(pixelsPerDegree);
+            const box = visibleBox(mapProjection, transform, width, height);
+            const points = pm25Loader.getVisiblePoints(level, box, () => setTileVersion(v => v + 1));
+            PM25Canvas.renderPM25Data(ctx, points, mapProjection, transform, cities, width, height,
+              Math.abs(level.step.lon) * pixelsPerDegree);
+          } else {
+            PM25Canvas.renderPM25Data(ctx, pm25Loader.data.data, mapProjection, transform, cities, width, height);
+          }
         } catch (error) {
           console.error('Error rendering PM2.5 data:', error);
         }
@@ -284,7 +323,7 @@ function Map({ onCitySelect, selectedCities, maxCities = 2 }) {
     } catch (error) {
       console.error('Error rendering map:', error);
     }
-  }, [world, cities, selectedCities, onCitySelect, isLoading, transform, pm25Loader]);
+  }, [world, cities, selectedCities, onCitySelect, isLoading, transform, pm25Loader, tileVersion]);
 
   // Add global mouse event listeners
   useEffect(() => {
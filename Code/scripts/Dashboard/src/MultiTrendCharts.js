@@ -1,5 +1,6 @@
 import React, { useEffect, useRef, useState } from 'react';
 import * as d3 from 'd3';
+import StripeAtlas from './StripeAtlas';
 
 const PM25_CSV = 'V1pt6_Cities_Data_PM2pt5.csv';
 
@@ -27,7 +28,7 @@ function getColor(val) {
   return c_list[c_list.length - 1];
 }
 
-function SingleTrend({ city, country, data, years }) {
+function SingleTrend({ city, country, data, years, atlas }) {
   const svgRef = useRef();
 
   useEffect(() => {
@@ -42,19 +43,23 @@ function SingleTrend({ city, country, data, years }) {
     const y = data.map(row => +row[col]);
     if (!y.length || y.some(isNaN)) return;
 
-    // 1. Color band background
+    // 1. Color band background: a crop of the stripe atlas, or one rect per year without it
     const bandHeight = height - margin.top - margin.bottom;
     const bandY = margin.top;
     const bandWidth = (width - margin.left - margin.right) / years.length;
-    years.forEach((year, i) => {
-      svg.append('rect')
-        .attr('x', margin.left + i * bandWidth)
-        .attr('y', bandY)
-        .attr('width', bandWidth)
-        .attr('height', bandHeight)
-        .attr('fill', getColor(y[i]))
-        .attr('stroke', 'none');
-    });
+    const fromAtlas = atlas && atlas.drawSvg(svg, col, years[0], years[years.length - 1],
+      margin.left, bandY, width - margin.left - margin.right, bandHeight);
+    if (!fromAtlas) {
+      years.forEach((year, i) => {
+        svg.append('rect')
+          .attr('x', margin.left + i * bandWidth)
+          .attr('y', bandY)
+          .attr('width', bandWidth)
+          .attr('height', bandHeight)
+          .attr('fill', getColor(y[i]))
+          .attr('stroke', 'none');
+      });
+    }
 
     // 2. Fixed Y-axis range 0~120
     const x = d3.scaleLinear().domain([years[0], years[years.length-1]+1]).range([margin.left, width - margin.right]);
@@ -120,7 +125,7 @@ function SingleTrend({ city, country, data, years }) {
 
     // 7. Remove border
     svg.selectAll('rect.background').remove();
-  }, [data, years, city, country]);
+  }, [data, years, city, country, atlas]);
 
   return <svg ref={svgRef} style={{background: 'white', borderRadius: 8, boxShadow: '0 2px 8px #0001'}}></svg>;
 }
@@ -128,12 +133,14 @@ function SingleTrend({ city, country, data, years }) {
 function MultiTrendCharts({ selectedCities }) {
   const [data, setData] = useState(null);
   const [years, setYears] = useState([]);
+  const [atlas, setAtlas] = useState(null);
 
   useEffect(() => {
     d3.csv(PM25_CSV).then(raw => {
       setYears(raw.map(row => +row['Year']));
       setData(raw);
     });
+    StripeAtlas.load().then(setAtlas);
   }, []);
 
   if (!selectedCities.length) return <div style={{textAlign: 'center', margin: 32, color: '#888'}}>Click the cities to see the trends</div>;
@@ -141,7 +148,7 @@ function MultiTrendCharts({ selectedCities }) {
   return (
     <div style={{display: 'flex', justifyContent: 'center', gap: 24}}>
       {selectedCities.slice(0, 3).map((c, idx) =>
-        <SingleTrend key={idx} city={c.city} country={c.country} data={data} years={years} />
+        <SingleTrend key={idx} city={c.city} country={c.country} data={data} years={years} atlas={atlas} />
       )}
     </div>
   );
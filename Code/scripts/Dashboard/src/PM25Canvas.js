@@ -18,7 +18,9 @@ function parseRGB(rgbString) {
 }
 
 class PM25Canvas {
-  static renderPM25Data(ctx, gridData, projection, transform, cities, width, height) {
+  // cellPixels: on-screen size of a grid cell (e.g. for pyramid tiles);
+  // defaults to a size that grows with the zoom
+  static renderPM25Data(ctx, gridData, projection, transform, cities, width, height, cellPixels) {
     if (!ctx || !gridData || !projection) return;
 
     // Clear canvas
@@ -44,7 +46,9 @@ class PM25Canvas {
     
     // Grid size (adjusted based on zoom level)
     const baseGridSize = 2;
-    const gridSize = Math.max(1, Math.round(baseGridSize * transform.k));
+    const gridSize = cellPixels
+      ? Math.max(1, Math.ceil(cellPixels))
+      : Math.max(1, Math.round(baseGridSize * transform.k));
     const cityAvoidRadius = 8; // Radius around city points to avoid
     
     // Render each grid point
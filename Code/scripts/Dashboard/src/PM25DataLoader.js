@@ -1,10 +1,314 @@
+// Points of a binary grid as {lat, lon, value}, generated on demand so the
+// grid never has to be expanded into one object per cell
+class GridPoints {
+  constructor(grid) {
+    this.grid = grid;
+    this.length = grid.validCount;
+  }
+
+  *[Symbol.iterator]() {
+    const { values, rows, cols, nodata, scale } = this.grid;
+    for (let i = 0; i < rows; i++) {
+      const lat = this.grid.latAt(i);
+      const offset = i * cols;
+      for (let j = 0; j < cols; j++) {
+        const raw = values[offset + j];
+        if (raw !== nodata) {
+          yield { lat, lon: this.grid.lonAt(j), value: raw * scale };
+        }
+      }
+    }
+  }
+
+  map(fn) {
+    const out = new Array(this.length);
+    let k = 0;
+    for (const point of this) {
+      out[k] = fn(point, k);
+      k++;
+    }
+    return out;
+  }
+}
+
+// Points ({lat, lon, value, max}) of a set of pyramid tiles
+class TilePoints {
+  constructor(tiles, index) {
+    this.tiles = tiles;
+    this.index = index;
+    this.cellDegrees = tiles.length ? Math.abs(tiles[0].level.step.lon) : 0;
+  }
+
+  *[Symbol.iterator]() {
+    const { nodata, scale, tile_size: size } = this.index;
+    for (const tile of this.tiles) {
+      const { level, mean, max, width } = tile;
+      for (let k = 0; k < mean.length; k++) {
+        if (mean[k] === nodata) continue;
+        const i = tile.row * size + Math.floor(k / width);
+        const j = tile.col * size + (k % width);
+        yield {
+          lat: level.origin.lat + i * level.step.lat,
+          lon: level.origin.lon + j * level.step.lon,
+          value: mean[k] * scale,
+          max: max[k] * scale
+        };
+      }
+    }
+  }
+}
+
 class PM25DataLoader {
   constructor() {
     this.data = null;
     this.gridData = null;
+    this.grid = null;
+    this.pyramid = null;
     this.isLoaded = false;
   }
 
+  // Prefer the compact binary grid, fall back to the JSON point list
+  async load(gridUrl = 'pm25_2022_grid.json', jsonUrl = 'pm25_2022_data.json') {
+    if (await this.loadGrid(gridUrl)) {
+      return true;
+    }
+    return this.loadData(jsonUrl);
+  }
+
+  // Tile pyramid written by build_pm25_pyramid.py: only the index is fetched
+  // here, tiles are fetched on demand by getVisiblePoints()
+  async loadPyramid(url = 'pm25_tiles/2022/index.json') {
+    try {
+      const response = await fetch(url);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const index = await response.json();
+      if (index.format !== 'pm25-pyramid' || index.dtype !== 'uint16' || index.byte_order !== 'little') {
+        throw new Error(`Unsupported pyramid format: ${index.format} ${index.dtype}`);
+      }
+      const baseUrl = new URL('.', new URL(url, window.location.href)).href;
+      for (const level of index.levels) {
+        level.present = new Set(level.tiles.map(([row, col]) => `${row}_${col}`));
+      }
+      // Finest level first, as pickLevel() expects
+      index.levels.sort((a, b) => b.level - a.level);
+      this.pyramid = { index, baseUrl, tiles: new Map(), pending: new Map() };
+      console.log('PM2.5 tile pyramid loaded:', index.levels.length, 'levels');
+      return true;
+    } catch (error) {
+      console.error('Error loading PM2.5 tile pyramid:', error);
+      this.pyramid = null;
+      return false;
+    }
+  }
+
+  // Coarsest level whose cells are at most maxCellPixels wide on screen
+  pickLevel(pixelsPerDegree, maxCellPixels = 2) {
+    const levels = this.pyramid.index.levels;
+    for (let k = levels.length - 1; k >= 0; k--) {
+      if (Math.abs(levels[k].step.lon) * pixelsPerDegree <= maxCellPixels) return levels[k];
+    }
+    return levels[0];
+  }
+
+  // Points of the tiles of a level overlapping a lat/lon box. Tiles not
+  // fetched yet are requested and left out; onTileLoaded is called as each
+  // arrives so the caller can redraw.
+  getVisiblePoints(level, box, onTileLoaded) {
+    const { index } = this.pyramid;
+    const size = index.tile_size;
+    const [rows, cols] = level.shape;
+    const cellRange = (lo, hi, origin, step, n) => {
+      const a = (lo - origin) / step;
+      const b = (hi - origin) / step;
+      return [Math.max(0, Math.floor(Math.min(a, b))), Math.min(n - 1, Math.ceil(Math.max(a, b)))];
+    };
+    const [i0, i1] = cellRange(box.latMin, box.latMax, level.origin.lat, level.step.lat, rows);
+    const [j0, j1] = cellRange(box.lonMin, box.lonMax, level.origin.lon, level.step.lon, cols);
+
+    const tiles = [];
+    for (let row = Math.floor(i0 / size); row <= Math.floor(i1 / size); row++) {
+      for (let col = Math.floor(j0 / size); col <= Math.floor(j1 / size); col++) {
+        if (!level.present.has(`${row}_${col}`)) continue;
+        const tile = this.getTile(level, row, col, onTileLoaded);
+        if (tile) tiles.push(tile);
+      }
+    }
+    return new TilePoints(tiles, index);
+  }
+
+  getTile(level, row, col, onTileLoaded) {
+    const key = `${level.level}/${row}_${col}`;
+    const cached = this.pyramid.tiles.get(key);
+    if (cached) return cached;
+    if (!this.pyramid.pending.has(key)) {
+      const url = new URL(level.path.replace('{row}', row).replace('{col}', col), this.pyramid.baseUrl);
+      const request = fetch(url)
+        .then(response => {
+          if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+          return response.arrayBuffer();
+        })
+        .then(buffer => {
+          const size = this.pyramid.index.tile_size;
+          const height = Math.min(size, level.shape[0] - row * size);
+          const width = Math.min(size, level.shape[1] - col * size);
+          const values = new Uint16Array(buffer);
+          this.pyramid.tiles.set(key, {
+            level, row, col, height, width,
+            mean: values.subarray(0, height * width),
+            max: values.subarray(height * width, 2 * height * width)
+          });
+          if (onTileLoaded) onTileLoaded(key);
+        })
+        .catch(error => console.error('Error loading PM2.5 tile', key, error))
+        .finally(() => this.pyramid.pending.delete(key));
+      this.pyramid.pending.set(key, request);
+    }
+    return null;
+  }
+
+  // Manifest written by extract_pm25_years.py: the years available and their files
+  static async loadManifest(url = 'pm25_years/manifest.json') {
+    try {
+      const response = await fetch(url);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const manifest = await response.json();
+      manifest.baseUrl = new URL('.', new URL(url, window.location.href)).href;
+      return manifest;
+    } catch (error) {
+      console.error('Error loading PM2.5 year manifest:', error);
+      return null;
+    }
+  }
+
+  // Load one year listed in a manifest, in whichever format it was extracted
+  async loadYear(manifest, year) {
+    const entry = manifest.years.find(e => e.year === year);
+    if (!entry) {
+      console.warn('No PM2.5 map for year', year);
+      return false;
+    }
+    const url = new URL(entry.file, manifest.baseUrl).href;
+    return manifest.format === 'grid' ? this.loadGrid(url) : this.loadData(url);
+  }
+
+  // Binary grid written by extract_pm25_2022.py --format grid: a JSON header
+  // (origin, step, shape, scale, nodata) and a little-endian uint16 grid
+  async loadGrid(url = 'pm25_2022_grid.json') {
+    try {
+      console.log('Loading PM2.5 grid from:', url);
+      const headerResponse = await fetch(url);
+      if (!headerResponse.ok) {
+        throw new Error(`HTTP error! status: ${headerResponse.status}`);
+      }
+      const header = await headerResponse.json();
+      if (header.format !== 'pm25-grid' || header.dtype !== 'uint16' || header.byte_order !== 'little') {
+        throw new Error(`Unsupported grid format: ${header.format} ${header.dtype}`);
+      }
+
+      // Served precompressed (.bin.gz / .bin.br) by the web server when it supports it
+      const dataUrl = new URL(header.data, new URL(url, window.location.href));
+      const dataResponse = await fetch(dataUrl);
+      if (!dataResponse.ok) {
+        throw new Error(`HTTP error! status: ${dataResponse.status}`);
+      }
+      const buffer = await dataResponse.arrayBuffer();
+      const [rows, cols] = header.shape;
+      if (buffer.byteLength !== rows * cols * 2) {
+        throw new Error(`Grid size mismatch: ${buffer.byteLength} bytes for ${rows}x${cols}`);
+      }
+
+      this.grid = this.createGrid(header, new Uint16Array(buffer));
+      this.gridData = null;
+      this.data = { metadata: header.metadata, data: new GridPoints(this.grid) };
+      console.log('PM2.5 grid loaded successfully');
+      console.log('Grid cells:', rows * cols, 'with data:', this.grid.validCount);
+      console.log('Grid info:', this.data.metadata);
+      this.isLoaded = true;
+      return true;
+
+    } catch (error) {
+      console.error('Error loading PM2.5 grid:', error);
+      this.grid = null;
+      return false;
+    }
+  }
+
+  createGrid(header, values) {
+    // Uint16Array is platform-endian; swap on the (rare) big-endian hosts
+    if (new Uint8Array(new Uint16Array([1]).buffer)[0] === 0) {
+      for (let k = 0; k < values.length; k++) {
+        values[k] = ((values[k] & 0xff) << 8) | (values[k] >> 8);
+      }
+    }
+
+    const [rows, cols] = header.shape;
+    let validCount = 0;
+    for (let k = 0; k < values.length; k++) {
+      if (values[k] !== header.nodata) validCount++;
+    }
+
+    // Evenly spaced axes use origin + index * step; irregular ones list every coordinate
+    const axis = (origin, step, coords) => (coords
+      ? { at: i => coords[i], index: x => nearestIndex(coords, x), step: Math.abs(coords[1] - coords[0]) || 1 }
+      : { at: i => origin + i * step, index: x => Math.round((x - origin) / (step || 1)), step: Math.abs(step) || 1 });
+    const latAxis = axis(header.origin.lat, header.step.lat, header.lats);
+    const lonAxis = axis(header.origin.lon, header.step.lon, header.lons);
+
+    return {
+      values,
+      rows,
+      cols,
+      validCount,
+      nodata: header.nodata,
+      scale: header.scale,
+      latAt: latAxis.at,
+      lonAt: lonAxis.at,
+      latIndex: latAxis.index,
+      lonIndex: lonAxis.index,
+      latStep: latAxis.step,
+      lonStep: lonAxis.step
+    };
+  }
+
+  getGridValue(lat, lon) {
+    const grid = this.grid;
+    const i0 = grid.latIndex(lat);
+    const j0 = grid.lonIndex(lon);
+
+    // Search rings of cells around the nearest one, out to 1 degree
+    const maxRing = Math.ceil(1.0 / Math.min(grid.latStep, grid.lonStep));
+    let minDistance = Infinity;
+    let closestValue = null;
+    for (let ring = 0; ring <= maxRing; ring++) {
+      for (let i = i0 - ring; i <= i0 + ring; i++) {
+        if (i < 0 || i >= grid.rows) continue;
+        const edge = i === i0 - ring || i === i0 + ring;
+        for (let j = j0 - ring; j <= j0 + ring; j += edge ? 1 : 2 * ring) {
+          if (j >= 0 && j < grid.cols) {
+            const raw = grid.values[i * grid.cols + j];
+            if (raw !== grid.nodata) {
+              const distance = Math.hypot(grid.latAt(i) - lat, grid.lonAt(j) - lon);
+              if (distance < minDistance) {
+                minDistance = distance;
+                closestValue = raw * grid.scale;
+              }
+            }
+          }
+          if (ring === 0) break;
+        }
+      }
+      // A later ring cannot hold a closer cell than one found this far in
+      if (minDistance <= ring * Math.min(grid.latStep, grid.lonStep)) break;
+    }
+
+    // Only return values within reasonable distance (less than 1 degree)
+    return minDistance < 1.0 ? closestValue : null;
+  }
+
   async loadData(url = 'pm25_2022_data.json') {
     try {
       console.log('Loading PM2.5 data from:', url);
@@ -41,7 +345,31 @@ class PM25DataLoader {
     console.log('Grid lookup created with', this.gridData.size, 'points');
   }
 
+  // Value of the finest tile already fetched that covers (lat, lon), or null
+  getTileValue(lat, lon) {
+    const { index, tiles } = this.pyramid;
+    const size = index.tile_size;
+    for (const level of index.levels) {
+      const i = Math.round((lat - level.origin.lat) / level.step.lat);
+      const j = Math.round((lon - level.origin.lon) / level.step.lon);
+      if (i < 0 || j < 0 || i >= level.shape[0] || j >= level.shape[1]) continue;
+      const row = Math.floor(i / size);
+      const col = Math.floor(j / size);
+      const tile = tiles.get(`${level.level}/${row}_${col}`);
+      if (!tile) continue;
+      const raw = tile.mean[(i - row * size) * tile.width + (j - col * size)];
+      return raw === index.nodata ? null : raw * index.scale;
+    }
+    return null;
+  }
+
   getPM25Value(lat, lon) {
+    if (this.isLoaded && this.grid) {
+      return this.getGridValue(lat, lon);
+    }
+    if (this.pyramid && !this.gridData) {
+      return this.getTileValue(lat, lon);
+    }
     if (!this.isLoaded || !this.gridData) {
       return null;
     }
@@ -78,7 +406,28 @@ class PM25DataLoader {
 
   // Get data statistics
   getDataStats() {
-    if (!this.isLoaded) return null;
+    if (!this.isLoaded) {
+      // Tiles only: the values are not all known up front
+      return this.pyramid ? { levels: this.pyramid.index.levels.length, year: this.pyramid.index.year } : null;
+    }
+
+    if (this.grid) {
+      const { values, nodata, scale } = this.grid;
+      let min = Infinity;
+      let max = -Infinity;
+      for (let k = 0; k < values.length; k++) {
+        const raw = values[k];
+        if (raw === nodata) continue;
+        if (raw < min) min = raw;
+        if (raw > max) max = raw;
+      }
+      return {
+        min: min * scale,
+        max: max * scale,
+        count: this.grid.validCount,
+        metadata: this.data.metadata
+      };
+    }
     
     const values = this.data.data.map(d => d.value);
     return {
@@ -90,4 +439,18 @@ class PM25DataLoader {
   }
 }
 
+// Index of the coordinate closest to x in a sorted (ascending or descending) array
+function nearestIndex(coords, x) {
+  const descending = coords[coords.length - 1] < coords[0];
+  let lo = 0;
+  let hi = coords.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (descending ? coords[mid] > x : coords[mid] < x) lo = mid + 1;
+    else hi = mid;
+  }
+  if (lo > 0 && Math.abs(coords[lo - 1] - x) <= Math.abs(coords[lo] - x)) return lo - 1;
+  return lo;
+}
+
 export default PM25DataLoader; 
\ No newline at end of file
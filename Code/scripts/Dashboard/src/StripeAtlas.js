@@ -0,0 +1,72 @@
+// Every city's stripe in one image, written by build_stripe_atlas.py: one
+// row per city and one column per year, so a stripe is a crop of its row
+const ATLAS_URL = 'stripe_atlas.json';
+
+let atlasRequest = null;
+
+class StripeAtlas {
+  constructor(index, imageUrl) {
+    this.index = index;
+    this.imageUrl = imageUrl;
+  }
+
+  // Fetched once and shared by every chart; resolves to null when there is no atlas
+  static load(url = ATLAS_URL) {
+    if (!atlasRequest) {
+      atlasRequest = (async () => {
+        try {
+          const response = await fetch(url);
+          if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+          }
+          const index = await response.json();
+          if (index.format !== 'aqs-stripe-atlas' || index.version !== 1) {
+            throw new Error(`Unsupported stripe atlas: ${index.format} ${index.version}`);
+          }
+          const imageUrl = new URL(index.image, new URL(url, window.location.href)).href;
+          // Start the image download now, so the first stripe shows without a second wait
+          new Image().src = imageUrl;
+          return new StripeAtlas(index, imageUrl);
+        } catch (error) {
+          console.warn('No stripe atlas, stripes are drawn from the CSV:', error);
+          return null;
+        }
+      })();
+    }
+    return atlasRequest;
+  }
+
+  has(name) {
+    return Object.prototype.hasOwnProperty.call(this.index.rows, name);
+  }
+
+  // Column range of years [firstYear, lastYear] in the atlas
+  columns(firstYear, lastYear) {
+    return [firstYear - this.index.year_origin, lastYear - this.index.year_origin + 1];
+  }
+
+  // Draw the stripe of a city for years [firstYear, lastYear] into an SVG
+  // selection as an <svg> viewport over the atlas image. Returns false when
+  // the city or the years are not in the atlas.
+  drawSvg(parent, name, firstYear, lastYear, x, y, width, height) {
+    if (!this.has(name)) return false;
+    const [start, end] = this.columns(firstYear, lastYear);
+    if (start < 0 || end > this.index.width) return false;
+    const row = this.index.rows[name];
+    parent.append('svg')
+      .attr('x', x)
+      .attr('y', y)
+      .attr('width', width)
+      .attr('height', height)
+      .attr('viewBox', `${start} ${row} ${end - start} 1`)
+      .attr('preserveAspectRatio', 'none')
+      .append('image')
+      .attr('href', this.imageUrl)
+      .attr('width', this.index.width)
+      .attr('height', this.index.height)
+      .style('image-rendering', 'pixelated');
+    return true;
+  }
+}
+
+export default StripeAtlas;
@@ -3,12 +3,20 @@
 
 import os
 import json
-import re
+import sys
 import tkinter as tk
 from tkinter import messagebox
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store
+from aqs_core.city_manifest import load_city_index
+from aqs_core.city_search import CitySearchIndex
+from aqs_core.virtual_list import VirtualListbox
+
 # —— Configuration ——
 JSON_DIR = 'cities_json'  # Directory containing JSON files for each city
+STORE_DIR = 'cities_store'  # Memory-mapped store (used instead of JSON_DIR when present)
+SEARCH_DELAY_MS = 150  # Live search runs once typing pauses this long
 
 
 # —— end Configuration ——
@@ -63,18 +71,16 @@ class App:
 
         # —— Load all city indices ——
         self.index = []
-        for fname in os.listdir(JSON_DIR):
-            if not fname.endswith('.json'):
-                continue
-            try:
-                obj = json.load(open(os.path.join(JSON_DIR, fname), 'r', encoding='utf-8'))
-                self.index.append({
-                    'fname': fname,
-                    'city': obj.get('city', ''),
-                    'country': obj.get('country', '')
-                })
-            except Exception:
-                pass
+        self.store = city_store.CityStore(STORE_DIR) if city_store.store_exists(STORE_DIR) else None
+        if self.store is not None:
+            for name in self.store.names:
+                city, country = city_store.split_name(name)
+                self.index.append({'name': name, 'city': city, 'country': country})
+        else:
+            # Cached in JSON_DIR/.city_manifest; only new or modified files are parsed
+            self.index = load_city_index(JSON_DIR)
+        self.search_index = CitySearchIndex(f"{it['city']}, {it['country']}" for it in self.index)
+        self._search_job = None
 
         # —— Search area ——
         frm = tk.Frame(root)
@@ -85,10 +91,12 @@ class App:
         self.ent_search.pack(fill='x', pady=(0, 5))
         # Enter key acts the same as clicking Search
         self.ent_search.bind('<Return>', lambda e: self.do_search())
+        # Typing filters the list live, without the Search button's dialogs
+        self.ent_search.bind('<KeyRelease>', self.on_search_key)
 
         tk.Button(frm, text="Search", command=self.do_search).pack(pady=(0, 5))
 
-        self.lst_cities = tk.Listbox(frm, height=6)
+        self.lst_cities = VirtualListbox(frm, height=6, label=lambda it: f"{it['city']}, {it['country']}")
         self.lst_cities.pack(fill='x')
         self.lst_cities.bind("<<ListboxSelect>>", self.on_city_select)
 
@@ -129,25 +137,37 @@ class App:
         self.frm_det.pack_forget()
         self.populate_city_list(self.index)
 
-    def safe_match(self, s, term):
-        """Case-insensitive, ignores punctuation, checks if term is in s"""
-        return term in re.sub(r'[^\w]', ' ', s.lower())
+    def match(self, term):
+        """Index entries matching term (accents, case and punctuation ignored), best first"""
+        return [self.index[i] for i in self.search_index.search(term)]
 
     def populate_city_list(self, items):
         """Display search results in the city list"""
-        self.lst_cities.delete(0, tk.END)
-        for it in items:
-            self.lst_cities.insert(tk.END, f"{it['city']}, {it['country']}")
+        self.lst_cities.set_items(items)
         self.curr_cities = items
 
+    def on_search_key(self, event):
+        """Schedule a live search, replacing the one still pending"""
+        if event.keysym == 'Return':
+            return
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DELAY_MS, self.live_search)
+
+    def live_search(self):
+        self._search_job = None
+        self.populate_city_list(self.match(self.ent_search.get()))
+
     def do_search(self):
         """Handle search action"""
-        term = self.ent_search.get().strip().lower()
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+            self._search_job = None
+        term = self.ent_search.get().strip()
         if not term:
             messagebox.showinfo("Info", "Please enter search keywords")
             return
-        matched = [it for it in self.index
-                   if self.safe_match(it['city'], term) or self.safe_match(it['country'], term)]
+        matched = self.match(term)
         if not matched:
             messagebox.showinfo("Info", "No matching city/country found")
             return
@@ -176,9 +196,12 @@ class App:
 
     def load_annotations(self):
         """Load existing bubbles from JSON and populate the list"""
-        path = os.path.join(JSON_DIR, self.selected['fname'])
-        with open(path, 'r', encoding='utf-8') as f:
-            self.obj = json.load(f)
+        if self.store is not None:
+            self.obj = self.store.record(self.selected['name'])
+        else:
+            path = os.path.join(JSON_DIR, self.selected['fname'])
+            with open(path, 'r', encoding='utf-8') as f:
+                self.obj = json.load(f)
         ann = self.obj.get('bubbles', [])
         self.lst_ann.delete(0, tk.END)
         for a in ann:
@@ -264,6 +287,9 @@ class App:
 
     def _write_json(self):
         """Write back to JSON file"""
+        if self.store is not None:
+            self.store.set_bubbles(self.selected['name'], self.obj.get('bubbles', []))
+            return
         path = os.path.join(JSON_DIR, self.selected['fname'])
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(self.obj, f, ensure_ascii=False, indent=2)
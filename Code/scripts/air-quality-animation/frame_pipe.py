@@ -0,0 +1,175 @@
+"""
+Raw-frame animation engine for the stripe videos
+
+FuncAnimation.save redraws the whole figure for every frame. Here the static
+parts (stripe, axes, title) are rasterized once, each frame only draws the new
+line segment, bubbles are rasterized once when they are revealed (following a
+precomputed year -> frame schedule), and the Agg buffer is streamed as raw
+RGBA into an ffmpeg subprocess.
+"""
+
+import subprocess
+
+import numpy as np
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.lines import Line2D
+
+from aqs_core import trace
+
+
+class FFmpegPipe:
+    """Encode raw RGBA frames written to an ffmpeg process into an H.264 MP4"""
+
+    def __init__(self, output_path, width, height, fps, ffmpeg_path=None):
+        ffmpeg = ffmpeg_path or matplotlib.rcParams['animation.ffmpeg_path']
+        cmd = [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-',
+            # libx264 with yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+            output_path,
+        ]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.frames = 0
+
+    def write(self, buffer):
+        self.proc.stdin.write(buffer)
+        self.frames += 1
+
+    def close(self):
+        # Waits for ffmpeg to encode the frames still in the pipe
+        with trace.span('encode', frames=self.frames):
+            self.proc.stdin.close()
+            err = self.proc.stderr.read()
+            returncode = self.proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {err.decode('utf-8', errors='replace').strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.proc.kill()
+            self.proc.wait()
+        return False
+
+
+def bubble_schedule(years, bubble_info):
+    """
+    Map frame index -> bubbles revealed in that frame. A bubble appears on the
+    frame of its year; bubbles whose year has no data are dropped, and only
+    the first bubble of a year is kept.
+    """
+    years = np.asarray(years)
+    schedule = {}
+    seen = set()
+    for bubble in bubble_info:
+        year = bubble[0]
+        idx = int(np.searchsorted(years, year))
+        if idx < len(years) and years[idx] == year and year not in seen:
+            seen.add(year)
+            schedule.setdefault(idx, []).append(bubble)
+    return schedule
+
+
+class BubbleSprite:
+    """
+    A bubble rasterized once into a premultiplied RGBA patch.
+
+    The artist is drawn over black and over white; the two results give the
+    premultiplied colour (the black one) and the alpha (from their difference),
+    which is exact for Agg's "over" blending.
+    """
+
+    def __init__(self, canvas, ax, artist):
+        buf = np.asarray(canvas.buffer_rgba())
+        saved = buf.copy()
+        layers = []
+        for level in (0, 255):
+            buf[..., :3] = level
+            ax.draw_artist(artist)
+            layers.append(buf[..., :3].astype(np.float32))
+        buf[...] = saved
+        on_black, on_white = layers
+
+        alpha = 1.0 - (on_white[..., 0] - on_black[..., 0]) / 255.0
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if len(rows) == 0:
+            self.box = None
+            return
+        self.box = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        self.premultiplied = on_black[self.box]
+        self.inverse_alpha = (1.0 - alpha[self.box])[..., None]
+
+    def composite(self, buf):
+        """Blend the bubble over buf in place; returns the pixels it covered"""
+        region = buf[self.box + (slice(0, 3),)]
+        under = region.copy()
+        region[...] = np.rint(self.premultiplied + region * self.inverse_alpha).astype(np.uint8)
+        return under
+
+    def restore(self, buf, under):
+        buf[self.box + (slice(0, 3),)] = under
+
+
+def render_frames(fig, line_ax, years, values, schedule, make_annotation, write,
+                  line_kw=None):
+    """
+    Render one frame per year and pass each Agg buffer to write().
+
+    line_ax is the axes the trend line lives in; make_annotation(bubble, idx)
+    must create the bubble's artist (on line_ax) for the frame index idx.
+    The renderer only ever holds the static background plus the line; the
+    visible bubbles are composited on top of it just for the write, so they
+    stay above the line without being re-drawn every frame.
+    """
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    canvas.draw()
+    buf = np.asarray(canvas.buffer_rgba())
+
+    # Round caps hide the joints between the per-frame segments
+    line_kw = dict({'color': 'white', 'linewidth': 5, 'zorder': 10}, **(line_kw or {}))
+    segment = Line2D([], [], solid_capstyle='round', animated=True, **line_kw)
+    line_ax.add_line(segment)
+
+    years = np.asarray(years, dtype=float)
+    values = np.asarray(values, dtype=float)
+    sprites = []
+    for frame in range(len(years)):
+        with trace.timer('frame render'):
+            if frame:
+                segment.set_data(years[frame - 1:frame + 1], values[frame - 1:frame + 1])
+                line_ax.draw_artist(segment)
+            for bubble in schedule.get(frame, ()):
+                artist = make_annotation(bubble, frame)
+                artist.set_animated(True)
+                sprite = BubbleSprite(canvas, line_ax, artist)
+                if sprite.box is not None:
+                    sprites.append(sprite)
+
+            covered = [sprite.composite(buf) for sprite in sprites]
+        # Blocks while ffmpeg is behind: the time spent waiting for the encoder
+        with trace.timer('frame write'):
+            write(canvas.buffer_rgba())
+        trace.count('frames')
+        for sprite, under in reversed(list(zip(sprites, covered))):
+            sprite.restore(buf, under)
+    return len(years)
+
+
+def save_animation(fig, line_ax, years, values, schedule, make_annotation, output_path,
+                   fps=10, ffmpeg_path=None, line_kw=None):
+    """Render the frames straight into an MP4 file; returns the number of frames"""
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    width, height = canvas.get_width_height(physical=True)
+    with FFmpegPipe(output_path, width, height, fps, ffmpeg_path) as pipe:
+        with trace.span('render frames', frames=len(years), width=width, height=height):
+            render_frames(fig, line_ax, years, values, schedule, make_annotation, pipe.write, line_kw)
+    return pipe.frames
@@ -1,92 +1,128 @@
 import os
 import json
+import argparse
+import fnmatch
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import matplotlib.animation as animation
-import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store, scale, trace
+from aqs_core.city_manifest import load_city_index
+from aqs_core.fileio import write_json_atomic
+from aqs_core.naming import safe
+# matplotlib and frame_pipe are imported on first render (see _pyplot), so
+# listing and selecting cities starts without them
 
 # ====== 1) Set the directory for city JSON files ======
 cities_json_dir = "cities_json"
+# Memory-mapped store written by split_cities.py; used instead of cities_json when present
+cities_store_dir = "cities_store"
 
-# ====== 2) Specify the target city ======
+# ====== 2) Default target city (when none is given on the command line) ======
 target_city = "London, United Kingdom"
 
-# ====== 3) Specify the output folder for the animation ======
+# ====== 3) Default output folder for the animations ======
 output_dir = "."  # Current directory
-os.makedirs(output_dir, exist_ok=True)
 
 # ====== 4) Locate the corresponding JSON file ======
-# Split city and country
-city_name, country = target_city.split(", ")
-
-# Same safe filename function as in split_cities.py
-def safe(s):
-    # Remove all non-alphanumeric characters, spaces, underscores, and hyphens
-    tmp = re.sub(r'[^\w\-\s]', '', s)
-    # Replace spaces with underscores
-    return tmp.replace(' ', '_')
-
-# Generate filename
-safe_city = safe(city_name)
-safe_country = safe(country)
-json_filename = f"{safe_city}_{safe_country}.json"
-json_file_path = os.path.join(cities_json_dir, json_filename)
-
-# Check if file exists
-if not os.path.exists(json_file_path):
+# File names come from aqs_core.naming.safe, as in split_cities.py
+def find_city_json(city_name, country):
+    """Return the path of the city's JSON file, falling back to a case-insensitive match"""
+    safe_city = safe(city_name)
+    safe_country = safe(country)
+    json_filename = f"{safe_city}_{safe_country}.json"
+    json_file_path = os.path.join(cities_json_dir, json_filename)
+    if os.path.exists(json_file_path):
+        return json_file_path
+
     # If not found, try to list and fuzzy-match in the directory
     print(f"Exact file not found: {json_filename}")
-    found = False
-
     for filename in os.listdir(cities_json_dir):
         if filename.endswith('.json'):
             parts = filename.replace('.json', '').split('_')
             if len(parts) >= 2:
                 file_country = parts[-1]
                 file_city = '_'.join(parts[:-1])
-                if (file_city.lower() == safe_city.lower() and 
+                if (file_city.lower() == safe_city.lower() and
                     file_country.lower() == safe_country.lower()):
-                    json_filename = filename
-                    json_file_path = os.path.join(cities_json_dir, filename)
                     print(f"Matched file found: {filename}")
-                    found = True
-                    break
-
-    if not found:
-        raise FileNotFoundError(f"JSON file for city '{target_city}' not found")
-
-# ====== 5) Read JSON data ======
-with open(json_file_path, 'r', encoding='utf-8') as f:
-    city_data = json.load(f)
-
-# ====== 6) Extract year and PM2.5 values ======
-data_points = city_data['data']
-years = np.array([point['year'] for point in data_points])
-pm25_values = np.array([point['value'] for point in data_points if point['value'] is not None])
-
-# Ensure consistency (handle None values)
-valid_indices = [i for i, point in enumerate(data_points) if point['value'] is not None]
-years = np.array([data_points[i]['year'] for i in valid_indices])
-
-# ====== 7) Define color scale and colormap ======
-bounds = [0, 5, 10, 15, 20, 30, 40, 50, 60, 70, 80, 90, 99999]
-c_list = [
-    (164/255, 255/255, 255/255),  # 0 - 5    Very Good
-    (176/255, 218/255, 233/255),  # 5 - 10   Fair (lower)
-    (176/255, 206/255, 237/255),  # 10 - 15  Fair (upper)
-    (249/255, 224/255, 71/255),   # 15 - 20  Moderate (lower)
-    (242/255, 200/255, 75/255),   # 20 - 30  Moderate (upper)
-    (241/255, 166/255, 63/255),   # 30 - 40  Poor (lower)
-    (233/255, 135/255, 37/255),   # 40 - 50  Poor (upper)
-    (175/255, 69/255, 83/255),    # 50 - 60  Very Poor (lower)
-    (134/255, 59/255, 71/255),    # 60 - 70  Very Poor (upper)
-    (103/255, 58/255, 61/255),    # 70 - 80  Extremely Poor (lower)
-    (70/255, 47/255, 48/255),     # 80 - 90  Extremely Poor (mid)
-    (37/255, 36/255, 36/255),     # 90+      Extremely Poor (upper)
-]
-cmap = mcolors.ListedColormap(c_list)
-norm = mcolors.BoundaryNorm(bounds, cmap.N)
+                    return os.path.join(cities_json_dir, filename)
+
+    raise FileNotFoundError(f"JSON file for city '{city_name}, {country}' not found")
+
+# ====== 5) Read city data ======
+_store = None
+
+def get_store():
+    """The city store of this process, or None when only cities_json is available"""
+    global _store
+    if _store is None and city_store.store_exists(cities_store_dir):
+        _store = city_store.CityStore(cities_store_dir)
+    return _store
+
+def list_cities():
+    """All "City, Country" names available for rendering"""
+    store = get_store()
+    if store is not None:
+        return list(store.names)
+    return [f"{it['city']}, {it['country']}" for it in load_city_index(cities_json_dir)]
+
+def input_signature(target_city):
+    """
+    Hash of everything the animation of one city is rendered from: its
+    series and bubbles in the store, or its JSON file. Other cities' edits
+    do not change it, unlike the mtime of the shared store files.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    store = get_store()
+    if store is not None:
+        years, pm25_values = store.valid_series(target_city)
+        h.update(np.ascontiguousarray(years, dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(pm25_values, dtype=np.float64).tobytes())
+        h.update(json.dumps(store.bubbles(target_city), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    else:
+        with open(find_city_json(*city_store.split_name(target_city)), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def load_city_data(target_city):
+    """Return (city_data, years, pm25_values) with missing years dropped"""
+    city_name, country = city_store.split_name(target_city)
+    store = get_store()
+    if store is not None:
+        # Read the city's column from the store (zero-copy)
+        with trace.span('store read', city=target_city):
+            years, pm25_values = store.valid_series(target_city)
+            city_data = {'city': city_name, 'country': country, 'bubbles': store.bubbles(target_city)}
+        return city_data, years, pm25_values
+
+    json_path = find_city_json(city_name, country)
+    with trace.span('json load', file=json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            city_data = json.load(f)
+
+    # ====== 6) Extract year and PM2.5 values ======
+    data_points = city_data['data']
+    pm25_values = np.array([point['value'] for point in data_points if point['value'] is not None])
+
+    # Ensure consistency (handle None values)
+    valid_indices = [i for i, point in enumerate(data_points) if point['value'] is not None]
+    years = np.array([data_points[i]['year'] for i in valid_indices])
+    return city_data, years, pm25_values
+
+# ====== 7) Color scale (aqs_core.scale) and matplotlib ======
+bounds = scale.BOUNDS
+c_list = scale.COLORS
+
+def _pyplot():
+    """pyplot on the Agg backend, imported on first use"""
+    import matplotlib
+    matplotlib.use("Agg")  # Rendering straight to file, also inside worker processes
+    import matplotlib.pyplot as plt
+    return plt
 
 # ====== 8) Define text wrapping function ======
 def wrap_text_to_two_lines(text):
@@ -120,54 +156,63 @@ def wrap_text_to_two_lines(text):
         return line1 + "\n" + line2 + "\n" + line3
 
 # ====== 9) Extract bubble information from JSON ======
-bubble_info = []
-
-if 'bubbles' in city_data:
-    for bubble in city_data['bubbles']:
-        year = bubble.get('year')
-        text = bubble.get('text')
-        offset_x = bubble.get('offset_x', 0)
-        offset_y = bubble.get('offset_y', 0)
-
-        if year and text:
-            wrapped_text = wrap_text_to_two_lines(text)
-            bubble_info.append((year, wrapped_text, offset_x, offset_y))
-
-# Fallback to CSV if no bubbles found (backward compatibility)
-if not bubble_info and os.path.exists("bubbles_text.csv") and os.path.exists("bubbles_offset.csv"):
-    try:
-        import pandas as pd
-        bubbles_text_df = pd.read_csv("bubbles_text.csv", index_col=0, encoding="utf-8-sig")
-        bubbles_offset_df = pd.read_csv("bubbles_offset.csv", index_col=0, encoding="utf-8-sig")
-
-        all_years_in_text = bubbles_text_df.index.intersection(bubbles_offset_df.index)
-
-        for y in all_years_in_text:
-            try:
-                year_int = int(y)
-            except ValueError:
-                continue
-
-            text_val = bubbles_text_df.get(target_city, pd.Series(dtype='object')).get(y, None)
-            offset_val = bubbles_offset_df.get(target_city, pd.Series(dtype='object')).get(y, None)
-
-            if pd.notnull(text_val) and str(text_val).strip() != "" and \
-               pd.notnull(offset_val) and str(offset_val).strip() != "":
-                wrapped_text = wrap_text_to_two_lines(str(text_val).strip())
+def extract_bubble_info(target_city, city_data):
+    """Return sorted (year, wrapped_text, offset_x, offset_y) tuples for a city"""
+    bubble_info = []
+
+    if 'bubbles' in city_data:
+        for bubble in city_data['bubbles']:
+            year = bubble.get('year')
+            text = bubble.get('text')
+            offset_x = bubble.get('offset_x', 0)
+            offset_y = bubble.get('offset_y', 0)
+
+            if year and text:
+                wrapped_text = wrap_text_to_two_lines(text)
+                bubble_info.append((year, wrapped_text, offset_x, offset_y))
+
+    # Fallback to CSV if no bubbles found (backward compatibility)
+    if not bubble_info and os.path.exists("bubbles_text.csv") and os.path.exists("bubbles_offset.csv"):
+        try:
+            import pandas as pd
+            bubbles_text_df = pd.read_csv("bubbles_text.csv", index_col=0, encoding="utf-8-sig")
+            bubbles_offset_df = pd.read_csv("bubbles_offset.csv", index_col=0, encoding="utf-8-sig")
+
+            all_years_in_text = bubbles_text_df.index.intersection(bubbles_offset_df.index)
+
+            for y in all_years_in_text:
                 try:
-                    ox_str, oy_str = offset_val.split(",")
-                    ox, oy = float(ox_str), float(oy_str)
-                except Exception:
+                    year_int = int(y)
+                except ValueError:
                     continue
-                bubble_info.append((year_int, wrapped_text, ox, oy))
-    except Exception as e:
-        print(f"Failed to read bubble CSV files: {e}")
 
-bubble_info.sort(key=lambda x: x[0])
+                text_val = bubbles_text_df.get(target_city, pd.Series(dtype='object')).get(y, None)
+                offset_val = bubbles_offset_df.get(target_city, pd.Series(dtype='object')).get(y, None)
+
+                if pd.notnull(text_val) and str(text_val).strip() != "" and \
+                   pd.notnull(offset_val) and str(offset_val).strip() != "":
+                    wrapped_text = wrap_text_to_two_lines(str(text_val).strip())
+                    try:
+                        ox_str, oy_str = offset_val.split(",")
+                        ox, oy = float(ox_str), float(oy_str)
+                    except Exception:
+                        continue
+                    bubble_info.append((year_int, wrapped_text, ox, oy))
+        except Exception as e:
+            print(f"Failed to read bubble CSV files: {e}")
+
+    bubble_info.sort(key=lambda x: x[0])
+    return bubble_info
 
 # ====== 10) Define function to generate animation with bubbles ======
-def create_animation_for_city(city_name, country, years, pm25_values, output_path):
-    fig, ax = plt.subplots(figsize=(12, 6))
+ANIMATION_FPS = 10
+ANIMATION_DPI = 150
+
+def setup_figure(city_name, country, years, pm25_values, dpi=None):
+    """Build the static figure: stripe background, axes and title. Returns (fig, ax, ax2)"""
+    plt = _pyplot()
+    cmap, norm = scale.colormap()
+    fig, ax = plt.subplots(figsize=(12, 6), dpi=dpi)
 
     # (A) Draw background color stripe
     ax.imshow(
@@ -180,9 +225,8 @@ def create_animation_for_city(city_name, country, years, pm25_values, output_pat
     ax.set_yticks([])
     ax.set_xlim([years[0], years[-1] + 5])
 
-    # (B) Add white line using a second y-axis
+    # (B) Second y-axis for the white line
     ax2 = ax.twinx()
-    line, = ax2.plot([], [], color="white", linewidth=5, zorder=10)
     ax2.set_xlim([years[0], years[-1] + 1])
     ax2.set_ylim([0, 120])
 
@@ -194,6 +238,41 @@ def create_animation_for_city(city_name, country, years, pm25_values, output_pat
     ax.set_facecolor("white")
     for spine in ax.spines.values():
         spine.set_visible(False)
+    return fig, ax, ax2
+
+def annotate_bubble(ax2, y_int, text_val, ox, oy, bubble_yval):
+    return ax2.annotate(
+        text_val,
+        xy=(y_int, bubble_yval),
+        xytext=(y_int + ox, bubble_yval + oy),
+        arrowprops=dict(arrowstyle="->", color='black'),
+        bbox=dict(boxstyle="round,pad=0.5", fc=(1, 1, 1, 0.5), ec="black", lw=1),
+        fontsize=9,
+        color="black",
+        zorder=11
+    )
+
+def create_animation_for_city(city_name, country, years, pm25_values, output_path, bubble_info):
+    """Render through the raw-frame ffmpeg pipe (see frame_pipe.py)"""
+    import frame_pipe
+    with trace.span('figure build'):
+        fig, ax, ax2 = setup_figure(city_name, country, years, pm25_values, dpi=ANIMATION_DPI)
+    try:
+        schedule = frame_pipe.bubble_schedule(years, bubble_info)
+        frame_pipe.save_animation(
+            fig, ax2, years, pm25_values, schedule,
+            lambda bubble, idx: annotate_bubble(ax2, *bubble, pm25_values[idx]),
+            output_path, fps=ANIMATION_FPS
+        )
+    finally:
+        _pyplot().close(fig)
+
+def create_animation_for_city_funcanimation(city_name, country, years, pm25_values, output_path, bubble_info):
+    """Original FuncAnimation renderer, redrawing the whole figure every frame"""
+    import matplotlib.animation as animation
+    with trace.span('figure build'):
+        fig, ax, ax2 = setup_figure(city_name, country, years, pm25_values)
+    line, = ax2.plot([], [], color="white", linewidth=5, zorder=10)
 
     added_annotations = {}
 
@@ -213,17 +292,7 @@ def create_animation_for_city(city_name, country, years, pm25_values, output_pat
                 if len(idx) == 0:
                     continue
                 idx = idx[0]
-                bubble_yval = pm25_values[idx]
-                ann = ax2.annotate(
-                    text_val,
-                    xy=(y_int, bubble_yval),
-                    xytext=(y_int + ox, bubble_yval + oy),
-                    arrowprops=dict(arrowstyle="->", color='black'),
-                    bbox=dict(boxstyle="round,pad=0.5", fc=(1, 1, 1, 0.5), ec="black", lw=1),
-                    fontsize=9,
-                    color="black",
-                    zorder=11
-                )
+                ann = annotate_bubble(ax2, y_int, text_val, ox, oy, pm25_values[idx])
                 added_annotations[y_int] = ann
 
         return (line,)
@@ -232,20 +301,135 @@ def create_animation_for_city(city_name, country, years, pm25_values, output_pat
         fig, update,
         init_func=init,
         frames=len(years),
-        interval=100,
+        interval=1000 // ANIMATION_FPS,
         blit=True
     )
 
-    anim.save(output_path, fps=10, dpi=150)
-    plt.close(fig)
-
-# ====== 11) Generate and save animation ======
-city_name_display = city_data.get('city', city_name)
-country_display = city_data.get('country', country)
-save_path = os.path.join(output_dir, f"{city_name_display}_{country_display}.mp4")
-create_animation_for_city(city_name_display, country_display, years, pm25_values, save_path)
-print(f"Animation saved to: {save_path}")
-if bubble_info:
-    print(f"{len(bubble_info)} bubble annotations added.")
-else:
-    print("Warning: No bubble annotations found.")
+    # Frames are rendered and encoded together here
+    with trace.span('render frames', frames=len(years), engine='funcanimation'):
+        anim.save(output_path, fps=ANIMATION_FPS, dpi=ANIMATION_DPI)
+    _pyplot().close(fig)
+
+ENGINES = {
+    'pipe': create_animation_for_city,
+    'funcanimation': create_animation_for_city_funcanimation,
+}
+
+# ====== 11) Generate and save the animation of one city ======
+def output_path_for(target_city, output_dir=output_dir):
+    city_name, country = city_store.split_name(target_city)
+    return os.path.join(output_dir, f"{city_name}_{country}.mp4")
+
+# Written next to each MP4: the input signature it was rendered from
+SIGNATURE_SUFFIX = '.inputs.json'
+
+def rendered_signature(path):
+    try:
+        with open(path + SIGNATURE_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f).get('signature')
+    except (OSError, ValueError):
+        return None
+
+def render_city(target_city, output_dir=output_dir, force=False, engine='pipe'):
+    """
+    Render one city to MP4. Never raises: the returned dict carries the
+    status ('ok', 'skipped' or 'failed'), timing and any error message.
+    """
+    start = time.perf_counter()
+    result = {'city': target_city, 'path': output_path_for(target_city, output_dir), 'bubbles': 0}
+    try:
+        signature = input_signature(target_city)
+        if not force and os.path.exists(result['path']) and rendered_signature(result['path']) == signature:
+            result.update(status='skipped', seconds=time.perf_counter() - start)
+            return result
+
+        city_data, years, pm25_values = load_city_data(target_city)
+        if len(years) == 0:
+            raise ValueError("No valid PM2.5 data")
+        bubble_info = extract_bubble_info(target_city, city_data)
+
+        os.makedirs(output_dir, exist_ok=True)
+        city_name, country = city_store.split_name(target_city)
+        city_name_display = city_data.get('city', city_name)
+        country_display = city_data.get('country', country)
+        with trace.span('render city', city=target_city, engine=engine, frames=len(years)):
+            ENGINES[engine](city_name_display, country_display, years, pm25_values,
+                            result['path'], bubble_info)
+        write_json_atomic(result['path'] + SIGNATURE_SUFFIX, {'city': target_city, 'signature': signature})
+        result.update(status='ok', bubbles=len(bubble_info))
+    except Exception as e:
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# ====== 12) Render many cities in parallel ======
+def resolve_cities(specs):
+    """
+    Expand city specs into "City, Country" names. A spec is an exact name,
+    a glob pattern (e.g. "*, United Kingdom") or "all".
+    """
+    available = list_cities()
+    selected = []
+    for spec in specs:
+        if spec == 'all':
+            matches = available
+        elif any(ch in spec for ch in '*?['):
+            matches = [name for name in available if fnmatch.fnmatch(name, spec)]
+            if not matches:
+                print(f"Warning: no city matches '{spec}'")
+        else:
+            matches = [spec]
+        selected.extend(m for m in matches if m not in selected)
+    return selected
+
+def render_cities(specs, output_dir=output_dir, workers=None, force=False, engine='pipe'):
+    """
+    Render every city selected by specs, using a pool of worker processes.
+    Prints a line per city as it finishes and returns the list of results.
+    """
+    cities = resolve_cities(specs)
+    workers = min(workers or os.cpu_count() or 1, max(len(cities), 1))
+    results = []
+
+    def report(result):
+        results.append(result)
+        line = f"[{result['status']:>7}] {result['city']} ({result['seconds']:.1f}s)"
+        if result['status'] == 'failed':
+            line += f" - {result['error']}"
+        elif result['status'] == 'ok':
+            line += f" -> {result['path']}, {result['bubbles']} bubbles"
+        print(line, flush=True)
+
+    start = time.perf_counter()
+    if workers == 1:
+        for city in cities:
+            report(render_city(city, output_dir, force, engine))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_city, city, output_dir, force, engine) for city in cities]
+            for future in as_completed(futures):
+                report(future.result())
+
+    counts = {status: sum(r['status'] == status for r in results) for status in ('ok', 'skipped', 'failed')}
+    print(f"Done in {time.perf_counter() - start:.1f}s with {workers} worker(s): "
+          f"{counts['ok']} rendered, {counts['skipped']} up to date, {counts['failed']} failed.")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PM2.5 stripe animations with annotation bubbles.")
+    parser.add_argument('cities', nargs='*', default=[target_city],
+                        help='"City, Country" names, glob patterns such as "*, India", or "all"')
+    parser.add_argument('-o', '--output-dir', default=output_dir, help='Folder for the MP4 files')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('-f', '--force', action='store_true', help='Re-render cities whose MP4 is up to date')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='pipe',
+                        help='pipe: stream raw frames to ffmpeg (default); funcanimation: original renderer')
+    trace.add_argument(parser)
+    args = parser.parse_args(argv)
+    trace.from_args(args)
+
+    results = render_cities(args.cities, args.output_dir, args.workers, args.force, args.engine)
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
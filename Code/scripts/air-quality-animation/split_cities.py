@@ -1,65 +1,244 @@
 import os
+import sys
 import json
-import pandas as pd
-import re
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store, trace
+from aqs_core.fileio import write_bytes_atomic, write_json_atomic
+from aqs_core.naming import city_filename
 
 # —— Configuration ——
 csv_path = 'V1pt6_Cities_Data_PM2pt5.csv'  # Use full path if not in the same directory
 output_dir = 'cities_json'  # Output directory
+store_dir = 'cities_store'  # Memory-mapped store read by the other tools
+state_path = 'split_cities_state.json'  # Series hash of every written file, for incremental runs
+year_col = 'Year'  # Name of the "year" column
+encode_chunk = 1024  # Cities encoded per batch by the bulk exporter
 # —— end Configuration ——
 
-# 1. Read CSV
-df = pd.read_csv(csv_path)
 
-# 2. Confirm the column name for "year"
-year_col = 'Year'
+def series_hash(name, years, values, bubbles=None):
+    """Hash of a city's name, year/value series (NaN-safe) and bubbles, if any"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(name.encode('utf-8'))
+    h.update(np.ascontiguousarray(years, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    # Cities without bubbles keep the hash of a series-only state file
+    if bubbles:
+        h.update(json.dumps(bubbles, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
 
-# 3. Prepare the output directory
-os.makedirs(output_dir, exist_ok=True)
 
-# 4. Iterate through all city columns (skip the year column)
-for col in df.columns:
-    if col == year_col:
-        continue
-    # col format example: "Accra, Ghana" or "Abidjan, Côte d'Ivoire"
-    # Split by the last comma
-    city_raw, country_raw = col.rsplit(',', 1)
-    city = city_raw.strip()
-    country = country_raw.strip()
-
-    # Extract year-value pairs for this column
-    records = []
-    for yr, val in zip(df[year_col], df[col]):
-        if pd.isna(val):
-            value = None
+def load_state(path, fmt):
+    """Hashes of the previous run, or nothing if it wrote another output format"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('format', 'indent') != fmt:
+        return {}
+    return state.get('files', {})
+
+
+# —— Bulk exporter ——
+# Every city file has the same layout, so documents are assembled from
+# per-year byte templates interleaved with the value tokens of the city.
+# The tokens of a whole batch of cities come from a single encoder call
+# on the value matrix, with NaN turned into null at the array level.
+
+def _dumps(obj, indent):
+    text = json.dumps(obj, ensure_ascii=False, indent=indent,
+                      separators=None if indent else (',', ':'))
+    return text.encode('utf-8')
+
+
+def encode_rows(matrix):
+    """JSON number tokens of each row of a 2-D float array (NaN -> null)"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    if orjson is not None:
+        doc = orjson.dumps(matrix, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        doc = json.dumps(matrix.tolist(), separators=(',', ':')).replace('NaN', 'null').encode('ascii')
+    return [row.split(b',') for row in doc[2:-2].split(b'],[')]
+
+
+class DocumentTemplate:
+    """Byte templates of a city file, for a fixed year axis and indent (2 or None)"""
+
+    def __init__(self, years, indent=2):
+        self.indent = indent
+        years = [int(y) for y in years]
+        if indent:
+            first = b'    {\n      "year": %d,\n      "value": '
+            between = b'\n    },\n    {\n      "year": %d,\n      "value": '
+            self.tail = b'\n    }\n  ]\n}'
         else:
-            value = float(val)
-        records.append({
-            "year": int(yr),
-            "value": value
-        })
-
-    # Construct JSON object
-    out_obj = {
-        "city": city,
-        "country": country,
-        "data": records
-    }
-
-    # Generate a valid filename: city_country.json
-    # Keep only alphanumeric characters, underscores, and hyphens
-    def safe(s):
-        # Remove all non-alphanumeric, non-space, non-underscore, and non-hyphen characters
-        tmp = re.sub(r'[^\w\-\s]', '', s)
-        # Replace spaces with underscores
-        return tmp.replace(' ', '_')
-
-    safe_city = safe(city)
-    safe_country = safe(country)
-    filename = f"{safe_city}_{safe_country}.json"
-
-    out_path = os.path.join(output_dir, filename)
-    with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(out_obj, f, ensure_ascii=False, indent=2)
-
-print(f"Done: Generated JSON files for {len(df.columns) - 1} cities, saved in '{output_dir}/' directory.")
+            first = b'{"year":%d,"value":'
+            between = b'},{"year":%d,"value":'
+            self.tail = b'}]}'
+        self.prefixes = [(between if i else first) % y for i, y in enumerate(years)]
+
+    def head(self, city, country):
+        city, country = _dumps(city, None), _dumps(country, None)
+        if self.indent:
+            return b'{\n  "city": ' + city + b',\n  "country": ' + country + b',\n  "data": [\n'
+        return b'{"city":' + city + b',"country":' + country + b',"data":['
+
+    def render(self, city, country, tokens):
+        parts = [None] * (2 * len(tokens))
+        parts[0::2] = self.prefixes
+        parts[1::2] = tokens
+        return self.head(city, country) + b''.join(parts) + self.tail
+
+    def append_keys(self, doc, extra):
+        """Append top-level keys to a rendered document, as json.dump would"""
+        closing = b'\n}' if self.indent else b'}'
+        doc = doc[:-len(closing)]
+        for key, value in extra.items():
+            encoded = _dumps(value, self.indent)
+            if self.indent:
+                doc += b',\n  ' + _dumps(key, None) + b': ' + encoded.replace(b'\n', b'\n  ')
+            else:
+                doc += b',' + _dumps(key, None) + b':' + encoded
+        return doc + closing
+
+
+def _write_city_document(out_path, doc, template, bubbles=None):
+    """
+    Write one city file atomically, with its bubbles when given (the store's
+    annotations). Without them, keys that only exist in the current file (the
+    "bubbles" added by annotate_cities.py when there is no store) are carried over.
+    """
+    if bubbles is not None:
+        if bubbles:
+            doc = template.append_keys(doc, {'bubbles': bubbles})
+    elif os.path.exists(out_path):
+        with open(out_path, 'rb') as f:
+            raw = f.read()
+        existing = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        extra = {k: v for k, v in existing.items() if k not in ('city', 'country', 'data')}
+        if extra:
+            doc = template.append_keys(doc, extra)
+    write_bytes_atomic(out_path, doc)
+    return len(doc)
+
+
+def export_city_json(names, years, values, output_dir, columns=None, indent=2, workers=None, bubbles=None):
+    """
+    Write one JSON file per city from a year x city matrix in a single pass.
+    columns restricts the export to those column indices. bubbles(name) gives
+    the bubbles of a city (e.g. CityStore.bubbles); without it the bubbles of
+    the existing files are kept. Files are written
+    by a thread pool while the next batch of cities is being encoded, and at
+    most two batches of documents are held in memory.
+    Returns the number of bytes written.
+    """
+    if columns is None:
+        columns = range(len(names))
+    columns = list(columns)
+    template = DocumentTemplate(years, indent)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        pending = []
+        for start in range(0, len(columns), encode_chunk):
+            batch = columns[start:start + encode_chunk]
+            submitted = []
+            with trace.timer('json encode'):
+                for col, tokens in zip(batch, encode_rows(values[:, batch].T)):
+                    city, country = city_store.split_name(names[col])
+                    doc = template.render(city, country, tokens)
+                    out_path = os.path.join(output_dir, city_filename(city, country))
+                    city_bubbles = bubbles(names[col]) if bubbles is not None else None
+                    submitted.append(pool.submit(_write_city_document, out_path, doc, template, city_bubbles))
+            written += sum(f.result() for f in pending)
+            pending = submitted
+        written += sum(f.result() for f in pending)
+    return written
+
+
+def split_cities(csv_path=csv_path, output_dir=output_dir, store_dir=store_dir,
+                 state_path=state_path, full=False, compact=False, workers=None):
+    """
+    Export one JSON file per city column of the CSV. Unless full is set, only
+    cities whose series changed since the last run (or whose file is missing)
+    are rewritten. Returns (written, unchanged) counts.
+    """
+    import pandas as pd
+
+    # 1. Read CSV
+    with trace.span('csv parse', file=csv_path) as span:
+        df = pd.read_csv(csv_path)
+        span.set(rows=len(df), columns=len(df.columns))
+
+    # 2. Prepare the output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 3. Write the columnar store. Bubbles are only imported from the JSON files
+    #    when the store is first created; after that its annotations table is
+    #    authoritative, and the JSON files get their bubbles from it.
+    if full or city_store.is_stale(store_dir, csv_path):
+        json_dir = output_dir if not city_store.store_exists(store_dir) else None
+        with trace.span('store write', store=store_dir):
+            city_store.build_store(store_dir, df, year_col=year_col, json_dir=json_dir)
+    store = city_store.CityStore(store_dir)
+
+    # 4. Find the city columns (everything but the year column) whose data or bubbles changed
+    # col format example: "Accra, Ghana" or "Abidjan, Côte d'Ivoire"
+    names = [col for col in df.columns if col != year_col]
+    years = df[year_col].to_numpy()
+    values = df[names].to_numpy(dtype=np.float64)
+    by_city = np.ascontiguousarray(values.T)
+
+    fmt = 'compact' if compact else 'indent'
+    previous = {} if full else load_state(state_path, fmt)
+    state = {}
+    changed = []
+    with trace.span('change detection', cities=len(names)):
+        for i, name in enumerate(names):
+            filename = city_filename(*city_store.split_name(name))
+            digest = series_hash(name, years, by_city[i], store.bubbles(name))
+            state[filename] = digest
+            if previous.get(filename) != digest or not os.path.exists(os.path.join(output_dir, filename)):
+                changed.append(i)
+
+    # 5. Export the changed cities
+    with trace.span('json write', files=len(changed)) as span:
+        written = export_city_json(names, years, values, output_dir, columns=changed,
+                                   indent=None if compact else 2, workers=workers, bubbles=store.bubbles)
+        span.set(bytes=written)
+
+    write_json_atomic(state_path, {"version": 1, "format": fmt, "files": state}, indent=2)
+    return len(changed), len(names) - len(changed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split the city CSV into one JSON file per city.")
+    parser.add_argument('--csv', default=csv_path, help='Source CSV (default: %(default)s)')
+    parser.add_argument('--output-dir', default=output_dir, help='JSON output directory (default: %(default)s)')
+    parser.add_argument('--full', action='store_true',
+                        help='Rewrite every city file, not only the ones whose data changed')
+    parser.add_argument('--compact', action='store_true', help='Write non-indented JSON')
+    parser.add_argument('--workers', type=int, default=None, help='File writer threads')
+    trace.add_argument(parser)
+    args = parser.parse_args(argv)
+    trace.from_args(args)
+
+    written, unchanged = split_cities(args.csv, args.output_dir, full=args.full,
+                                      compact=args.compact, workers=args.workers)
+    print(f"Done: Wrote JSON files for {written} cities ({unchanged} unchanged) in '{args.output_dir}/', "
+          f"store in '{store_dir}/'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Export the birth-year statistics of every city
+
+Writes one row per (city, birth year) with the numbers the visualizer shows
+in its Statistics panel: first and latest PM2.5, mean, std, min, max,
+change %, estimated years of life lost, average excess over the WHO level
+and the number of years covered. All rows come from one vectorized pass over
+the data store (aqs_core.exposure_stats).
+
+Usage:
+    python export_cohort_stats.py -o cohort_stats.csv
+    python export_cohort_stats.py -o cohort_stats.json --city "London, United Kingdom"
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store
+from aqs_core.exposure_stats import MAX_YEAR, store_stats
+
+# ========== Configuration ==========
+CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+STORE_DIR = 'cities_store'  # Memory-mapped copy of CSV_FILE, rebuilt when the CSV changes
+OUTPUT_FILE = 'cohort_stats.csv'
+
+
+def export_cohort_stats(output_path=OUTPUT_FILE, cities=None, max_year=MAX_YEAR,
+                        csv_path=CSV_FILE, store_dir=STORE_DIR):
+    """Write the statistics table as CSV or JSON (by extension); returns the number of rows"""
+    store = city_store.load_store(store_dir, csv_path=csv_path if os.path.exists(csv_path) else None)
+    frame = store_stats(store, max_year).to_frame()
+    if cities:
+        names = frame['city'] + ', ' + frame['country']
+        frame = frame[names.isin(cities)]
+    if output_path.endswith('.json'):
+        frame.to_json(output_path, orient='records', force_ascii=False, indent=2)
+    else:
+        frame.to_csv(output_path, index=False)
+    return len(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export PM2.5 statistics for every city and birth year.")
+    parser.add_argument('-o', '--output', default=OUTPUT_FILE, help='.csv or .json file (default: %(default)s)')
+    parser.add_argument('--city', action='append', dest='cities',
+                        help='Only this "City, Country" (repeatable; default: every city)')
+    parser.add_argument('--max-year', type=int, default=MAX_YEAR, help='Last year of every series (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    rows = export_cohort_stats(args.output, args.cities, args.max_year)
+    print(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Headless bulk generator for the static birth-year charts
+
+Renders the chart of static_pm25_visualizer.py for any set of (city, birth
+year) pairs, up to every city x every year, without a display. Each worker
+process opens the memory-mapped store and builds one StripeChart, then only
+updates it per chart. Outputs match the visualizer's "Save Chart" files and
+are skipped when newer than the store, so re-runs only fill in what is missing.
+
+With --plain WIDTHxHEIGHT only the stripe is drawn, without axes or text,
+by aqs_core/stripe_raster.py (NumPy and zlib, a few milliseconds per image).
+
+Usage:
+    python generate_static_charts.py "London, United Kingdom" --birth-years 1980 1990
+    python generate_static_charts.py "*, India" --birth-years 1950-2022 --format png svg
+    python generate_static_charts.py all -j 8
+    python generate_static_charts.py all --birth-years 1950 --plain 1200x200
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store, stripe_raster
+from aqs_core.fileio import replace_atomic
+from stripe_chart import MAX_YEAR, StripeChart, chart_filename, series_from_birth
+
+# ========== Configuration ==========
+CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+STORE_DIR = 'cities_store'  # Memory-mapped copy of CSV_FILE, rebuilt when the CSV changes
+OUTPUT_DIR = 'static_charts'
+DPI = 150  # Same as "Save Chart" in the visualizer
+YEARS_PER_TASK = 32  # Birth years rendered per task; a worker keeps its figure between tasks
+
+# Store and template figure of the current process, set up once per worker
+_worker = {}
+
+
+def _init_worker(store_dir):
+    _worker['store'] = city_store.CityStore(store_dir)
+
+
+def _chart():
+    # Plain stripes never need the figure
+    if 'chart' not in _worker:
+        _worker['chart'] = StripeChart()
+    return _worker['chart']
+
+
+def parse_size(spec):
+    """"1200x200" -> (1200, 200)"""
+    width, sep, height = spec.lower().partition('x')
+    try:
+        size = int(width), int(height)
+    except ValueError:
+        size = None
+    if not sep or size is None or min(size) < 1:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT in pixels, got '{spec}'")
+    return size
+
+
+def stripe_filename(city_name, birth_year, last_year, size):
+    """File name of a plain stripe, e.g. London_United Kingdom_1980_to_2022_1200x200.png"""
+    return chart_filename(city_name, birth_year, last_year, "png").replace('.png', f"_{size[0]}x{size[1]}.png")
+
+
+def parse_birth_years(specs, years):
+    """Expand "1980" / "1950-2000" specs into sorted years of the store (every year if none)"""
+    if not specs:
+        return [int(y) for y in years if y <= MAX_YEAR]
+    selected = set()
+    for spec in specs:
+        first, _, last = spec.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        selected.update(int(y) for y in years if first <= y <= last)
+    return sorted(selected)
+
+
+def resolve_cities(specs, names):
+    """Expand city specs (exact names, glob patterns or "all") into store names"""
+    selected = []
+    for spec in specs:
+        if spec == 'all':
+            matches = names
+        elif any(ch in spec for ch in '*?['):
+            matches = [name for name in names if fnmatch.fnmatch(name, spec)]
+            if not matches:
+                print(f"Warning: no city matches '{spec}'")
+        else:
+            matches = [spec]
+        selected.extend(m for m in matches if m not in selected)
+    return selected
+
+
+def render_charts(city, birth_years, output_dir=OUTPUT_DIR, formats=('png',), force=False,
+                  dpi=DPI, store_dir=STORE_DIR, plain=None):
+    """
+    Render one city for several birth years with this process's figure, or
+    as plain (width, height) stripes when plain is given.
+    Never raises: returns a result dict per birth year with its status
+    ('ok', 'skipped' or 'failed'), the output paths and any error message.
+    """
+    if not _worker:
+        _init_worker(store_dir)
+    store = _worker['store']
+    years = np.asarray(store.years)
+    store_mtime = os.path.getmtime(os.path.join(store_dir, city_store.INDEX_FILE))
+
+    results = []
+    city_data = None
+    for birth_year in birth_years:
+        if plain:
+            paths = [os.path.join(output_dir, stripe_filename(city, birth_year, years[-1], plain))]
+        else:
+            paths = [os.path.join(output_dir, chart_filename(city, birth_year, years[-1], ext)) for ext in formats]
+        result = {'city': city, 'birth_year': birth_year, 'paths': paths}
+        start = time.perf_counter()
+        try:
+            if not force and all(os.path.exists(p) and os.path.getmtime(p) >= store_mtime for p in paths):
+                result['status'] = 'skipped'
+            else:
+                if city_data is None:
+                    city_data = np.asarray(store.series(city), dtype=float)
+                years_from_birth, pm25_from_birth = series_from_birth(years, city_data, birth_year)
+                if plain:
+                    stripe_raster.write_png(paths[0], stripe_raster.rasterize(pm25_from_birth, *plain))
+                else:
+                    chart = _chart()
+                    chart.update(city, years_from_birth, pm25_from_birth, birth_year)
+                    for path, ext in zip(paths, formats):
+                        replace_atomic(path, lambda f: chart.fig.savefig(f, format=ext, dpi=dpi,
+                                                                         bbox_inches='tight'))
+                result['status'] = 'ok'
+        except Exception as e:
+            result.update(status='failed', error=f"{type(e).__name__}: {e}")
+        result['seconds'] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+def generate(city_specs, birth_year_specs=None, output_dir=OUTPUT_DIR, formats=('png',), workers=None,
+             force=False, dpi=DPI, csv_path=CSV_FILE, store_dir=STORE_DIR, plain=None):
+    """
+    Render every selected (city, birth year) chart, or plain (width, height)
+    stripe, using a pool of worker processes. Prints a line per finished task
+    and returns all results.
+    """
+    store = city_store.load_store(store_dir, csv_path=csv_path if os.path.exists(csv_path) else None)
+    cities = resolve_cities(city_specs, store.names)
+    birth_years = parse_birth_years(birth_year_specs, store.years)
+    tasks = [(city, birth_years[i:i + YEARS_PER_TASK])
+             for city in cities for i in range(0, len(birth_years), YEARS_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+
+    def report(city, chunk, chunk_results):
+        results.extend(chunk_results)
+        seconds = sum(r['seconds'] for r in chunk_results)
+        counts = {s: sum(r['status'] == s for r in chunk_results) for s in ('ok', 'skipped', 'failed')}
+        span = f"{chunk[0]}-{chunk[-1]}" if len(chunk) > 1 else f"{chunk[0]}"
+        print(f"{city} {span}: {counts['ok']} rendered, {counts['skipped']} up to date, "
+              f"{counts['failed']} failed ({seconds:.1f}s)", flush=True)
+        for r in chunk_results:
+            if r['status'] == 'failed':
+                print(f"  [failed] {r['city']} {r['birth_year']} - {r['error']}", flush=True)
+
+    start = time.perf_counter()
+    if workers == 1:
+        for city, chunk in tasks:
+            report(city, chunk, render_charts(city, chunk, output_dir, formats, force, dpi, store_dir, plain))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(store_dir,)) as pool:
+            futures = {pool.submit(render_charts, city, chunk, output_dir, formats, force, dpi, store_dir,
+                                   plain):
+                       (city, chunk) for city, chunk in tasks}
+            for future in as_completed(futures):
+                report(*futures[future], future.result())
+
+    counts = {s: sum(r['status'] == s for r in results) for s in ('ok', 'skipped', 'failed')}
+    print(f"Done in {time.perf_counter() - start:.1f}s with {workers} worker(s): "
+          f"{counts['ok']} rendered, {counts['skipped']} up to date, {counts['failed']} failed.")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render static PM2.5 birth-year charts without a display.")
+    parser.add_argument('cities', nargs='+',
+                        help='"City, Country" names, glob patterns such as "*, India", or "all"')
+    parser.add_argument('-y', '--birth-years', nargs='+', default=None,
+                        help=f'Years or ranges such as 1980 or 1950-2000 (default: every year up to {MAX_YEAR})')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR, help='Folder for the charts (default: %(default)s)')
+    parser.add_argument('--format', nargs='+', choices=['png', 'svg'], default=['png'], dest='formats',
+                        help='Output formats (default: png)')
+    parser.add_argument('--dpi', type=int, default=DPI, help='PNG resolution (default: %(default)s)')
+    parser.add_argument('--plain', type=parse_size, default=None, metavar='WIDTHxHEIGHT',
+                        help='Only the stripe, as a PNG of this size in pixels (no matplotlib)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('-f', '--force', action='store_true', help='Re-render charts that are up to date')
+    args = parser.parse_args(argv)
+    if args.plain and args.formats != ['png']:
+        parser.error("--plain only writes PNG")
+
+    results = generate(args.cities, args.birth_years, args.output_dir, args.formats,
+                       args.workers, args.force, args.dpi, plain=args.plain)
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Rank cities by a PM2.5 statistic over a window of years
+
+Answers questions such as "which cities were cleanest from 1990 to 2010"
+or "which improved most since 1980" from aqs_core.window_queries, where
+every window statistic costs O(1) per city.
+
+Metrics: mean, min, max, count (valid years), first, last, change (last -
+first, µg/m³), change_percent and exceedances (years above --threshold).
+
+Usage:
+    python rank_cities.py mean --from 1990 --to 2010 --lowest
+    python rank_cities.py change_percent --from 1980 --lowest --top 20
+    python rank_cities.py exceedances --from 2000 --threshold 35
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store
+from aqs_core.exposure_stats import WHO_LEVEL
+from aqs_core.window_queries import METRICS, WindowIndex
+
+# ========== Configuration ==========
+CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+STORE_DIR = 'cities_store'  # Memory-mapped copy of CSV_FILE, rebuilt when the CSV changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank cities by a PM2.5 statistic over a window of years.")
+    parser.add_argument('metric', choices=METRICS)
+    parser.add_argument('--from', dest='start', type=int, default=None, help='First year (default: first year of the data)')
+    parser.add_argument('--to', dest='end', type=int, default=None, help='Last year (default: last year of the data)')
+    parser.add_argument('-k', '--top', type=int, default=10, help='Number of cities to list (default: %(default)s)')
+    parser.add_argument('--lowest', action='store_true', help='Rank the smallest values first')
+    parser.add_argument('--threshold', type=float, default=WHO_LEVEL,
+                        help='Level counted by "exceedances", µg/m³ (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    store = city_store.load_store(STORE_DIR, csv_path=CSV_FILE if os.path.exists(CSV_FILE) else None)
+    index = WindowIndex.from_store(store)
+    start = int(store.years[0]) if args.start is None else args.start
+    end = int(store.years[-1]) if args.end is None else args.end
+    try:
+        ranking = index.top(args.metric, start, end, args.top, largest=not args.lowest, threshold=args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"{'Lowest' if args.lowest else 'Highest'} {args.metric}, {start}-{end}:")
+    decimals = 0 if args.metric in ('count', 'exceedances') else 2
+    for rank, (name, value) in enumerate(ranking, 1):
+        print(f"{rank:>4}. {name:<45} {value:10.{decimals}f}")
+
+
+if __name__ == '__main__':
+    main()
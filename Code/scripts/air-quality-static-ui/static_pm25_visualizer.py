@@ -1,121 +1,108 @@
 import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import messagebox, ttk
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.font_manager as fm
+from PIL import Image, ImageTk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import city_store
+from aqs_core.city_search import CitySearchIndex
+from aqs_core.virtual_list import VirtualListbox
+from aqs_core.exposure_stats import store_stats
+from stripe_chart import StripeChart, chart_filename, series_from_birth
 
 # ========== Configuration ==========
 CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+STORE_DIR = 'cities_store'  # Memory-mapped copy of CSV_FILE, rebuilt when the CSV changes
 OUTPUT_DIR = os.path.abspath('.')
+SEARCH_DELAY_MS = 150  # Wait this long after the last keystroke before filtering the city list
+RENDER_CACHE_SIZE = 16  # Rendered (city, birth year) analyses kept for instant repeat views
+RESULT_POLL_MS = 20  # How often the window checks for a finished chart while one is rendering
+RESIZE_DELAY_MS = 200  # Re-render the chart at the new size once resizing pauses
 
-# ========== Color Scale and Color Map ==========
-bounds = [0, 5, 10, 15, 20, 30, 40, 50, 60, 70, 80, 90, 99999]
-c_list = [
-    (164/255, 255/255, 255/255),  # 0 - 5    Very Good
-    (176/255, 218/255, 233/255),  # 5 - 10   Fair(down)
-    (176/255, 206/255, 237/255),  # 10 - 15  Fair(up)
-    (249/255, 224/255, 71/255),   # 15 - 20  Moderate(down)
-    (242/255, 200/255, 75/255),   # 20 - 30  Moderate(up)
-    (241/255, 166/255, 63/255),   # 30 - 40  Poor(down)
-    (233/255, 135/255, 37/255),   # 40 - 50  Poor(up)
-    (175/255, 69/255, 83/255),    # 50 - 60  Very Poor(down)
-    (134/255, 59/255, 71/255),    # 60 - 70  Very Poor(up)
-    (103/255, 58/255, 61/255),    # 70 - 80  Extremely Poor(down)
-    (70/255, 47/255, 48/255),     # 80 - 90  Extremely Poor(mid)
-    (37/255, 36/255, 36/255),     # 90+      Extremely Poor(up)
-]
-cmap = mcolors.ListedColormap(c_list)
-norm = mcolors.BoundaryNorm(bounds, cmap.N)
+# ========== Render Cache ==========
+class RenderCache:
+    """Least recently used cache of rendered analyses, keyed by (city, birth year)"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+    
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
 
-# ========== Calculate Years of Life Lost Function ==========
-def calculate_years_of_life_lost(pm25_values):
+# ========== Background Renderer ==========
+class ChartWorker:
     """
-    Calculate Years of Life Lost (YLL)
-    Based on research: For every 10μg/m³ increase in PM2.5, average life expectancy decreases by about 0.6 years
-    This calculation uses average long-term exposure rather than cumulative annual losses
+    Renders analyses on a background thread, with a StripeChart of its own
+    drawn by Agg into a pixel buffer, so the window stays responsive.
+    Only the latest job counts: submitting or cancelling drops the job
+    waiting to start, and a job that is overtaken while it runs stops before
+    drawing. Finished results are queued for the Tk thread to collect
+    (Tk must not be called from this thread).
     """
-    # WHO recommended safe level is 5μg/m³
-    safe_level = 5.0
-    # Calculate excess above safe level for each year
-    excess_pm25 = np.maximum(0, pm25_values - safe_level)
-    # Calculate average excess exposure over the lifetime
-    avg_excess = np.mean(excess_pm25)
-    # 0.6 years lost per 10μg/m³ based on average long-term exposure
-    total_years_lost = avg_excess / 10.0 * 0.6
-    return total_years_lost
-
-# ========== Generate Static Chart ==========
-def create_static_chart(city_name, years, pm25_values, birth_year):
-    """Generate static PM2.5 chart"""
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    # Set font for non-ASCII characters (if needed)
-    plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
-    plt.rcParams['axes.unicode_minus'] = False
-    
-    # (A) Draw "stripe" using imshow
-    ax.imshow(
-        pm25_values.reshape(1, -1),
-        aspect="auto",
-        cmap=cmap,
-        norm=norm,
-        extent=[years[0], years[-1], 0, 1]
-    )
-    ax.set_yticks([])
-    
-    # (B) Overlay white line on second y-axis
-    ax2 = ax.twinx()
-    ax2.plot(years, pm25_values, color="white", linewidth=5)
-    
-    # Set x-axis range and format
-    xlim = [years[0], years[-1]]
-    ax.set_xlim(xlim)
-    ax2.set_xlim(xlim)
+    def __init__(self, render):
+        self.render = render  # render(job, is_current) -> result dict, run on the worker thread
+        self.chart = StripeChart()
+        self.canvas = FigureCanvasAgg(self.chart.fig)
+        self.lock = threading.Lock()  # Held while the figure is in use, also by Save Chart
+        self.results = queue.Queue()
+        self.latest = 0
+        self._pending = None
+        self._wakeup = threading.Condition()
+        threading.Thread(target=self._run, name='chart worker', daemon=True).start()
     
-    # Set x-axis tick format to integer
-    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: int(x)))
+    def submit(self, **job):
+        """Queue a job in place of any waiting one; returns its id"""
+        with self._wakeup:
+            self.latest += 1
+            job['id'] = self.latest
+            self._pending = job
+            self._wakeup.notify()
+        return job['id']
     
-    ax2.set_ylabel("PM2.5 concentration (µg/m³)", color="white", fontweight='bold')
+    def cancel(self):
+        """Drop the waiting job and make the running one stale"""
+        with self._wakeup:
+            self.latest += 1
+            self._pending = None
     
-    # Force right Y-axis range to 0 ~ 120
-    ax2.set_ylim([0, 120])
+    def is_current(self, job_id):
+        return job_id == self.latest
     
-    # Add birth year marker
-    if birth_year in years:
-        birth_idx = np.where(years == birth_year)[0][0]
-        birth_pm25 = pm25_values[birth_idx]
-        ax2.axvline(x=birth_year, color='white', linestyle='--', linewidth=2, alpha=0.8)
-        ax2.annotate(f'Birth Year\n{birth_year}', 
-                    xy=(birth_year, birth_pm25), 
-                    xytext=(birth_year + 5, birth_pm25 + 20),
-                    arrowprops=dict(arrowstyle='->', color='white', lw=2),
-                    color='black', fontweight='bold', fontsize=10,
-                    bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
+    def draw(self, width, height):
+        """RGBA bytes and (width, height) of the figure drawn at about width x height pixels"""
+        dpi = self.chart.fig.dpi
+        self.chart.fig.set_size_inches(max(width, 100) / dpi, max(height, 100) / dpi)
+        self.canvas.draw()
+        return bytes(self.canvas.buffer_rgba()), self.canvas.get_width_height()
     
-    # (C) Set title and appearance
-    ax.set_title(
-        f"{city_name}\nAir pollution (PM2.5) concentrations since your birth",
-        fontsize=14, fontweight="bold", pad=20
-    )
-    ax.set_xlabel("Year", fontweight='bold')
-    ax.set_facecolor("white")
-    for spine in ax.spines.values():
-        spine.set_visible(False)
-    
-    # Add subtitle and URL in top-left corner
-    fig.text(0.02, 0.98, "Air Quality Stripes", 
-             fontsize=10, fontweight='bold', 
-             ha='left', va='top')
-    fig.text(0.02, 0.96, "https://airqualitystripes.info/", 
-             fontsize=8, color='gray', 
-             ha='left', va='top')
-    
-    plt.tight_layout()
-    return fig
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while self._pending is None:
+                    self._wakeup.wait()
+                job, self._pending = self._pending, None
+            try:
+                result = self.render(job, self.is_current)
+            except Exception as e:
+                result = {'error': f"Rendering failed: {e}"}
+            result['id'] = job['id']
+            self.results.put(result)
 
 # ========== Main Window Class ==========
 class StaticPM25Visualizer:
@@ -123,12 +110,18 @@ class StaticPM25Visualizer:
         self.root = root
         self.root.title("Static PM2.5 Visualization - Birth Year Analysis")
         self.root.geometry("1000x800")
+        self._search_job = None
+        self._poll_job = None
+        self._resize_job = None
+        self._render_id = None  # Worker job whose result the window is waiting for
         
-        # Read CSV data
+        # Read city data
         try:
-            self.df = pd.read_csv(CSV_FILE)
-            self.years = self.df["Year"].to_numpy()
-            self.city_columns = [col for col in self.df.columns if col != "Year"]
+            self.store = city_store.load_store(STORE_DIR, csv_path=CSV_FILE)
+            self.years = np.asarray(self.store.years)
+            self.city_columns = self.store.names
+            self.search_index = CitySearchIndex(self.city_columns)
+            self.cohort_stats = store_stats(self.store)
         except Exception as e:
             messagebox.showerror("Error", f"Cannot read data file: {e}")
             return
@@ -157,12 +150,9 @@ class StaticPM25Visualizer:
         list_frame = ttk.Frame(control_frame)
         list_frame.pack(fill='both', expand=True, pady=(0, 10))
         
-        self.city_listbox = tk.Listbox(list_frame, height=15, width=35)
-        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.city_listbox.yview)
-        self.city_listbox.configure(yscrollcommand=scrollbar.set)
-        
-        self.city_listbox.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
+        # Only the visible rows are handed to Tk, so refreshing the full catalogue stays cheap
+        self.city_listbox = VirtualListbox(list_frame, height=15, width=35)
+        self.city_listbox.pack(fill='both', expand=True)
         
         self.city_listbox.bind('<<ListboxSelect>>', self.on_city_select)
         
@@ -186,13 +176,21 @@ class StaticPM25Visualizer:
         self.save_btn.pack(pady=(0, 10))
         self.save_btn.config(state='disabled')
         
+        # Rendering status
+        self.status_var = tk.StringVar()
+        ttk.Label(control_frame, textvariable=self.status_var, foreground='gray').pack(anchor='w')
+        
         # Right display area
         display_frame = ttk.LabelFrame(main_frame, text="Analysis Results", padding=10)
         display_frame.pack(side='right', fill='both', expand=True)
         
-        # Chart area
+        # Chart area; its size is set by the window, not by the chart image
         self.chart_frame = ttk.Frame(display_frame)
         self.chart_frame.pack(fill='both', expand=True)
+        self.chart_frame.pack_propagate(False)
+        self.chart_label = tk.Label(self.chart_frame, bg='white')
+        self.chart_label.pack(fill='both', expand=True)
+        self.chart_frame.bind('<Configure>', self.on_chart_resize)
         
         # Statistics area
         self.stats_frame = ttk.LabelFrame(display_frame, text="Statistics", padding=10)
@@ -214,32 +212,37 @@ class StaticPM25Visualizer:
         # Initialize city list
         self.populate_city_list(self.city_columns)
         
-        # Store current chart
-        self.current_figure = None
+        # Charts are drawn by one background worker, whose figure is created once and reused
+        self.worker = ChartWorker(self.render_job)
+        self.render_cache = RenderCache(RENDER_CACHE_SIZE)
+        self.photo = None  # The image shown; Tk does not keep a reference to it
+        self.shown_key = None  # (city, birth year) of the chart shown
         self.current_city = None
         self.current_birth_year = None
     
     def populate_city_list(self, cities):
         """Populate city list"""
-        self.city_listbox.delete(0, tk.END)
-        for city in cities:
-            self.city_listbox.insert(tk.END, city)
+        self.city_listbox.set_items(cities)
     
     def on_search(self, event=None):
-        """Search cities"""
-        search_term = self.search_var.get().lower()
-        if not search_term:
-            filtered_cities = self.city_columns
-        else:
-            filtered_cities = [city for city in self.city_columns 
-                             if search_term in city.lower()]
-        self.populate_city_list(filtered_cities)
+        """Search cities once typing pauses"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DELAY_MS, self.run_search)
+    
+    def run_search(self):
+        """Filter the city list with the search index, best matches first"""
+        self._search_job = None
+        self.populate_city_list(self.search_index.search_labels(self.search_var.get()))
     
     def on_city_select(self, event=None):
         """City selection event"""
         selection = self.city_listbox.curselection()
         if selection:
             city_name = self.city_listbox.get(selection[0])
+            if city_name != self.current_city:
+                # The chart being rendered is no longer wanted
+                self.cancel_render()
             self.current_city = city_name
     
     def generate_analysis(self):
@@ -259,95 +262,129 @@ class StaticPM25Visualizer:
             return
         
         self.current_birth_year = birth_year
-        
-        # Get city data from birth year
-        city_data = self.df[self.current_city].values
-        
-        # Find birth year index
-        birth_index = np.where(self.years == birth_year)[0]
-        if len(birth_index) == 0:
-            messagebox.showerror("Error", f"No data found for {birth_year}")
+        self.request_chart(self.current_city, birth_year)
+    
+    def chart_size(self):
+        return self.chart_frame.winfo_width(), self.chart_frame.winfo_height()
+    
+    def request_chart(self, city, birth_year):
+        """Show an analysis: straight from the cache when drawn at this size, otherwise by the worker"""
+        key = (city, birth_year)
+        entry = self.render_cache.get(key)
+        size = self.chart_size()
+        if entry is not None and entry['size'] == size:
+            # Repeat views come straight from the cache
+            self.worker.cancel()
+            self.show_result(key, entry)
             return
         
-        birth_index = birth_index[0]
-        
-        # Get data from birth year
-        years_from_birth = self.years[birth_index:]
-        pm25_from_birth = city_data[birth_index:]
-        
-        # Filter out NaN values
-        valid_mask = ~np.isnan(pm25_from_birth)
-        years_from_birth = years_from_birth[valid_mask]
-        pm25_from_birth = pm25_from_birth[valid_mask]
+        self._render_id = self.worker.submit(city=city, birth_year=birth_year, size=size,
+                                             layout=entry['layout'] if entry is not None else None)
+        self.status_var.set(f"Rendering {city}, {birth_year}...")
+        if self._poll_job is None:
+            self._poll_job = self.root.after(RESULT_POLL_MS, self.poll_results)
+    
+    def cancel_render(self):
+        self.worker.cancel()
+        self.status_var.set("")
+    
+    def poll_results(self):
+        """Collect finished renders on the Tk thread; results of stale jobs are dropped"""
+        self._poll_job = None
+        while True:
+            try:
+                result = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if result['id'] != self._render_id or not self.worker.is_current(result['id']):
+                continue
+            self._render_id = None
+            self.status_var.set("")
+            if 'error' in result:
+                messagebox.showerror("Error", result['error'])
+                continue
+            key = (result['city'], result['birth_year'])
+            entry = self.render_cache.get(key) or {}
+            entry.update({k: result[k] for k in ('years', 'pm25', 'stats', 'layout', 'pixels', 'size')})
+            self.render_cache.put(key, entry)
+            self.show_result(key, entry)
+        if self._render_id is not None and self.worker.is_current(self._render_id):
+            self._poll_job = self.root.after(RESULT_POLL_MS, self.poll_results)
+    
+    def render_job(self, job, is_current):
+        """Slice, compute and draw one analysis (worker thread)"""
+        city, birth_year = job['city'], job['birth_year']
+        city_data = np.asarray(self.store.series(city), dtype=float)
+        try:
+            years_from_birth, pm25_from_birth = series_from_birth(self.years, city_data, birth_year)
+        except ValueError as e:
+            return {'error': str(e)}
+        stats = self.stats_report(city, years_from_birth, pm25_from_birth, birth_year)
+        if not is_current(job['id']):
+            return {}
+        with self.worker.lock:
+            layout = self.worker.chart.update(city, years_from_birth, pm25_from_birth, birth_year, job['layout'])
+            pixels, drawn_size = self.worker.draw(*job['size'])
+        return {
+            'city': city,
+            'birth_year': birth_year,
+            'years': years_from_birth,
+            'pm25': pm25_from_birth,
+            'stats': stats,
+            'layout': layout,  # Margins found by tight_layout on the first view
+            'pixels': (pixels, drawn_size),  # RGBA of the chart, and the chart area size it was drawn for
+            'size': job['size'],
+        }
+    
+    def show_result(self, key, entry):
+        """Display chart and statistics of a rendered analysis"""
+        pixels, (width, height) = entry['pixels']
+        self.photo = ImageTk.PhotoImage(Image.frombuffer('RGBA', (width, height), pixels, 'raw', 'RGBA', 0, 1))
+        self.chart_label.config(image=self.photo)
+        self.shown_key = key
         
-        if len(pm25_from_birth) == 0:
-            messagebox.showerror("Error", "No valid PM2.5 data found")
-            return
-            
-        # Ensure data range is correct
-        max_year = 2022  # Set maximum year to 2022
-        if years_from_birth[-1] > max_year:
-            # If data exceeds 2022, truncate to 2022
-            valid_years_mask = years_from_birth <= max_year
-            years_from_birth = years_from_birth[valid_years_mask]
-            pm25_from_birth = pm25_from_birth[valid_years_mask]
-        elif years_from_birth[-1] < max_year:
-            # If data is less than 2022, extend to 2022
-            years_to_add = np.arange(years_from_birth[-1] + 1, max_year + 1)
-            years_from_birth = np.append(years_from_birth, years_to_add)
-            pm25_from_birth = np.append(pm25_from_birth, [pm25_from_birth[-1]] * len(years_to_add))
-        
-        # Generate chart
-        self.display_chart(years_from_birth, pm25_from_birth)
-        
-        # Calculate statistics
-        self.calculate_and_display_stats(years_from_birth, pm25_from_birth, birth_year)
+        # Display statistics
+        self.show_stats(entry['stats'])
         
         # Enable save button
         self.save_btn.config(state='normal')
     
-    def display_chart(self, years, pm25_values):
-        """Display chart"""
-        # Clear previous chart
-        for widget in self.chart_frame.winfo_children():
-            widget.destroy()
-        
-        # Create new chart
-        self.current_figure = create_static_chart(self.current_city, years, pm25_values, self.current_birth_year)
-        
-        # Display chart in Tkinter
-        canvas = FigureCanvasTkAgg(self.current_figure, self.chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+    def on_chart_resize(self, event=None):
+        """Redraw the chart shown at the new size once resizing pauses"""
+        if self._resize_job is not None:
+            self.root.after_cancel(self._resize_job)
+        self._resize_job = self.root.after(RESIZE_DELAY_MS, self.redraw_at_size)
     
-    def calculate_and_display_stats(self, years, pm25_values, birth_year):
-        """Calculate and display statistics"""
-        # Clear previous statistics
-        self.stats_text.delete(1.0, tk.END)
+    def redraw_at_size(self):
+        self._resize_job = None
+        entry = self.render_cache.get(self.shown_key) if self.shown_key is not None else None
+        if entry is not None and entry['size'] != self.chart_size():
+            self.request_chart(*self.shown_key)
+    
+    def stats_report(self, city, years, pm25_values, birth_year):
+        """Calculate statistics and format the report"""
+        # Looked up in the table computed for every city and birth year at startup
+        stats = self.cohort_stats.get(city, birth_year)
         
         # Basic statistics
-        birth_pm25 = pm25_values[0]
-        latest_pm25 = pm25_values[-1]
-        avg_pm25 = np.mean(pm25_values)
-        std_pm25 = np.std(pm25_values)
-        min_pm25 = np.min(pm25_values)
-        max_pm25 = np.max(pm25_values)
+        birth_pm25 = stats['birth_pm25']
+        latest_pm25 = stats['latest_pm25']
+        avg_pm25 = stats['mean']
+        std_pm25 = stats['std']
+        min_pm25 = stats['min']
+        max_pm25 = stats['max']
         
         # Change percentage
-        if birth_pm25 != 0:
-            change_percent = ((latest_pm25 - birth_pm25) / birth_pm25) * 100
-        else:
-            change_percent = 0
+        change_percent = stats['change_percent']
         
         # Years of life lost
-        years_lost = calculate_years_of_life_lost(pm25_values)
+        years_lost = stats['years_lost']
         
         # WHO standard comparison
-        who_standard = 5.0
-        avg_excess = max(0, avg_pm25 - who_standard)
+        avg_excess = stats['avg_excess']
         
         # Generate statistics report
-        stats_text = f"""📊 {self.current_city} PM2.5 Analysis Report
+        stats_text = f"""📊 {city} PM2.5 Analysis Report
 Data analysis from {birth_year} to {years[-1]}
 
 🎂 Birth PM2.5 Concentration: {birth_pm25:.1f} μg/m³
@@ -372,21 +409,32 @@ Data analysis from {birth_year} to {years[-1]}
 Years of life lost based on research: PM2.5 increase of 10μg/m³ reduces average lifespan by about 0.6 years
 WHO recommends PM2.5 annual average concentration not exceeding 5μg/m³
 """
-        
+        return stats_text
+    
+    def show_stats(self, stats_text):
+        """Display statistics"""
+        # The widget is read-only between updates; clear previous statistics
+        self.stats_text.config(state='normal')
+        self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(1.0, stats_text)
         self.stats_text.config(state='disabled')
     
     def save_chart(self):
         """Save chart"""
-        if self.current_figure is None:
+        entry = self.render_cache.get(self.shown_key) if self.shown_key is not None else None
+        if entry is None:
             messagebox.showwarning("Warning", "No chart to save")
             return
         
-        filename = f"{self.current_city.replace(', ', '_')}_{self.current_birth_year}_to_{self.years[-1]}.png"
+        city, birth_year = self.shown_key
+        filename = chart_filename(city, birth_year, self.years[-1])
         filepath = os.path.join(OUTPUT_DIR, filename)
         
         try:
-            self.current_figure.savefig(filepath, dpi=150, bbox_inches='tight')
+            # The worker's figure may hold another analysis by now: put the shown one back first
+            with self.worker.lock:
+                self.worker.chart.update(city, entry['years'], entry['pm25'], birth_year, entry['layout'])
+                self.worker.chart.fig.savefig(filepath, dpi=150, bbox_inches='tight')
             messagebox.showinfo("Success", f"Chart saved to:\n{filepath}")
         except Exception as e:
             messagebox.showerror("Error", f"Save failed: {e}")
@@ -0,0 +1,182 @@
+"""
+Static PM2.5 birth-year chart, shared by the Tk visualizer and the headless
+bulk generator (this module does not import tkinter)
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+from aqs_core import scale
+from aqs_core.exposure_stats import MAX_YEAR  # Charts end in this year
+
+# ========== Color Scale and Color Map ==========
+bounds = scale.BOUNDS
+c_list = scale.COLORS
+cmap, norm = scale.colormap()
+
+# ========== Calculate Years of Life Lost Function ==========
+def calculate_years_of_life_lost(pm25_values):
+    """
+    Calculate Years of Life Lost (YLL)
+    Based on research: For every 10μg/m³ increase in PM2.5, average life expectancy decreases by about 0.6 years
+    This calculation uses average long-term exposure rather than cumulative annual losses
+    """
+    # WHO recommended safe level is 5μg/m³
+    safe_level = 5.0
+    # Calculate excess above safe level for each year
+    excess_pm25 = np.maximum(0, pm25_values - safe_level)
+    # Calculate average excess exposure over the lifetime
+    avg_excess = np.mean(excess_pm25)
+    # 0.6 years lost per 10μg/m³ based on average long-term exposure
+    total_years_lost = avg_excess / 10.0 * 0.6
+    return total_years_lost
+
+# ========== Generate Static Chart ==========
+# Set font for non-ASCII characters (if needed)
+plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
+plt.rcParams['axes.unicode_minus'] = False
+
+class StripeChart:
+    """
+    Static PM2.5 chart built once; update() swaps the stripe, line, birth year
+    marker and title in place instead of creating a new figure per city
+    """
+    def __init__(self):
+        # A bare Figure is not tracked by pyplot, so it is never leaked between charts
+        self.fig = Figure(figsize=(12, 6))
+        ax = self.fig.add_subplot()
+        self.ax = ax
+        
+        # (A) Draw "stripe" using imshow
+        self.stripe = ax.imshow(
+            np.zeros((1, 2)),
+            aspect="auto",
+            cmap=cmap,
+            norm=norm,
+            extent=[0, 1, 0, 1]
+        )
+        ax.set_yticks([])
+        
+        # (B) Overlay white line on second y-axis
+        ax2 = ax.twinx()
+        self.ax2 = ax2
+        self.line, = ax2.plot([], [], color="white", linewidth=5)
+        
+        # Set x-axis tick format to integer
+        ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: int(x)))
+        
+        ax2.set_ylabel("PM2.5 concentration (µg/m³)", color="white", fontweight='bold')
+        
+        # Force right Y-axis range to 0 ~ 120
+        ax2.set_ylim([0, 120])
+        
+        # Birth year marker, hidden until a birth year inside the data is shown
+        self.birth_line = ax2.axvline(x=0, color='white', linestyle='--', linewidth=2, alpha=0.8)
+        self.birth_label = ax2.annotate('',
+                    xy=(0, 0),
+                    xytext=(0, 0),
+                    arrowprops=dict(arrowstyle='->', color='white', lw=2),
+                    color='black', fontweight='bold', fontsize=10,
+                    bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
+        
+        # (C) Set title and appearance
+        self.title = ax.set_title(
+            "\nAir pollution (PM2.5) concentrations since your birth",
+            fontsize=14, fontweight="bold", pad=20
+        )
+        ax.set_xlabel("Year", fontweight='bold')
+        ax.set_facecolor("white")
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        
+        # Add subtitle and URL in top-left corner
+        self.fig.text(0.02, 0.98, "Air Quality Stripes", 
+                      fontsize=10, fontweight='bold', 
+                      ha='left', va='top')
+        self.fig.text(0.02, 0.96, "https://airqualitystripes.info/", 
+                      fontsize=8, color='gray', 
+                      ha='left', va='top')
+    
+    def update(self, city_name, years, pm25_values, birth_year, layout=None):
+        """
+        Show another city / birth year. layout is a value returned by an
+        earlier update() for the same data; passing it back skips tight_layout.
+        """
+        xlim = [years[0], years[-1]]
+        self.stripe.set_data(pm25_values.reshape(1, -1))
+        self.stripe.set_extent([years[0], years[-1], 0, 1])
+        self.line.set_data(years, pm25_values)
+        self.ax.set_xlim(xlim)
+        self.ax2.set_xlim(xlim)
+        
+        # Add birth year marker
+        has_birth = birth_year in years
+        if has_birth:
+            birth_idx = np.where(years == birth_year)[0][0]
+            birth_pm25 = pm25_values[birth_idx]
+            self.birth_line.set_xdata([birth_year, birth_year])
+            self.birth_label.xy = (birth_year, birth_pm25)
+            self.birth_label.set_position((birth_year + 5, birth_pm25 + 20))
+            self.birth_label.set_text(f'Birth Year\n{birth_year}')
+        self.birth_line.set_visible(has_birth)
+        self.birth_label.set_visible(has_birth)
+        
+        self.title.set_text(f"{city_name}\nAir pollution (PM2.5) concentrations since your birth")
+        # The margins depend on the tick labels of the new year range
+        if layout is None:
+            self.fig.tight_layout()
+        else:
+            self.fig.subplots_adjust(**layout)
+        params = self.fig.subplotpars
+        return {side: getattr(params, side) for side in ('left', 'right', 'bottom', 'top')}
+
+def create_static_chart(city_name, years, pm25_values, birth_year):
+    """Generate static PM2.5 chart"""
+    chart = StripeChart()
+    chart.update(city_name, years, pm25_values, birth_year)
+    return chart.fig
+
+# ========== Select Data From Birth Year ==========
+def series_from_birth(years, city_data, birth_year, max_year=MAX_YEAR):
+    """
+    (years, PM2.5) of a city from birth_year to max_year, with missing years
+    dropped and the last value carried forward up to max_year.
+    Raises ValueError when there is nothing to plot.
+    """
+    # Find birth year index
+    birth_index = np.where(years == birth_year)[0]
+    if len(birth_index) == 0:
+        raise ValueError(f"No data found for {birth_year}")
+    
+    birth_index = birth_index[0]
+    
+    # Get data from birth year
+    years_from_birth = years[birth_index:]
+    pm25_from_birth = city_data[birth_index:]
+    
+    # Filter out NaN values
+    valid_mask = ~np.isnan(pm25_from_birth)
+    years_from_birth = years_from_birth[valid_mask]
+    pm25_from_birth = pm25_from_birth[valid_mask]
+    
+    if len(pm25_from_birth) == 0:
+        raise ValueError("No valid PM2.5 data found")
+    
+    # Ensure data range is correct
+    if years_from_birth[-1] > max_year:
+        # If data exceeds max_year, truncate to max_year
+        valid_years_mask = years_from_birth <= max_year
+        years_from_birth = years_from_birth[valid_years_mask]
+        pm25_from_birth = pm25_from_birth[valid_years_mask]
+    elif years_from_birth[-1] < max_year:
+        # If data is less than max_year, extend to max_year
+        years_to_add = np.arange(years_from_birth[-1] + 1, max_year + 1)
+        years_from_birth = np.append(years_from_birth, years_to_add)
+        pm25_from_birth = np.append(pm25_from_birth, [pm25_from_birth[-1]] * len(years_to_add))
+    
+    return years_from_birth, pm25_from_birth
+
+def chart_filename(city_name, birth_year, last_year, ext='png'):
+    """File name used when a chart is saved, e.g. London_United Kingdom_1980_to_2022.png"""
+    return f"{city_name.replace(', ', '_')}_{birth_year}_to_{last_year}.{ext}"
@@ -0,0 +1,107 @@
+"""
+Quick look-ups from the command line, without loading pandas or matplotlib
+
+    python -m aqs_core list                      # every city
+    python -m aqs_core list "*, India" --count   # glob patterns
+    python -m aqs_core list --search "sao paulo" # ranked, accent/typo tolerant
+    python -m aqs_core stats "London, United Kingdom" --birth-year 1990
+
+The data is looked up in the current folder (cities_store/,
+V1pt6_Cities_Data_PM2pt5.csv or cities_json/; see --store/--csv/--json-dir),
+so from a script folder run it as "python ../aqs_core list". list reads only
+the store index or the CSV header; stats also loads numpy for the one city.
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aqs_core import loader
+
+
+def cmd_list(args):
+    names = loader.city_names(args.store, args.csv, args.json_dir)
+    if args.search:
+        from aqs_core.city_search import CitySearchIndex
+        names = CitySearchIndex(names).search_labels(args.search, args.limit)
+    if args.patterns:
+        names = [n for n in names if any(fnmatch.fnmatch(n, p) for p in args.patterns)]
+    if args.count:
+        print(len(names))
+    else:
+        print('\n'.join(names[:args.limit]))
+    return 0
+
+
+def cmd_stats(args):
+    from aqs_core.exposure_stats import MAX_YEAR, cohort_stats
+    from aqs_core.scale import label
+    store = loader.open_store(args.store, args.csv)
+    name = args.city
+    if name not in store:
+        # Accept any capitalization, then suggest the closest names
+        by_folded = {n.casefold(): n for n in store.names}
+        name = by_folded.get(args.city.casefold())
+        if name is None:
+            import difflib
+            close = difflib.get_close_matches(args.city, store.names, n=5)
+            print(f"City '{args.city}' not found" + (f"; did you mean: {'; '.join(close)}" if close else ''),
+                  file=sys.stderr)
+            return 1
+
+    years = store.years
+    max_year = args.max_year or MAX_YEAR
+    birth_year = args.birth_year if args.birth_year is not None else int(years[0])
+    column = store.values[:, [store.column(name)]]
+    stats = cohort_stats(years, column, [name], max_year)
+    try:
+        row = stats.get(name, birth_year)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return 1
+    if not row['n_years']:
+        print(f"No PM2.5 data for {name} from {birth_year}", file=sys.stderr)
+        return 1
+
+    print(f"{name}, born {birth_year} ({row['n_years']} years to {max_year})")
+    print(f"  PM2.5 in birth year:  {row['birth_pm25']:.1f} μg/m³ ({label(row['birth_pm25'])})")
+    print(f"  Latest PM2.5:         {row['latest_pm25']:.1f} μg/m³ ({label(row['latest_pm25'])})")
+    print(f"  Mean ± std:           {row['mean']:.1f} ± {row['std']:.1f} μg/m³")
+    print(f"  Min / max:            {row['min']:.1f} / {row['max']:.1f} μg/m³")
+    print(f"  Change:               {row['change_percent']:+.1f}%")
+    print(f"  Years of life lost:   {row['years_lost']:.2f}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m aqs_core', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=loader.STORE_DIR, help='Store folder (default: %(default)s)')
+    parser.add_argument('--csv', default=loader.CSV_FILE, help='City CSV (default: %(default)s)')
+    parser.add_argument('--json-dir', default=loader.JSON_DIR, help='cities_json folder (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='Print city names')
+    list_parser.add_argument('patterns', nargs='*', help='Glob patterns such as "*, India"')
+    list_parser.add_argument('--search', default=None, help='Ranked search (prefixes, substrings, typos)')
+    list_parser.add_argument('--limit', type=int, default=None, help='Print at most this many names')
+    list_parser.add_argument('--count', action='store_true', help='Only print the number of cities')
+    list_parser.set_defaults(func=cmd_list)
+
+    stats_parser = commands.add_parser('stats', help='Exposure statistics of one city')
+    stats_parser.add_argument('city', help='"City, Country"')
+    stats_parser.add_argument('--birth-year', type=int, default=None, help='Default: the first year of data')
+    stats_parser.add_argument('--max-year', type=int, default=None, help='Last year of the series')
+    stats_parser.set_defaults(func=cmd_stats)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
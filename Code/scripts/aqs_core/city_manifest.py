@@ -0,0 +1,88 @@
+"""
+Persistent index of a cities_json directory
+
+Listing the catalogue used to mean a json.load of every city file just to
+read 'city' and 'country'. The manifest keeps those two fields per file,
+keyed by filename and validated by mtime and size, so only new or modified
+files are parsed again (in a thread pool) and a warm start is one scandir.
+Unreadable files are cached too, marked 'error', and left out of the list
+until they change.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .fileio import write_json_atomic
+
+# Stored inside the JSON directory; the name does not end in .json so it is
+# never mistaken for a city file
+MANIFEST_NAME = '.city_manifest'
+MANIFEST_VERSION = 1
+
+
+def _read_names(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        obj = json.load(f)
+    if not isinstance(obj, dict):
+        raise ValueError(f"{path} is not a JSON object")
+    return obj.get('city', ''), obj.get('country', '')
+
+
+def _safe_read_names(path):
+    try:
+        return _read_names(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+
+def load_city_index(json_dir, workers=None):
+    """
+    Return [{'fname', 'city', 'country'}, ...] for every readable city file in
+    json_dir, sorted by filename, refreshing the manifest on the way.
+    """
+    manifest_path = os.path.join(json_dir, MANIFEST_NAME)
+    previous = _load_manifest(manifest_path)
+
+    files = {}
+    stale = []
+    with os.scandir(json_dir) as it:
+        for entry in it:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            st = entry.stat()
+            cached = previous.get(entry.name)
+            if cached and cached['mtime'] == st.st_mtime_ns and cached['size'] == st.st_size:
+                files[entry.name] = cached
+            else:
+                files[entry.name] = {'mtime': st.st_mtime_ns, 'size': st.st_size}
+                stale.append(entry.name)
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+            results = pool.map(lambda name: _safe_read_names(os.path.join(json_dir, name)), stale)
+            for name, names in zip(stale, results):
+                if names is None:
+                    files[name]['error'] = True
+                else:
+                    files[name]['city'], files[name]['country'] = names
+
+    if stale or set(files) != set(previous):
+        try:
+            write_json_atomic(manifest_path, {'version': MANIFEST_VERSION, 'files': files})
+        except OSError:
+            pass  # A read-only catalogue still works, it just is not cached
+
+    return [{'fname': name, 'city': files[name]['city'], 'country': files[name]['country']}
+            for name in sorted(files) if not files[name].get('error')]
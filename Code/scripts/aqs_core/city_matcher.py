@@ -0,0 +1,230 @@
+"""
+Match "City, Country" names to the coordinates of the worldcities table
+
+Names are normalized with city_search.fold (case, accents, punctuation),
+countries go through an alias table (USA, UAE, DRC, South Korea, ...), and
+candidates are blocked by country: each country's rows get their own exact
+name tables, built on first use, and a trigram index, built only once a
+name of that country has no exact match. A name is matched
+exactly (also ignoring spaces, so "Sana'a" finds "Sanaa"), or else by
+fuzzy score among the country's rows sharing trigrams with it: the best of
+the trigram Dice coefficient, difflib's ratio on the closest few and a
+whole-word containment score ("New York City" / "New York"). Ties go to
+the most populous city.
+
+load_worldcities reads worldcities.csv/.tsv or .xlsx and keeps a parsed
+copy with the normalized names (an .npz next to the source, refreshed when
+the source changes), as parsing the spreadsheet takes seconds.
+"""
+
+import os
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from .city_search import fold, trigrams
+from .fileio import replace_atomic
+
+# Country names used by the PM2.5 data (folded) -> worldcities name (folded)
+COUNTRY_ALIASES = {
+    'usa': 'united states',
+    'us': 'united states',
+    'united states of america': 'united states',
+    'uk': 'united kingdom',
+    'great britain': 'united kingdom',
+    'uae': 'united arab emirates',
+    'car': 'central african republic',
+    'drc': 'congo kinshasa',
+    'dr congo': 'congo kinshasa',
+    'democratic republic of the congo': 'congo kinshasa',
+    'congo': 'congo brazzaville',
+    'republic of the congo': 'congo brazzaville',
+    'ivory coast': 'cote d ivoire',
+    'north korea': 'korea north',
+    'south korea': 'korea south',
+    'republic of korea': 'korea south',
+    'myanmar': 'burma',
+    'czech republic': 'czechia',
+    'turkiye': 'turkey',
+    'east timor': 'timor leste',
+    'cape verde': 'cabo verde',
+    'swaziland': 'eswatini',
+    'macedonia': 'north macedonia',
+    'bahamas': 'bahamas the',
+    'the bahamas': 'bahamas the',
+    'gambia': 'gambia the',
+    'the gambia': 'gambia the',
+    'micronesia': 'micronesia federated states of',
+    'lao pdr': 'laos',
+    'viet nam': 'vietnam',
+    'russian federation': 'russia',
+    'syrian arab republic': 'syria',
+    'palestine': 'west bank',
+    'vatican': 'vatican city',
+}
+
+# Minimum score of a fuzzy match
+MATCH_THRESHOLD = 0.8
+# Candidates (best by trigram Dice) rescored with difflib
+RESCORE = 8
+
+COLUMNS = ('city', 'city_ascii', 'country', 'admin_name', 'lat', 'lng', 'population')
+# Normalized names, computed when the source is parsed
+KEY_COLUMNS = ('city_key', 'ascii_key', 'country_key')
+CACHE_VERSION = 1
+
+
+def normalize(name):
+    """fold() without modifier letters such as the okina of "Nukuʻalofa\""""
+    folded = fold(name)
+    if not folded.isascii():
+        folded = ''.join(ch for ch in folded if unicodedata.category(ch) != 'Lm')
+    return folded
+
+
+def country_key(country):
+    key = normalize(country)
+    return COUNTRY_ALIASES.get(key, key)
+
+
+class _CountryBlock:
+    """Exact tables and (lazy) trigram index over the rows of one country"""
+
+    def __init__(self, rows, keys, populations):
+        self.rows = []
+        self.names = []
+        self.exact = defaultdict(list)
+        self.compact = defaultdict(list)
+        for row, row_keys in zip(rows, keys):
+            for name in set(row_keys):
+                if not name:
+                    continue
+                self.rows.append(row)
+                self.names.append(name)
+                self.exact[name].append(row)
+                self.compact[name.replace(' ', '')].append(row)
+        self.populations = populations
+        self.index = None
+
+    def _build_index(self):
+        index = defaultdict(list)
+        self.grams = []
+        for entry, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.grams.append(len(grams))
+            for gram in grams:
+                index[gram].append(entry)
+        self.index = dict(index)
+
+    def _most_populous(self, rows):
+        return max(rows, key=lambda r: self.populations[r])
+
+    def match(self, name):
+        """(row, score) of the best candidate for a normalized name; (None, best score) below the threshold"""
+        rows = self.exact.get(name) or self.compact.get(name.replace(' ', ''))
+        if rows:
+            return self._most_populous(rows), 1.0
+
+        if self.index is None:
+            self._build_index()
+        query = trigrams(name)
+        shared = Counter()
+        for gram in query:
+            shared.update(self.index.get(gram, ()))
+        if not shared:
+            return None, 0.0
+        dice = {entry: 2 * n / (len(query) + self.grams[entry]) for entry, n in shared.items()}
+        words = set(name.split())
+        best_row, best_key = None, (0.0, -np.inf)
+        for entry in sorted(dice, key=dice.get, reverse=True)[:RESCORE]:
+            candidate = self.names[entry]
+            score = max(dice[entry], SequenceMatcher(None, name, candidate).ratio())
+            cand_words = set(candidate.split())
+            if cand_words <= words or words <= cand_words:
+                score = max(score, 0.9)
+            key = (score, self.populations[self.rows[entry]])
+            if key > best_key:
+                best_row, best_key = self.rows[entry], key
+        if best_key[0] < MATCH_THRESHOLD:
+            return None, best_key[0]
+        return best_row, best_key[0]
+
+
+class CoordinateMatcher:
+    """Built once from a worldcities table (dict of column arrays, see load_worldcities)"""
+
+    def __init__(self, table):
+        self.table = table
+        self.populations = np.nan_to_num(np.asarray(table['population'], dtype=float), nan=0.0)
+        # Row ids grouped by country key
+        countries, inverse = np.unique(table['country_key'], return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(countries) + 1))
+        self._country_rows = {str(c): order[bounds[i]:bounds[i + 1]] for i, c in enumerate(countries)}
+        self._blocks = {}
+
+    def _block(self, key):
+        block = self._blocks.get(key)
+        if block is None:
+            rows = self._country_rows.get(key)
+            if rows is None:
+                return None
+            keys = zip(self.table['city_key'][rows].tolist(), self.table['ascii_key'][rows].tolist())
+            block = self._blocks[key] = _CountryBlock(rows.tolist(), keys, self.populations)
+        return block
+
+    def match(self, city, country):
+        """
+        Best worldcities row for a city as (row, score): score 1.0 for an
+        exact match, the fuzzy score otherwise; row is None when nothing in
+        that country scores MATCH_THRESHOLD or the country is unknown.
+        """
+        block = self._block(country_key(country))
+        if block is None:
+            return None, 0.0
+        return block.match(normalize(city))
+
+    def coordinates(self, row):
+        return float(self.table['lat'][row]), float(self.table['lng'][row])
+
+
+def _cache_path(path):
+    return f"{path}.cache.npz"
+
+
+def _read_source(path):
+    import pandas as pd
+    if path.endswith(('.xlsx', '.xls')):
+        frame = pd.read_excel(path)
+    else:
+        # Comma or tab separated; stray non-UTF-8 bytes only affect names
+        frame = pd.read_csv(path, sep=None, engine='python', encoding='utf-8', encoding_errors='replace')
+    missing = set(COLUMNS) - set(frame.columns) - {'city_ascii', 'admin_name', 'population'}
+    if missing:
+        raise ValueError(f"{path} has no {', '.join(sorted(missing))} column")
+    frame = frame.dropna(subset=['lat', 'lng'])
+    table = {}
+    for col in ('city', 'city_ascii', 'country', 'admin_name'):
+        values = frame[col] if col in frame.columns else frame['city']
+        table[col] = np.asarray(values.fillna('').astype(str), dtype=str)
+    for col in ('lat', 'lng', 'population'):
+        values = frame[col] if col in frame.columns else pd.Series(np.nan, index=frame.index)
+        table[col] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    table['city_key'] = np.asarray([normalize(n) for n in table['city']], dtype=str)
+    table['ascii_key'] = np.asarray([normalize(n) for n in table['city_ascii']], dtype=str)
+    table['country_key'] = np.asarray([normalize(n) for n in table['country']], dtype=str)
+    return table
+
+
+def load_worldcities(path):
+    """Column arrays of a worldcities CSV/TSV/XLSX, from the parsed cache when it is current"""
+    cache = _cache_path(path)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        with np.load(cache) as data:
+            if 'version' in data and int(data['version']) == CACHE_VERSION:
+                return {col: data[col] for col in COLUMNS + KEY_COLUMNS}
+    table = _read_source(path)
+    replace_atomic(cache, lambda f: np.savez(f, version=CACHE_VERSION, **table))
+    return table
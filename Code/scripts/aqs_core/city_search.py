@@ -0,0 +1,109 @@
+"""
+In-memory search index over city labels ("City, Country")
+
+Labels are normalized once (Unicode-folded, accents stripped, punctuation
+turned into spaces). A query is answered from a sorted token list (prefix
+lookup with bisect) and a trigram inverted index (substring and typo
+tolerant matches), and results are ranked:
+
+0. the whole label equals the query
+1. the label starts with the query
+2. every query word is the prefix of a word of the label
+3. the query appears anywhere in the label
+4. fuzzy: most of the query's trigrams appear in the label
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def fold(text):
+    """Lower-case, strip accents and replace punctuation with single spaces"""
+    if not text.isascii():
+        decomposed = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def trigrams(folded):
+    padded = f" {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CitySearchIndex:
+    """Build once from a list of labels; search() returns label positions, best first"""
+
+    # Minimum share of the query's trigrams a fuzzy match must contain
+    FUZZY_THRESHOLD = 0.6
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.folded = [fold(label) for label in self.labels]
+
+        postings = defaultdict(list)
+        grams = defaultdict(list)
+        for i, text in enumerate(self.folded):
+            for token in set(text.split()):
+                postings[token].append(i)
+            for gram in trigrams(text):
+                grams[gram].append(i)
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+        self.grams = dict(grams)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _prefix_ids(self, prefix):
+        """Labels having a word that starts with prefix"""
+        lo = bisect_left(self.tokens, prefix)
+        hi = bisect_left(self.tokens, prefix + '\U0010ffff', lo)
+        ids = set()
+        for postings in self.postings[lo:hi]:
+            ids.update(postings)
+        return ids
+
+    def search(self, query, limit=None):
+        """Positions of the labels matching query, ranked; every label for an empty query"""
+        q = fold(query)
+        if not q:
+            return list(range(len(self.labels)))[:limit]
+
+        ranked = {}
+
+        # Word-prefix matches (tiers 0-2)
+        words = q.split()
+        candidates = None
+        for word in sorted(words, key=len, reverse=True):
+            ids = self._prefix_ids(word)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        for i in candidates or ():
+            text = self.folded[i]
+            ranked[i] = 0 if text == q else 1 if text.startswith(q) else 2
+
+        # Substring and fuzzy matches from the trigram index (tiers 3-4)
+        query_grams = trigrams(q)
+        counts = Counter()
+        for gram in query_grams:
+            counts.update(self.grams.get(gram, ()))
+        needed = self.FUZZY_THRESHOLD * len(query_grams)
+        for i, hits in counts.items():
+            if i in ranked or hits < needed:
+                continue
+            if q in self.folded[i]:
+                ranked[i] = 3
+            else:
+                # Fuzzy matches are ordered by the share of trigrams they miss
+                ranked[i] = 4 + (1 - hits / len(query_grams))
+
+        order = sorted(ranked, key=lambda i: (ranked[i], len(self.folded[i]), i))
+        return order[:limit]
+
+    def search_labels(self, query, limit=None):
+        return [self.labels[i] for i in self.search(query, limit)]
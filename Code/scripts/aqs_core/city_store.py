@@ -0,0 +1,197 @@
+"""
+Memory-mapped columnar store for the city PM2.5 time series
+
+A store is a directory holding:
+- values.npy: float32 year x city matrix (column-major, so each city is contiguous)
+- years.npy: the year axis
+- index.json: the city names, in column order
+- annotations.json: bubble annotations keyed by city name
+
+The matrix is opened with np.load(mmap_mode='r'), so loading one city or every
+city is a zero-copy view instead of a JSON parse per file.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .fileio import replace_atomic, write_json_atomic
+from .naming import split_name
+
+VALUES_FILE = 'values.npy'
+YEARS_FILE = 'years.npy'
+INDEX_FILE = 'index.json'
+ANNOTATIONS_FILE = 'annotations.json'
+STORE_VERSION = 1
+
+
+def store_exists(store_dir):
+    """A store is complete once its index has been written"""
+    return os.path.exists(os.path.join(store_dir, INDEX_FILE))
+
+
+def is_stale(store_dir, csv_path):
+    """True if the store is missing or older than its source CSV"""
+    if not store_exists(store_dir):
+        return True
+    index_mtime = os.path.getmtime(os.path.join(store_dir, INDEX_FILE))
+    return index_mtime < os.path.getmtime(csv_path)
+
+
+def read_annotations(store_dir):
+    """The bubble table of a store directory ({} when there is none)"""
+    path = os.path.join(store_dir, ANNOTATIONS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CityStore:
+    """Read access to a store directory written by write_store"""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported store version in {store_dir}: {index.get('version')}")
+        self.names = index['cities']
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        self.years = np.load(os.path.join(store_dir, YEARS_FILE), mmap_mode='r')
+        self.values = np.load(os.path.join(store_dir, VALUES_FILE), mmap_mode='r')
+        if self.values.shape != (len(self.years), len(self.names)):
+            raise ValueError(f"Store {store_dir} is inconsistent: matrix shape {self.values.shape} for "
+                             f"{len(self.years)} years x {len(self.names)} cities; rebuild it")
+        self._annotations = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        """Column index of a city"""
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise KeyError(f"City '{name}' not found in store") from None
+
+    def series(self, name):
+        """PM2.5 values of one city as a read-only view (NaN where missing)"""
+        return self.values[:, self.column(name)]
+
+    def valid_series(self, name):
+        """(years, values) of one city with missing years dropped"""
+        values = self.series(name)
+        mask = ~np.isnan(values)
+        return np.asarray(self.years)[mask], values[mask]
+
+    def matrix(self, names=None):
+        """The year x city matrix, or a copy of the selected columns"""
+        if names is None:
+            return self.values
+        return self.values[:, [self.column(n) for n in names]]
+
+    @property
+    def annotations(self):
+        if self._annotations is None:
+            self._annotations = read_annotations(self.store_dir)
+        return self._annotations
+
+    def bubbles(self, name):
+        """Bubble annotations of one city"""
+        return self.annotations.get(name, [])
+
+    def set_bubbles(self, name, bubbles):
+        """Replace the bubble annotations of one city and persist the table"""
+        self.column(name)
+        if bubbles:
+            self.annotations[name] = sorted(bubbles, key=lambda b: b['year'])
+        else:
+            self.annotations.pop(name, None)
+        write_json_atomic(os.path.join(self.store_dir, ANNOTATIONS_FILE), self.annotations)
+
+    def record(self, name):
+        """One city in the same shape as a cities_json file"""
+        city, country = split_name(name)
+        records = [
+            {"year": int(yr), "value": None if np.isnan(val) else float(val)}
+            for yr, val in zip(self.years, self.series(name))
+        ]
+        obj = {"city": city, "country": country, "data": records}
+        bubbles = self.bubbles(name)
+        if bubbles:
+            obj["bubbles"] = list(bubbles)
+        return obj
+
+
+def write_store(store_dir, years, names, values, annotations=None):
+    """
+    Write a store from a year axis, city names and a year x city matrix.
+    Existing annotations are kept unless a new table is passed in.
+    """
+    values = np.asfortranarray(values, dtype=np.float32)
+    if values.shape != (len(years), len(names)):
+        raise ValueError(f"Matrix shape {values.shape} does not match {len(years)} years x {len(names)} cities")
+
+    os.makedirs(store_dir, exist_ok=True)
+    # An old index must not outlive the arrays it describes if the rebuild stops half way
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    replace_atomic(os.path.join(store_dir, YEARS_FILE),
+                   lambda f: np.save(f, np.asarray(years, dtype=np.int32)))
+    replace_atomic(os.path.join(store_dir, VALUES_FILE), lambda f: np.save(f, values))
+
+    annotations_path = os.path.join(store_dir, ANNOTATIONS_FILE)
+    if annotations is not None:
+        write_json_atomic(annotations_path, annotations)
+    elif not os.path.exists(annotations_path):
+        write_json_atomic(annotations_path, {})
+
+    # The index goes last: its presence marks the store as complete
+    write_json_atomic(index_path,
+                      {"version": STORE_VERSION, "cities": list(names)})
+
+
+def read_json_bubbles(json_dir, names):
+    """Collect the bubbles stored in a cities_json directory, keyed by city name"""
+    by_pair = {split_name(n): n for n in names}
+    annotations = {}
+    if not os.path.isdir(json_dir):
+        return annotations
+    for fname in os.listdir(json_dir):
+        if not fname.endswith('.json'):
+            continue
+        with open(os.path.join(json_dir, fname), 'r', encoding='utf-8') as f:
+            obj = json.load(f)
+        name = by_pair.get((obj.get('city', ''), obj.get('country', '')))
+        if name and obj.get('bubbles'):
+            annotations[name] = obj['bubbles']
+    return annotations
+
+
+def build_store(store_dir, df, year_col='Year', json_dir=None):
+    """
+    Write a store from a wide DataFrame (one year column plus one column per city).
+    Bubbles already in the store are kept; bubbles found in json_dir fill in cities without any.
+    """
+    names = [col for col in df.columns if col != year_col]
+    # Read from the file, so a rebuild that stopped before writing the index keeps them
+    annotations = read_annotations(store_dir)
+    if json_dir:
+        for name, bubbles in read_json_bubbles(json_dir, names).items():
+            annotations.setdefault(name, bubbles)
+    write_store(store_dir, df[year_col].to_numpy(), names, df[names].to_numpy(dtype=np.float32), annotations)
+    return CityStore(store_dir)
+
+
+def load_store(store_dir, csv_path=None, year_col='Year', json_dir=None):
+    """Open a store, (re)building it from csv_path first if it is missing or out of date"""
+    if csv_path is not None and is_stale(store_dir, csv_path):
+        import pandas as pd
+        return build_store(store_dir, pd.read_csv(csv_path), year_col=year_col, json_dir=json_dir)
+    return CityStore(store_dir)
@@ -0,0 +1,155 @@
+"""
+Birth-year exposure statistics for every city and birth year at once
+
+The static visualizer reports, for one city and one birth year, the PM2.5
+values from that year to MAX_YEAR: first and latest value, mean, standard
+deviation, min, max, change and estimated years of life lost. Here the same
+numbers are computed for the whole year x city matrix with reverse
+cumulative sums (count, sum, sum of squares, excess over the WHO level) and
+reverse cumulative min/max, so every (city, birth year) pair costs O(1).
+
+The series follow stripe_chart.series_from_birth: missing years are dropped,
+years after MAX_YEAR are cut, and when the data stops before MAX_YEAR the
+last value is repeated up to it.
+"""
+
+import numpy as np
+
+from .city_store import split_name
+
+MAX_YEAR = 2022
+WHO_LEVEL = 5.0  # WHO annual PM2.5 guideline (μg/m³)
+YLL_PER_10 = 0.6  # Years of life lost per 10 μg/m³ of average excess exposure
+
+# The store holds float32 values, so digits past these are noise, not data
+SIGNIFICANT_DIGITS = 7
+METRICS = ('birth_pm25', 'latest_pm25', 'mean', 'std', 'min', 'max',
+           'change_percent', 'years_lost', 'avg_excess', 'n_years')
+
+
+def round_significant(a, digits=SIGNIFICANT_DIGITS):
+    """a rounded to a number of significant digits (NaN and 0 stay as they are)"""
+    a = np.asarray(a, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(a)))
+    # Powers of ten up to 1e22 are exact, so the division lands on the nearest double of the decimal
+    exponent = np.clip(digits - 1 - np.nan_to_num(magnitude, nan=0, posinf=0, neginf=0), 0, 22)
+    scale = 10.0 ** exponent
+    return np.round(a * scale) / scale
+
+
+def _reverse_cumsum(a):
+    """Sum of each row and every row after it"""
+    return np.cumsum(a[::-1], axis=0)[::-1]
+
+
+class CohortStats:
+    """
+    Statistics table: one (birth year x city) array per metric. Birth years
+    after a city's last value have n_years == 0 and NaN elsewhere.
+    """
+
+    def __init__(self, birth_years, names, metrics):
+        self.birth_years = birth_years
+        self.names = list(names)
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        self.metrics = metrics
+        self._rows = {int(y): i for i, y in enumerate(birth_years)}
+
+    def __getitem__(self, metric):
+        return self.metrics[metric]
+
+    def get(self, name, birth_year):
+        """Every metric of one city and birth year, as a dict"""
+        try:
+            col, row = self.columns[name], self._rows[int(birth_year)]
+        except KeyError:
+            raise KeyError(f"No statistics for '{name}' born in {birth_year}") from None
+        out = {metric: float(self.metrics[metric][row, col]) for metric in METRICS}
+        out['n_years'] = int(out['n_years'])
+        return out
+
+    def city(self, name):
+        """Every metric of one city, one value per birth year"""
+        col = self.columns[name]
+        return {metric: self.metrics[metric][:, col] for metric in METRICS}
+
+    def to_frame(self):
+        """
+        Long table (city, country, birth_year, metrics...) without the empty
+        cohorts, with the metrics rounded to SIGNIFICANT_DIGITS
+        """
+        import pandas as pd
+        n_rows, n_cities = self.metrics['n_years'].shape
+        pairs = [split_name(name) for name in self.names]
+        frame = pd.DataFrame({
+            'city': np.tile([city for city, _ in pairs], n_rows),
+            'country': np.tile([country for _, country in pairs], n_rows),
+            'birth_year': np.repeat(np.asarray(self.birth_years), n_cities),
+        })
+        for metric in METRICS:
+            frame[metric] = round_significant(self.metrics[metric].ravel())
+        frame['n_years'] = frame['n_years'].astype(np.int64)
+        return frame[frame['n_years'] > 0].reset_index(drop=True)
+
+
+def cohort_stats(years, values, names, max_year=MAX_YEAR):
+    """Statistics of every city (columns of the year x city values) for every birth year up to max_year"""
+    years = np.asarray(years)
+    values = np.asarray(values, dtype=np.float64)
+    later = years > max_year
+    # series_from_birth only extends a series when nothing was cut off after max_year
+    has_later = (~np.isnan(values[later])).any(axis=0)
+    years, values = years[~later], values[~later]
+    n_rows, n_cities = values.shape
+    cols = np.arange(n_cities)
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    # Last value of each city and the number of years it is repeated for
+    any_valid = valid.any(axis=0)
+    last_row = np.where(any_valid, n_rows - 1 - np.argmax(valid[::-1], axis=0), 0)
+    latest = np.where(any_valid, values[last_row, cols], np.nan)
+    pad = np.where(any_valid & ~has_later, max_year - years[last_row], 0)
+
+    count = _reverse_cumsum(valid.astype(np.int64))
+    has_data = count > 0
+    pad = np.where(has_data, pad, 0)
+    n = count + pad
+    latest_fill = np.where(any_valid, latest, 0.0)
+    total = _reverse_cumsum(filled) + pad * latest_fill
+    squares = _reverse_cumsum(filled ** 2) + pad * latest_fill ** 2
+    excess = _reverse_cumsum(np.maximum(filled - WHO_LEVEL, 0.0)) + pad * np.maximum(latest_fill - WHO_LEVEL, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(has_data, total / n, np.nan)
+        std = np.where(has_data, np.sqrt(np.maximum(squares / n - mean ** 2, 0.0)), np.nan)
+        years_lost = np.where(has_data, excess / n / 10.0 * YLL_PER_10, np.nan)
+
+    # First value at or after each birth year
+    next_row = np.minimum.accumulate(np.where(valid, np.arange(n_rows)[:, None], n_rows)[::-1], axis=0)[::-1]
+    birth = np.where(has_data, values[np.minimum(next_row, n_rows - 1), cols], np.nan)
+    latest = np.where(has_data, latest, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = np.where(birth != 0, (latest - birth) / birth * 100, 0.0)
+    change = np.where(has_data, change, np.nan)
+
+    metrics = {
+        'birth_pm25': birth,
+        'latest_pm25': latest,
+        'mean': mean,
+        'std': std,
+        'min': np.fmin.accumulate(values[::-1], axis=0)[::-1],
+        'max': np.fmax.accumulate(values[::-1], axis=0)[::-1],
+        'change_percent': change,
+        'years_lost': years_lost,
+        'avg_excess': np.maximum(mean - WHO_LEVEL, 0.0),
+        'n_years': n.astype(np.float64),
+    }
+    return CohortStats(years, names, metrics)
+
+
+def store_stats(store, max_year=MAX_YEAR):
+    """cohort_stats of every city of a CityStore"""
+    return cohort_stats(store.years, store.values, store.names, max_year)
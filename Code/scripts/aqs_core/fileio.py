@@ -0,0 +1,30 @@
+"""
+Small file helpers shared by the scripts
+"""
+
+import json
+import os
+
+
+def replace_atomic(path, write):
+    """
+    Write a file through a temporary sibling and rename it into place, so
+    readers never see a half-written file. write(f) receives a binary handle.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_bytes_atomic(path, data):
+    replace_atomic(path, lambda f: f.write(data))
+
+
+def write_json_atomic(path, obj, indent=None):
+    write_bytes_atomic(path, json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8'))
@@ -0,0 +1,63 @@
+"""
+Lightweight access to the city data for command-line tools
+
+city_names() answers from the store index, the CSV header or the
+cities_json manifest using the standard library only, so listing or
+searching cities does not pay for numpy or pandas. open_store() loads the
+memory-mapped store (numpy; pandas only when it has to be rebuilt from the
+CSV) once values are actually needed.
+"""
+
+import csv
+import json
+import os
+
+CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+STORE_DIR = 'cities_store'
+JSON_DIR = 'cities_json'
+YEAR_COL = 'Year'
+
+# Kept in step with city_store, which cannot be imported here without numpy
+_STORE_INDEX = 'index.json'
+_STORE_VERSION = 1
+
+
+def _store_names(store_dir, csv_path):
+    """City names of a current store, or None"""
+    index_path = os.path.join(store_dir, _STORE_INDEX)
+    if not os.path.exists(index_path):
+        return None
+    if csv_path and os.path.exists(csv_path) and os.path.getmtime(index_path) < os.path.getmtime(csv_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    return index['cities'] if index.get('version') == _STORE_VERSION else None
+
+
+def _csv_names(csv_path):
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f), [])
+    return [col for col in header if col != YEAR_COL]
+
+
+def city_names(store_dir=STORE_DIR, csv_path=CSV_FILE, json_dir=JSON_DIR):
+    """
+    "City, Country" names from the first available source: the store (when
+    it is not older than the CSV), the CSV header, then the cities_json
+    directory. Raises FileNotFoundError when there is none.
+    """
+    names = _store_names(store_dir, csv_path) if store_dir else None
+    if names is not None:
+        return names
+    if csv_path and os.path.exists(csv_path):
+        return _csv_names(csv_path)
+    if json_dir and os.path.isdir(json_dir):
+        from .city_manifest import load_city_index
+        return [f"{it['city']}, {it['country']}" for it in load_city_index(json_dir)]
+    raise FileNotFoundError(f"No city data found ({store_dir}, {csv_path} or {json_dir})")
+
+
+def open_store(store_dir=STORE_DIR, csv_path=CSV_FILE):
+    """The CityStore, rebuilt from csv_path first when that exists and is newer"""
+    from . import city_store
+    return city_store.load_store(store_dir, csv_path=csv_path if csv_path and os.path.exists(csv_path) else None)
@@ -0,0 +1,24 @@
+"""
+City names and the file names derived from them (standard library only)
+"""
+
+import re
+
+
+def split_name(name):
+    """Split a "City, Country" column name on the last comma"""
+    city, country = name.rsplit(',', 1)
+    return city.strip(), country.strip()
+
+
+# Generate a valid filename: city_country.json
+# Keep only alphanumeric characters, underscores, and hyphens
+def safe(s):
+    # Remove all non-alphanumeric, non-space, non-underscore, and non-hyphen characters
+    tmp = re.sub(r'[^\w\-\s]', '', s)
+    # Replace spaces with underscores
+    return tmp.replace(' ', '_')
+
+
+def city_filename(city, country):
+    return f"{safe(city)}_{safe(country)}.json"
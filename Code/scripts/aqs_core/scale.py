@@ -0,0 +1,56 @@
+"""
+The 12-class PM2.5 colour scale of the stripes
+
+BOUNDS and COLORS are plain lists, so importing this module costs nothing;
+the matplotlib colormap and norm are built on first use (colormap(), or the
+module attributes cmap and norm).
+"""
+
+from bisect import bisect_right
+
+BOUNDS = [0, 5, 10, 15, 20, 30, 40, 50, 60, 70, 80, 90, 99999]
+COLORS = [
+    (164/255, 255/255, 255/255),  # 0 - 5    Very Good
+    (176/255, 218/255, 233/255),  # 5 - 10   Fair (lower)
+    (176/255, 206/255, 237/255),  # 10 - 15  Fair (upper)
+    (249/255, 224/255, 71/255),   # 15 - 20  Moderate (lower)
+    (242/255, 200/255, 75/255),   # 20 - 30  Moderate (upper)
+    (241/255, 166/255, 63/255),   # 30 - 40  Poor (lower)
+    (233/255, 135/255, 37/255),   # 40 - 50  Poor (upper)
+    (175/255, 69/255, 83/255),    # 50 - 60  Very Poor (lower)
+    (134/255, 59/255, 71/255),    # 60 - 70  Very Poor (upper)
+    (103/255, 58/255, 61/255),    # 70 - 80  Extremely Poor (lower)
+    (70/255, 47/255, 48/255),     # 80 - 90  Extremely Poor (mid)
+    (37/255, 36/255, 36/255),     # 90+      Extremely Poor (upper)
+]
+LABELS = ['Very Good', 'Fair', 'Fair', 'Moderate', 'Moderate', 'Poor', 'Poor',
+          'Very Poor', 'Very Poor', 'Extremely Poor', 'Extremely Poor', 'Extremely Poor']
+
+_colormap = None
+
+
+def colormap():
+    """(ListedColormap, BoundaryNorm) of the scale, for imshow(cmap=..., norm=...)"""
+    global _colormap
+    if _colormap is None:
+        import matplotlib.colors as mcolors
+        cmap = mcolors.ListedColormap(COLORS)
+        _colormap = cmap, mcolors.BoundaryNorm(BOUNDS, cmap.N)
+    return _colormap
+
+
+def category(value):
+    """Class index of a PM2.5 value (values past the last bound fall in the last class)"""
+    return min(max(bisect_right(BOUNDS, value) - 1, 0), len(COLORS) - 1)
+
+
+def label(value):
+    return LABELS[category(value)]
+
+
+def __getattr__(name):
+    if name == 'cmap':
+        return colormap()[0]
+    if name == 'norm':
+        return colormap()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
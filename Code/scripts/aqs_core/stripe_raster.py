@@ -0,0 +1,114 @@
+"""
+Plain PM2.5 stripes rendered with NumPy only (no matplotlib)
+
+    from aqs_core import stripe_raster
+
+    pixels = stripe_raster.rasterize(values, width=1200, height=200)
+    stripe_raster.write_png('stripe.png', pixels)
+
+Values are classified into the 12 classes of aqs_core.scale with
+np.digitize, giving one palette index per year; the row of indices is
+stretched to the requested width and broadcast to the height, then written
+as a palette-mode PNG (or raw RGB bytes). Classes match the BoundaryNorm of
+the matplotlib charts: a value on a bound belongs to the class above it,
+values below 0 to the first class and missing years (NaN) are transparent.
+Use stripe_chart.py for charts with axes, the line and annotations.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+from . import scale
+from .fileio import write_bytes_atomic
+
+# Palette index of missing values, after the classes of the scale
+NAN_INDEX = len(scale.COLORS)
+PALETTE = np.array([[round(c * 255) for c in color] for color in scale.COLORS] + [[255, 255, 255]],
+                   dtype=np.uint8)
+_INNER_BOUNDS = np.asarray(scale.BOUNDS[1:-1], dtype=np.float64)
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def classify(values):
+    """uint8 palette index of each value (same shape; NaN -> NAN_INDEX)"""
+    values = np.asarray(values, dtype=np.float64)
+    indices = np.digitize(values, _INNER_BOUNDS).astype(np.uint8)
+    indices[np.isnan(values)] = NAN_INDEX
+    return indices
+
+
+def stretch(indices, width):
+    """
+    Columns of a (..., n) index array resampled to width pixels, each value
+    covering an equal share of the width (exactly width / n pixels when it divides)
+    """
+    n = indices.shape[-1]
+    if width == n:
+        return indices
+    return indices[..., (np.arange(width) * n) // width]
+
+
+def rasterize(values, width=None, height=1):
+    """
+    (height, width) uint8 palette image of one stripe, one band per value;
+    width defaults to one pixel per value. The rows are a broadcast view of
+    a single row, so tall stripes cost no more than short ones.
+    """
+    row = stretch(classify(values), width or len(values))
+    return np.broadcast_to(row, (height, row.shape[0]))
+
+
+def atlas(years, values):
+    """
+    Palette image of every stripe at once, one row per city and one column
+    per year from years[0] to years[-1] (years missing from the axis are
+    NaN columns), from a year x city matrix. Returns (indices, first year).
+    """
+    years = np.asarray(years, dtype=np.int64)
+    columns = years - years[0]
+    indices = np.full((np.shape(values)[1], int(columns[-1]) + 1), NAN_INDEX, dtype=np.uint8)
+    indices[:, columns] = classify(np.asarray(values).T)
+    return indices, int(years[0])
+
+
+def rgb(indices):
+    """(..., 3) uint8 RGB image of palette indices"""
+    return PALETTE[indices]
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_bytes(indices, level=6):
+    """
+    8-bit palette PNG of a 2-D array of palette indices, with NaN transparent.
+    Identical rows (a broadcast stripe) are compressed from a single copy.
+    """
+    indices = np.asarray(indices, dtype=np.uint8)
+    height, width = indices.shape
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    # Each scanline starts with its filter type (0, none)
+    if indices.strides[0] == 0:
+        scanline = b'\x00' + indices[0].tobytes()
+        compressor = zlib.compressobj(level)
+        data = b''.join(compressor.compress(scanline) for _ in range(height)) + compressor.flush()
+    else:
+        scanlines = np.empty((height, width + 1), dtype=np.uint8)
+        scanlines[:, 0] = 0
+        scanlines[:, 1:] = indices
+        data = zlib.compress(scanlines.tobytes(), level)
+    alpha = bytes([255] * NAN_INDEX + [0])
+    return (_PNG_SIGNATURE + _chunk(b'IHDR', header) + _chunk(b'PLTE', PALETTE.tobytes())
+            + _chunk(b'tRNS', alpha) + _chunk(b'IDAT', data) + _chunk(b'IEND', b''))
+
+
+def write_png(path, indices):
+    write_bytes_atomic(path, png_bytes(indices))
+
+
+def write_raw(path, indices):
+    """Raw RGB bytes (rgb24, row by row), e.g. for ffmpeg -f rawvideo"""
+    write_bytes_atomic(path, rgb(indices).tobytes())
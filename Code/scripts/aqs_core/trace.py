@@ -0,0 +1,305 @@
+"""
+Stage timing and memory instrumentation shared by the scripts
+
+    from aqs_core import trace
+
+    with trace.span('csv parse', file=path):
+        df = pd.read_csv(path)
+    for frame in frames:
+        with trace.timer('frame render'):
+            ...
+
+A span records one stage: wall time, CPU time, the peak RSS of the process
+when it ends, and the bytes read and written meanwhile (rchar/wchar of
+/proc/self/io, so pipes count too, as do child processes such as ffmpeg
+once they exit; None where that is not available).
+Spans nest and may be opened from any thread. A timer aggregates a step
+that repeats many times (frames, bands): count, total wall and CPU time,
+min and max. count() adds to plain counters.
+
+Nothing is recorded unless tracing is enabled, either by the AQS_TRACE
+environment variable or by a script's --trace option, set to the output
+path. The report is written when the process exits: a Chrome trace
+(chrome://tracing, ui.perfetto.dev) when the path ends in .trace.json or
+AQS_TRACE_FORMAT=chrome, otherwise a JSON summary. Only the process that
+enabled tracing records: worker processes inherit the environment but
+their stages are not collected.
+"""
+
+import atexit
+import datetime
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+ENV_PATH = 'AQS_TRACE'
+ENV_FORMAT = 'AQS_TRACE_FORMAT'
+ENV_OWNER = 'AQS_TRACE_PID'  # Set by the process that traces, so its children do not
+FORMATS = ('json', 'chrome')
+REPORT_VERSION = 1
+
+_tracer = None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB"""
+    # On Linux ru_maxrss carries over fork + exec, so a child could report its
+    # parent's peak; VmHWM belongs to the address space, which exec replaces
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def io_bytes():
+    """(read, written) bytes of this process so far, or (None, None)"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _delta(after, before):
+    return None if after is None or before is None else after - before
+
+
+class Span:
+    """One timed stage; attributes can be added while it runs with set()"""
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer.stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self.read, self.written = io_bytes()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        read, written = io_bytes()
+        self.tracer.stack().pop()
+        record = {
+            'name': self.name,
+            'depth': self.depth,
+            'thread': threading.current_thread().name,
+            'start': self.start - self.tracer.origin,
+            'wall': wall,
+            'cpu': cpu,
+            'peak_rss_mb': peak_rss_mb(),
+            'read_bytes': _delta(read, self.read),
+            'written_bytes': _delta(written, self.written),
+        }
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        if self.attrs:
+            record['attrs'] = self.attrs
+        self.tracer.add_span(record)
+        return False
+
+
+class _Timer:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.tracer.add_timing(self.name, self.start, end - self.start, time.process_time() - self.cpu)
+        return False
+
+
+class _Disabled:
+    """Stands in for spans and timers when tracing is off"""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_DISABLED = _Disabled()
+
+
+class Tracer:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.format = fmt
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.spans = []
+        self.timers = {}
+        self.events = []  # (name, start, wall) of every timed step, for the Chrome trace
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add_span(self, record):
+        with self.lock:
+            self.spans.append(record)
+
+    def add_timing(self, name, start, wall, cpu):
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'min': wall, 'max': wall}
+            stats['count'] += 1
+            stats['wall'] += wall
+            stats['cpu'] += cpu
+            stats['min'] = min(stats['min'], wall)
+            stats['max'] = max(stats['max'], wall)
+            if self.format == 'chrome':
+                self.events.append((name, start - self.origin, wall))
+
+    def add_count(self, name, n):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        spans = sorted(self.spans, key=lambda s: s['start'])
+        return {
+            'format': 'aqs-trace',
+            'version': REPORT_VERSION,
+            'command': sys.argv,
+            'pid': self.pid,
+            'started': self.started,
+            'wall': time.perf_counter() - self.origin,
+            'cpu': time.process_time(),
+            'peak_rss_mb': peak_rss_mb(),
+            'spans': spans,
+            'timers': self.timers,
+            'counters': self.counters,
+        }
+
+    def chrome_trace(self):
+        report = self.report()
+        us = 1e6
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                   'args': {'name': os.path.basename(sys.argv[0] or 'python')}}]
+        # Numeric track per thread; timed steps get a track of their own
+        tids = {}
+
+        def track(name):
+            if name not in tids:
+                tids[name] = len(tids) + 1
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tids[name],
+                               'args': {'name': name}})
+            return tids[name]
+
+        for span in report['spans']:
+            args = {k: v for k, v in span.items() if k not in ('name', 'start', 'wall', 'thread', 'attrs')}
+            args.update(span.get('attrs', {}))
+            events.append({'name': span['name'], 'cat': 'span', 'ph': 'X', 'pid': self.pid,
+                           'tid': track(span['thread']), 'ts': span['start'] * us, 'dur': span['wall'] * us,
+                           'args': args})
+            events.append({'name': 'peak RSS (MB)', 'ph': 'C', 'pid': self.pid,
+                           'ts': (span['start'] + span['wall']) * us, 'args': {'MB': span['peak_rss_mb']}})
+        for name, start, wall in self.events:
+            events.append({'name': name, 'cat': 'timer', 'ph': 'X', 'pid': self.pid, 'tid': track('steps'),
+                           'ts': start * us, 'dur': wall * us})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {k: report[k] for k in ('command', 'started', 'timers', 'counters')}}
+
+    def write(self):
+        # A forked worker holds a copy of the parent's tracer: leave the file to the parent
+        if os.getpid() != self.pid:
+            return
+        doc = self.chrome_trace() if self.format == 'chrome' else self.report()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False, indent=1, default=str)
+
+
+def enable(path, fmt=None):
+    """Start recording; the report is written to path when the process exits"""
+    global _tracer
+    if fmt is None:
+        fmt = os.environ.get(ENV_FORMAT) or ('chrome' if path.endswith('.trace.json') else 'json')
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown trace format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    if _tracer is None:
+        atexit.register(write)
+    os.environ[ENV_OWNER] = str(os.getpid())
+    _tracer = Tracer(path, fmt)
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def write():
+    """Write the report now (also done at exit)"""
+    if _tracer is not None:
+        _tracer.write()
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; attrs are stored with it"""
+    if _tracer is None:
+        return _DISABLED
+    return Span(_tracer, name, attrs)
+
+
+def timer(name):
+    """Context manager adding one step to the aggregated timing of name"""
+    if _tracer is None:
+        return _DISABLED
+    return _Timer(_tracer, name)
+
+
+def count(name, n=1):
+    if _tracer is not None:
+        _tracer.add_count(name, n)
+
+
+def add_argument(parser):
+    """The --trace option of a script's argparse parser; pass the parsed value to from_args"""
+    parser.add_argument('--trace', metavar='PATH', default=None,
+                        help=f'Write stage timings to PATH (.trace.json: Chrome trace); also ${ENV_PATH}')
+
+
+def from_args(args):
+    if getattr(args, 'trace', None):
+        enable(args.trace)
+
+
+if os.environ.get(ENV_PATH) and os.environ.setdefault(ENV_OWNER, str(os.getpid())) == str(os.getpid()):
+    enable(os.environ[ENV_PATH])
@@ -0,0 +1,140 @@
+"""
+Virtualized list widget for the Tk tools
+
+A tk.Listbox holding the whole catalogue costs one insert() per city on every
+refresh. VirtualListbox keeps the items in a plain sequence and only puts the
+rows that fit on screen into its Listbox; scrolling moves a window over the
+sequence. It mimics the parts of the Listbox API the tools use: curselection()
+and get() take positions in the backing sequence, and <<ListboxSelect>> is
+generated on the widget itself.
+"""
+
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+# Rows moved per mouse wheel notch
+WHEEL_ROWS = 3
+
+
+class VirtualListbox(tk.Frame):
+    def __init__(self, master, height=10, width=20, label=str, **listbox_options):
+        """label turns an item into the text shown for it (called for visible rows only)"""
+        super().__init__(master)
+        self.label = label
+        self.items = []
+        self.top = 0
+        self.rows = height
+        self.selected = None
+
+        self.listbox = tk.Listbox(self, height=height, width=width, exportselection=False,
+                                  activestyle='none', **listbox_options)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.listbox.bind('<<ListboxSelect>>', self._on_click)
+        self.listbox.bind('<Configure>', self._on_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.listbox.bind(sequence, self._on_wheel)
+        for key, delta in (('<Up>', -1), ('<Down>', 1)):
+            self.listbox.bind(key, lambda e, d=delta: self._move(d))
+        self.listbox.bind('<Prior>', lambda e: self._move(-self.rows))
+        self.listbox.bind('<Next>', lambda e: self._move(self.rows))
+        self.listbox.bind('<Home>', lambda e: self._move(-len(self.items)))
+        self.listbox.bind('<End>', lambda e: self._move(len(self.items)))
+
+    # —— Listbox-like API ——
+
+    def set_items(self, items):
+        """Show a new sequence of items, scrolled to the top with nothing selected"""
+        self.items = items
+        self.top = 0
+        self.selected = None
+        self._render()
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def get(self, index):
+        return self.label(self.items[index])
+
+    def size(self):
+        return len(self.items)
+
+    def see(self, index):
+        """Scroll so that items[index] is visible"""
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self._render()
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self.top += int(args[1]) * step
+        self._render()
+
+    # —— Rendering ——
+
+    def _render(self):
+        self.top = max(0, min(self.top, len(self.items) - self.rows))
+        visible = self.items[self.top:self.top + self.rows]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(0, *[self.label(item) for item in visible])
+        if self.selected is not None and self.top <= self.selected < self.top + len(visible):
+            self.listbox.selection_set(self.selected - self.top)
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items),
+                               min(1.0, (self.top + self.rows) / len(self.items)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _row_height(self):
+        font = tkfont.Font(font=self.listbox.cget('font'))
+        return font.metrics('linespace') + 1 + 2 * int(self.listbox.cget('selectborderwidth'))
+
+    def _on_resize(self, event):
+        border = int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness'))
+        rows = max(1, (event.height - 2 * border) // self._row_height())
+        if rows != self.rows:
+            self.rows = rows
+            self._render()
+
+    # —— Interaction ——
+
+    def _select(self, index):
+        if index != self.selected:
+            self.selected = index
+            self.event_generate('<<ListboxSelect>>')
+
+    def _on_click(self, _):
+        sel = self.listbox.curselection()
+        # Re-rendering clears the Listbox selection; only a click picks a new item
+        if sel:
+            self._select(self.top + sel[0])
+
+    def _move(self, delta):
+        if not self.items:
+            return 'break'
+        start = self.top if self.selected is None else self.selected
+        index = max(0, min(start + delta, len(self.items) - 1))
+        self._select(index)
+        self.see(index)
+        return 'break'
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        else:
+            # Windows reports multiples of 120 per notch, macOS small integers
+            steps = -int(event.delta / 120) if abs(event.delta) >= 120 else -event.delta
+        self.yview('scroll', steps * WHEEL_ROWS, 'units')
+        return 'break'
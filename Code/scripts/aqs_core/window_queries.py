@@ -0,0 +1,169 @@
+"""
+Year-window queries and rankings over the year x city matrix
+
+WindowIndex precomputes, once per matrix:
+- prefix sums of the values and prefix counts of the valid (non-NaN) years
+- sparse tables of the running min and max (log2(years) levels)
+- for every row, the nearest valid row at or after it and at or before it
+
+so the mean, min, max, number of valid years, first and last value and
+change over any [start, end] window cost O(1) per city; exceedance counts
+get a prefix count per threshold, built on first use. top() ranks the cities
+with np.argpartition instead of a full sort.
+
+Windows use the raw data: missing years are skipped, nothing is carried
+forward (unlike the birth-year statistics of exposure_stats).
+"""
+
+import numpy as np
+
+from .exposure_stats import WHO_LEVEL
+
+# Window metrics top() can rank by
+METRICS = ('mean', 'min', 'max', 'count', 'first', 'last', 'change', 'change_percent', 'exceedances')
+
+
+def _prefix(a):
+    """Prefix sums with a leading zero row, so a window is prefix[end + 1] - prefix[start]"""
+    out = np.zeros((a.shape[0] + 1,) + a.shape[1:], dtype=a.dtype)
+    np.cumsum(a, axis=0, out=out[1:])
+    return out
+
+
+def _sparse_table(values, op):
+    """levels[k][i] = op over rows i .. i + 2**k - 1 (NaN-ignoring op)"""
+    levels = [values]
+    span = 1
+    while 2 * span <= len(values):
+        prev = levels[-1]
+        levels.append(op(prev[:-span], prev[span:]))
+        span *= 2
+    return levels
+
+
+class WindowIndex:
+    def __init__(self, years, values, names):
+        self.years = np.asarray(years)
+        self.names = list(names)
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        values = np.asarray(values, dtype=np.float64)
+        self.values = values
+        n_rows = len(self.years)
+        rows = np.arange(n_rows)[:, None]
+
+        valid = ~np.isnan(values)
+        self._sums = _prefix(np.where(valid, values, 0.0))
+        self._counts = _prefix(valid.astype(np.int32))
+        # Min/max are exact in the store's float32, at half the memory of the log2(years) levels
+        table_values = values.astype(np.float32)
+        self._min = _sparse_table(table_values, np.fmin)
+        self._max = _sparse_table(table_values, np.fmax)
+        # Nearest valid row at or after / at or before each row (n_rows / -1 when none)
+        self._next = np.minimum.accumulate(np.where(valid, rows, n_rows)[::-1], axis=0)[::-1]
+        self._prev = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        self._exceed = {}
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.years, store.values, store.names)
+
+    def rows(self, start_year, end_year):
+        """Row range [lo, hi] of a year window, clipped to the data"""
+        if start_year > end_year:
+            raise ValueError(f"Empty window: {start_year} > {end_year}")
+        lo = int(np.searchsorted(self.years, start_year, side='left'))
+        hi = int(np.searchsorted(self.years, end_year, side='right')) - 1
+        if lo > hi:
+            raise ValueError(f"No data between {start_year} and {end_year}")
+        return lo, hi
+
+    # —— O(1) per city window statistics (arrays over all cities) ——
+
+    def count(self, lo, hi):
+        return self._counts[hi + 1] - self._counts[lo]
+
+    def mean(self, lo, hi):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._sums[hi + 1] - self._sums[lo]) / self.count(lo, hi)
+
+    def _range_query(self, levels, op, lo, hi):
+        k = (hi - lo + 1).bit_length() - 1
+        return op(levels[k][lo], levels[k][hi - (1 << k) + 1])
+
+    def min(self, lo, hi):
+        return self._range_query(self._min, np.fmin, lo, hi).astype(np.float64)
+
+    def max(self, lo, hi):
+        return self._range_query(self._max, np.fmax, lo, hi).astype(np.float64)
+
+    def first(self, lo, hi):
+        """First valid value of the window (NaN when the window has none)"""
+        row = self._next[lo]
+        return self._pick(row, (row <= hi))
+
+    def last(self, lo, hi):
+        """Last valid value of the window (NaN when the window has none)"""
+        row = self._prev[hi]
+        return self._pick(row, (row >= lo))
+
+    def _pick(self, row, ok):
+        cols = np.arange(len(self.names))
+        picked = self.values[np.clip(row, 0, len(self.years) - 1), cols]
+        return np.where(ok, picked, np.nan)
+
+    def change(self, lo, hi):
+        return self.last(lo, hi) - self.first(lo, hi)
+
+    def change_percent(self, lo, hi):
+        first = self.first(lo, hi)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(first != 0, (self.last(lo, hi) - first) / first * 100, np.nan)
+
+    def exceedances(self, lo, hi, threshold=WHO_LEVEL):
+        """Number of valid years above threshold; the prefix count is built on first use"""
+        prefix = self._exceed.get(threshold)
+        if prefix is None:
+            with np.errstate(invalid='ignore'):
+                prefix = self._exceed[threshold] = _prefix((self.values > threshold).astype(np.int32))
+        return prefix[hi + 1] - prefix[lo]
+
+    # —— Queries by year ——
+
+    def window(self, start_year, end_year, threshold=WHO_LEVEL):
+        """Every window metric for every city, as {metric: array over cities}"""
+        lo, hi = self.rows(start_year, end_year)
+        return {
+            'mean': self.mean(lo, hi),
+            'min': self.min(lo, hi),
+            'max': self.max(lo, hi),
+            'count': self.count(lo, hi),
+            'first': self.first(lo, hi),
+            'last': self.last(lo, hi),
+            'change': self.change(lo, hi),
+            'change_percent': self.change_percent(lo, hi),
+            'exceedances': self.exceedances(lo, hi, threshold),
+        }
+
+    def metric(self, metric, start_year, end_year, threshold=WHO_LEVEL):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}")
+        lo, hi = self.rows(start_year, end_year)
+        if metric == 'exceedances':
+            return self.exceedances(lo, hi, threshold)
+        return getattr(self, metric)(lo, hi)
+
+    def top(self, metric, start_year, end_year, k=10, largest=True, threshold=WHO_LEVEL):
+        """
+        The k best cities by a window metric, as [(name, value), ...] best
+        first. largest=False ranks the smallest values first (e.g. cleanest
+        cities by mean, most improved by change). Cities without data are left out.
+        """
+        scores = np.asarray(self.metric(metric, start_year, end_year, threshold), dtype=np.float64)
+        lo, hi = self.rows(start_year, end_year)
+        candidates = np.flatnonzero(~np.isnan(scores) & (self.count(lo, hi) > 0))
+        keyed = scores[candidates] if not largest else -scores[candidates]
+        if k < len(candidates):
+            part = np.argpartition(keyed, k - 1)[:k]
+            candidates, keyed = candidates[part], keyed[part]
+        order = candidates[np.argsort(keyed, kind='stable')]
+        return [(self.names[i], float(scores[i])) for i in order]
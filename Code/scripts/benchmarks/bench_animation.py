@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the MP4 animation engines of mp4_with_bubbles.py
+
+Renders the same synthetic long series (default 1000 years, a bubble every
+100 years) with the original FuncAnimation renderer and the raw-frame pipe
+engine, and reports frames per second:
+- render: drawing frames only (no encoding), which is what the engine changes
+- end-to-end: rendering plus H.264 encoding into an MP4 file
+
+Usage:
+    python bench_animation.py [--years 1000] [--skip-funcanimation]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-animation'))
+
+import matplotlib.pyplot as plt
+import frame_pipe
+import mp4_with_bubbles as mp4
+
+
+def synthetic_series(n_years, seed=0):
+    rng = np.random.default_rng(seed)
+    years = np.arange(1850, 1850 + n_years)
+    values = np.clip(40 + np.cumsum(rng.normal(0, 2, n_years)), 2, 115)
+    bubbles = [(int(y), mp4.wrap_text_to_two_lines(f"Synthetic event in the year {y}"), -15, 20)
+               for y in years[50::100]]
+    return years, values, bubbles
+
+
+def render_only_funcanimation(years, values, bubbles):
+    """Draw every frame the way FuncAnimation.save does, without encoding"""
+    fig, ax, ax2 = mp4.setup_figure("Synthetic", "Benchmark", years, values, dpi=mp4.ANIMATION_DPI)
+    line, = ax2.plot([], [], color="white", linewidth=5, zorder=10)
+    added = set()
+    for frame in range(len(years)):
+        line.set_data(years[:frame + 1], values[:frame + 1])
+        for (y_int, text_val, ox, oy) in bubbles:
+            if years[frame] >= y_int and y_int not in added:
+                idx = np.where(years == y_int)[0]
+                if len(idx):
+                    mp4.annotate_bubble(ax2, y_int, text_val, ox, oy, values[idx[0]])
+                    added.add(y_int)
+        fig.canvas.draw()
+        fig.canvas.buffer_rgba()
+    plt.close(fig)
+
+
+def render_only_pipe(years, values, bubbles):
+    fig, ax, ax2 = mp4.setup_figure("Synthetic", "Benchmark", years, values, dpi=mp4.ANIMATION_DPI)
+    schedule = frame_pipe.bubble_schedule(years, bubbles)
+    frame_pipe.render_frames(fig, ax2, years, values, schedule,
+                             lambda bubble, idx: mp4.annotate_bubble(ax2, *bubble, values[idx]),
+                             lambda buffer: None)
+    plt.close(fig)
+
+
+def timed(label, n_frames, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    print(f"{label:<32} {seconds:8.2f}s {n_frames / seconds:9.1f} frames/s")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=1000, help='Length of the synthetic series')
+    parser.add_argument('--skip-funcanimation', action='store_true', help='Only time the pipe engine')
+    args = parser.parse_args()
+
+    years, values, bubbles = synthetic_series(args.years)
+    n = len(years)
+    print(f"Synthetic series: {n} years, {len(bubbles)} bubbles, {mp4.ANIMATION_DPI} dpi")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results['pipe render'] = timed('pipe: render', n, render_only_pipe, years, values, bubbles)
+        results['pipe total'] = timed('pipe: render + encode', n, mp4.create_animation_for_city,
+                                      "Synthetic", "Benchmark", years, values,
+                                      os.path.join(tmp, 'pipe.mp4'), bubbles)
+        if not args.skip_funcanimation:
+            results['fa render'] = timed('funcanimation: render', n, render_only_funcanimation,
+                                         years, values, bubbles)
+            results['fa total'] = timed('funcanimation: render + encode', n,
+                                        mp4.create_animation_for_city_funcanimation,
+                                        "Synthetic", "Benchmark", years, values,
+                                        os.path.join(tmp, 'funcanimation.mp4'), bubbles)
+
+    if not args.skip_funcanimation:
+        print(f"Speed-up (render):     {results['fa render'] / results['pipe render']:.1f}x")
+        print(f"Speed-up (end-to-end): {results['fa total'] / results['pipe total']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the two PM2.5 map formats of extract_pm25_2022.py
+
+Writes the same synthetic global grid (default 0.1 degree, ~40% of cells
+without data, as over the oceans) both ways and reports, per format, the
+file size raw / gzip / brotli and the time to decode it back into values:
+- json: the sparse {lat, lon, value} point list, decoded with json.loads
+- grid: the uint16 grid + JSON header, decoded with np.frombuffer
+
+Brotli sizes need the optional brotli package.
+
+Usage:
+    python bench_grid_format.py --downsample 1 4 10
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'Dashboard'))
+
+import extract_pm25_2022 as extract
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ArrayReader:
+    """GridReader stand-in serving bands of an in-memory (lat, lon) array"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def band(self, start, stop):
+        return self.values[start:stop]
+
+
+def synthetic_grid(n_lats, n_lons, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = np.linspace(-90, 90, n_lats)
+    lons = np.linspace(-180, 180, n_lons, endpoint=False)
+    # Smooth large-scale field plus noise, with a blocky "ocean" mask
+    field = 20 + 15 * np.sin(np.radians(lats))[:, None] * np.cos(np.radians(2 * lons))[None, :]
+    values = np.clip(field + rng.gamma(2.0, 4.0, size=(n_lats, n_lons)), 0, None)
+    ocean = rng.random((n_lats // 30 + 1, n_lons // 30 + 1)) < 0.4
+    values[np.kron(ocean, np.ones((30, 30), dtype=bool))[:n_lats, :n_lons]] = np.nan
+    return lats, lons, values
+
+
+def encode(lats, lons, values, factor, output_format):
+    """The file(s) extract_pm25_2022 writes, as (header bytes, data bytes)"""
+    stats = {'cells': 0, 'valid': 0, 'min': np.inf, 'max': -np.inf}
+    lat_idx, lon_idx = np.arange(0, len(lats), factor), np.arange(0, len(lons), factor)
+    bands = extract.iter_bands(ArrayReader(values), len(lats), lon_idx, factor, extract.BAND_ROWS, stats)
+    buf = io.BytesIO()
+    if output_format == 'grid':
+        extract.write_grid_binary(buf, bands)
+        header = extract.grid_header(lats[lat_idx], lons[lon_idx], 'grid.bin', {}, {})
+        return json.dumps(header, indent=2).encode('utf-8'), buf.getvalue()
+    head = json.dumps({'coordinates': {'lats': lats[lat_idx].tolist(), 'lons': lons[lon_idx].tolist()},
+                       'data': []}, indent=2)[:-len(']\n}')]
+    buf.write(head.encode('utf-8'))
+    extract.write_grid_json(buf, bands, lats, lons[lon_idx])
+    buf.write(b'\n  ]\n}')
+    return b'', buf.getvalue()
+
+
+def decode_json(header, data):
+    return np.array([p['value'] for p in json.loads(data)['data']])
+
+
+def decode_grid(header, data):
+    header = json.loads(header)
+    raw = np.frombuffer(data, dtype='<u2').reshape(header['shape'])
+    return np.where(raw == header['nodata'], np.nan, raw * header['scale'])
+
+
+def timed(fn, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lats', type=int, default=1800)
+    parser.add_argument('--lons', type=int, default=3600)
+    parser.add_argument('--downsample', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    lats, lons, values = synthetic_grid(args.lats, args.lons)
+    print(f"{args.lats} x {args.lons} grid, {np.mean(~np.isnan(values)):.0%} cells with data")
+    print(f"{'factor':>6} {'format':>6} {'raw MB':>9} {'gzip MB':>9} {'br MB':>9} {'decode ms':>10}")
+    for factor in args.downsample:
+        for output_format, decode in (('json', decode_json), ('grid', decode_grid)):
+            header, data = encode(lats, lons, values, factor, output_format)
+            size = len(header) + len(data)
+            gz = len(header) + len(gzip.compress(data, compresslevel=9))
+            br = f"{(len(header) + len(brotli.compress(data))) / 1e6:>9.2f}" if brotli else f"{'-':>9}"
+            seconds = timed(decode, header, data, repeat=1 if output_format == 'json' and factor == 1 else 3)
+            print(f"{factor:>6} {output_format:>6} {size / 1e6:>9.2f} {gz / 1e6:>9.2f} {br} {seconds * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
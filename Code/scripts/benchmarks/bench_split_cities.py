@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bulk JSON exporter of split_cities.py
+
+Builds synthetic V1pt6-shaped matrices (cities x years, ~5% missing values),
+exports them with export_city_json and reports the cost per cell, which
+should stay flat as the catalogue grows. The original per-cell loop
+(pd.isna + a dict per year + json.dump(indent=2)) is timed as a baseline for
+catalogues up to --legacy-max cities.
+
+Usage:
+    python bench_split_cities.py --cities 1000 5000 10000 --years 1000
+    python bench_split_cities.py --cities 50000 --years 1000 --encode-only
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-animation'))
+
+import split_cities
+
+
+def synthetic_matrix(n_cities, n_years, seed=0):
+    rng = np.random.default_rng(seed)
+    years = np.arange(1850, 1850 + n_years)
+    values = np.round(rng.gamma(2.0, 15.0, size=(n_years, n_cities)), 8)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    names = [f"City {i}, Country {i % 200}" for i in range(n_cities)]
+    return names, years, values
+
+
+def legacy_export(names, years, values, output_dir):
+    """The original split_cities.py loop"""
+    df = pd.DataFrame(values, columns=names)
+    df.insert(0, 'Year', years)
+    for col in names:
+        city, country = col.rsplit(',', 1)
+        records = []
+        for yr, val in zip(df['Year'], df[col]):
+            value = None if pd.isna(val) else float(val)
+            records.append({"year": int(yr), "value": value})
+        out_obj = {"city": city.strip(), "country": country.strip(), "data": records}
+        filename = split_cities.city_filename(city.strip(), country.strip())
+        with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(out_obj, f, ensure_ascii=False, indent=2)
+
+
+def encode_only(names, years, values, indent):
+    """Encode every document without touching the disk; returns the bytes produced"""
+    template = split_cities.DocumentTemplate(years, indent)
+    total = 0
+    for start in range(0, len(names), split_cities.encode_chunk):
+        batch = list(range(start, min(start + split_cities.encode_chunk, len(names))))
+        for col, tokens in zip(batch, split_cities.encode_rows(values[:, batch].T)):
+            city, country = names[col].rsplit(', ', 1)
+            total += len(template.render(city, country, tokens))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, nargs='+', default=[500, 2000, 8000])
+    parser.add_argument('--years', type=int, default=1000)
+    parser.add_argument('--compact', action='store_true', help='Non-indented output')
+    parser.add_argument('--encode-only', action='store_true', help='Skip file writes (for very large runs)')
+    parser.add_argument('--legacy-max', type=int, default=2000, help='Largest catalogue timed with the old loop')
+    args = parser.parse_args()
+    indent = None if args.compact else 2
+
+    print(f"encoder: {'orjson' if split_cities.orjson else 'json'}, "
+          f"{'compact' if args.compact else 'indent=2'}, {args.years} years")
+    print(f"{'cities':>8} {'cells':>12} {'seconds':>9} {'ns/cell':>9} {'MB out':>9}   baseline")
+    for n_cities in args.cities:
+        names, years, values = synthetic_matrix(n_cities, args.years)
+        cells = values.size
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            if args.encode_only:
+                size = encode_only(names, years, values, indent)
+            else:
+                size = split_cities.export_city_json(names, years, values, tmp, indent=indent)
+            seconds = time.perf_counter() - start
+
+        baseline = ''
+        if not args.encode_only and n_cities <= args.legacy_max:
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                legacy_export(names, years, values, tmp)
+                legacy = time.perf_counter() - start
+            baseline = f"legacy loop {legacy:.2f}s ({legacy / seconds:.1f}x slower)"
+        print(f"{n_cities:>8} {cells:>12} {seconds:>9.2f} {seconds / cells * 1e9:>9.1f} "
+              f"{size / 1e6:>9.1f}   {baseline}")
+
+
+if __name__ == '__main__':
+    main()
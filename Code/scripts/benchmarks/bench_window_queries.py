@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the year-window queries of aqs_core.window_queries
+
+Builds a synthetic year x city matrix (~5% missing values) and times random
+[start, end] window queries (mean, min/max, change %) plus a top-k ranking
+with WindowIndex against the naive approach: slicing every city's series
+and reducing it with the nan-aware numpy functions, then sorting. The
+one-off cost of building the index is reported separately.
+
+Usage:
+    python bench_window_queries.py --cities 419 5000 --years 173
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, SCRIPTS_DIR)
+
+from aqs_core.window_queries import WindowIndex
+
+
+def synthetic_matrix(n_cities, n_years, seed=0):
+    rng = np.random.default_rng(seed)
+    years = np.arange(1850, 1850 + n_years)
+    values = rng.gamma(2.0, 15.0, size=(n_years, n_cities))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    names = [f"City {i}, Country {i % 200}" for i in range(n_cities)]
+    return names, years, values
+
+
+def naive_query(names, years, values, start, end, k):
+    """Per-city slicing, as the visualizer does for one city"""
+    results = []
+    for col, name in enumerate(names):
+        series = values[(years >= start) & (years <= end), col]
+        series = series[~np.isnan(series)]
+        if len(series) == 0:
+            continue
+        change = (series[-1] - series[0]) / series[0] * 100 if series[0] != 0 else np.nan
+        results.append((name, np.mean(series), np.min(series), np.max(series), change))
+    return sorted(results, key=lambda r: r[1])[:k]
+
+
+def index_query(index, start, end, k):
+    lo, hi = index.rows(start, end)
+    index.min(lo, hi), index.max(lo, hi), index.change_percent(lo, hi)
+    return index.top('mean', start, end, k, largest=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, nargs='+', default=[419, 5000, 20000])
+    parser.add_argument('--years', type=int, default=173)
+    parser.add_argument('--queries', type=int, default=200, help='Random windows per run')
+    parser.add_argument('-k', '--top', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{args.years} years, {args.queries} random windows, top {args.top} by mean")
+    print(f"{'cities':>8} {'build s':>9} {'index ms/q':>11} {'naive ms/q':>11} {'speedup':>8}")
+    for n_cities in args.cities:
+        names, years, values = synthetic_matrix(n_cities, args.years)
+        windows = [tuple(sorted(rng.integers(years[0], years[-1] + 1, 2))) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        index = WindowIndex(years, values, names)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for lo, hi in windows:
+            fast = index_query(index, lo, hi, args.top)
+        fast_ms = (time.perf_counter() - start) / len(windows) * 1e3
+
+        naive_windows = windows[:max(1, len(windows) // 10)]
+        start = time.perf_counter()
+        for lo, hi in naive_windows:
+            slow = naive_query(names, years, values, lo, hi, args.top)
+        slow_ms = (time.perf_counter() - start) / len(naive_windows) * 1e3
+
+        # Same ranking for the last window both ways
+        assert [name for name, _ in index_query(index, *naive_windows[-1], args.top)] == [r[0] for r in slow]
+        print(f"{n_cities:>8} {build:>9.3f} {fast_ms:>11.3f} {slow_ms:>11.2f} {slow_ms / fast_ms:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
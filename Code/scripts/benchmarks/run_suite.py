@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the pipeline on synthetic data, with a JSON history
+
+Generates (or reuses) a synthetic dataset of the chosen size with
+synthetic.py, then runs every stage in a fresh Python process and records:
+- seconds: wall time of the stage itself (best of --repeat runs)
+- setup_seconds: imports and input preparation, not included above
+- peak_rss_mb: peak resident memory of the stage's process
+- output_bytes: size of everything the stage wrote (inputs it copied are not counted)
+
+Stages:
+- split_cities: CSV -> one JSON file per city + memory-mapped store (--full)
+- extract_pm25_2022: NetCDF grid -> JSON point list of the last year
+- static_chart: create_static_chart + PNG for --charts cities
+- plain_stripes: NumPy-only 1200x200 stripe PNG (aqs_core.stripe_raster) of every city
+- stripe_atlas: build_stripe_atlas.py, every city's stripe in one PNG + JSON index
+- animation: one mp4_with_bubbles render (pipe engine) of the first city
+- coordinate_matcher: parse worldcities + match every city of the CSV
+- list_cities, city_stats: the "python -m aqs_core" look-ups, run as a new
+  interpreter under python -X importtime; import_ms is the time spent in
+  imports after interpreter start-up (site), the heaviest are listed
+
+Each run is appended to the history file together with the dataset size,
+the git commit and the platform, and compared with the last earlier run of
+the same size: changes beyond --tolerance are flagged, and --check makes
+the script exit with status 1 when a stage got slower or bigger.
+
+Usage:
+    python run_suite.py --size small
+    python run_suite.py --size medium --stages split_cities animation --repeat 3
+    python run_suite.py --cities 5000 --years 1000 --grid-step 0.1 --label "orjson" --check
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+from aqs_core.trace import peak_rss_mb
+
+HISTORY_FILE = os.path.join(BENCH_DIR, 'history.json')
+SIZES = {
+    'small': {'cities': 200, 'years': 173, 'grid_step': 1.0, 'grid_years': 3, 'worldcities': 5000},
+    'medium': {'cities': 2000, 'years': 173, 'grid_step': 0.25, 'grid_years': 5, 'worldcities': 20000},
+    'large': {'cities': 20000, 'years': 1000, 'grid_step': 0.1, 'grid_years': 5, 'worldcities': 50000},
+}
+METRICS = ('seconds', 'peak_rss_mb', 'output_bytes', 'import_ms')
+# Changes smaller than this are timer noise, whatever their relative size
+NOISE = {'seconds': 0.05, 'peak_rss_mb': 5, 'output_bytes': 0, 'import_ms': 10}
+
+
+# —— Stages ——
+# Each stage prepares its inputs (untimed) and returns the function to time,
+# which may return extra measurements. Stages run in their own process, so
+# imports and memory do not carry over.
+
+def stage_split_cities(data_dir, out_dir, options):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-animation'))
+    import split_cities
+    from synthetic import CSV_FILE
+
+    def run():
+        split_cities.split_cities(os.path.join(data_dir, CSV_FILE), os.path.join(out_dir, 'cities_json'),
+                                  os.path.join(out_dir, 'cities_store'), os.path.join(out_dir, 'state.json'),
+                                  full=True)
+    return run
+
+
+def stage_extract_pm25_2022(data_dir, out_dir, options):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'Dashboard'))
+    import extract_pm25_2022
+    from synthetic import GRID_FILE, LAST_YEAR
+
+    def run():
+        if not extract_pm25_2022.extract_pm25_2022(os.path.join(data_dir, GRID_FILE),
+                                                   os.path.join(out_dir, 'pm25_data.json'), year=LAST_YEAR):
+            raise RuntimeError("extract_pm25_2022 failed")
+    return run
+
+
+def stage_static_chart(data_dir, out_dir, options):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-static-ui'))
+    import numpy as np
+    import pandas as pd
+    import stripe_chart
+    from synthetic import CSV_FILE
+
+    frame = pd.read_csv(os.path.join(data_dir, CSV_FILE))
+    years = frame['Year'].to_numpy()
+    birth_year = max(int(years[0]), stripe_chart.MAX_YEAR - 80)
+    series = []
+    for name in frame.columns[1:options['charts'] + 1]:
+        try:
+            series.append((name,) + stripe_chart.series_from_birth(years, frame[name].to_numpy(dtype=np.float64),
+                                                                   birth_year))
+        except ValueError:
+            continue
+
+    def run():
+        for name, chart_years, values in series:
+            fig = stripe_chart.create_static_chart(name, chart_years, values, birth_year)
+            fig.savefig(os.path.join(out_dir, stripe_chart.chart_filename(name, birth_year, chart_years[-1])),
+                        dpi=150)
+    return run
+
+
+def stage_plain_stripes(data_dir, out_dir, options):
+    import numpy as np
+    from aqs_core import stripe_raster
+    from synthetic import CSV_FILE
+
+    # Missing values are empty fields, read as NaN
+    values = np.genfromtxt(os.path.join(data_dir, CSV_FILE), delimiter=',', skip_header=1)[:, 1:]
+
+    def run():
+        for i in range(values.shape[1]):
+            pixels = stripe_raster.rasterize(values[:, i], 1200, 200)
+            stripe_raster.write_png(os.path.join(out_dir, f"{i}.png"), pixels)
+    return run
+
+
+def stage_stripe_atlas(data_dir, out_dir, options):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'Dashboard'))
+    import build_stripe_atlas
+    from synthetic import CSV_FILE
+
+    def run():
+        build_stripe_atlas.build_atlas(os.path.join(data_dir, CSV_FILE), out_dir)
+    return run
+
+
+def stage_animation(data_dir, out_dir, options):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-animation'))
+    import mp4_with_bubbles as mp4
+    from synthetic import JSON_DIR
+
+    mp4.cities_json_dir = os.path.join(data_dir, JSON_DIR)
+    mp4.cities_store_dir = os.path.join(out_dir, 'no_store')
+    city = mp4.list_cities()[0]
+
+    def run():
+        result = mp4.render_city(city, out_dir, force=True)
+        if result['status'] != 'ok':
+            raise RuntimeError(result.get('error', result['status']))
+    return run
+
+
+def stage_coordinate_matcher(data_dir, out_dir, options):
+    import csv
+    from aqs_core import city_store
+    from aqs_core.city_matcher import CoordinateMatcher, load_worldcities
+    from synthetic import CSV_FILE, WORLDCITIES_FILE
+
+    # Matched against a copy, so the parsed cache is written to out_dir and always rebuilt
+    worldcities = os.path.join(out_dir, WORLDCITIES_FILE)
+    shutil.copyfile(os.path.join(data_dir, WORLDCITIES_FILE), worldcities)
+    with open(os.path.join(data_dir, CSV_FILE), encoding='utf-8-sig') as f:
+        names = next(csv.reader(f))[1:]
+    pairs = [city_store.split_name(name) for name in names]
+
+    def run():
+        matcher = CoordinateMatcher(load_worldcities(worldcities))
+        for city, country in pairs:
+            matcher.match(city, country)
+    return run
+
+
+def parse_importtime(stderr, top=5):
+    """Total milliseconds of the top-level imports after site, and the heaviest of them"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line.split('|')
+        # Nested imports are indented under their importer
+        if cumulative.strip().isdigit() and not module.startswith('  ') and module.strip() != 'site':
+            imports.append((int(cumulative) / 1000, module.strip()))
+    imports.sort(reverse=True)
+    return sum(ms for ms, _ in imports), {module: round(ms, 1) for ms, module in imports[:top]}
+
+
+def run_cli(args, cwd):
+    """Wall time, imports and peak memory of one command-line run in a new interpreter"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime'] + args, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    stderr = proc.stderr.read()
+    # wait4 gives the resource usage of this child alone (its peak includes
+    # this process's size at spawn time, which is why these stages import little)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    proc.stderr.close()
+    if proc.returncode != 0:
+        raise RuntimeError(stderr.strip().splitlines()[-1])
+    import_ms, heaviest = parse_importtime(stderr)
+    peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {'seconds': seconds, 'import_ms': import_ms, 'imports': heaviest, 'peak_rss_mb': peak}
+
+
+def _aqs_core_stage(command):
+    def stage(data_dir, out_dir, options):
+        from synthetic import CSV_FILE
+        base = [os.path.join(SCRIPTS_DIR, 'aqs_core'), '--store', os.path.join(out_dir, 'cities_store'),
+                '--csv', os.path.join(data_dir, CSV_FILE)]
+        # The first stats call builds the store (with pandas); the timed run reads it
+        first = next(csv_names(os.path.join(data_dir, CSV_FILE)))
+        subprocess.run([sys.executable] + base + ['stats', first], cwd=out_dir, capture_output=True, check=True)
+        args = base + (['list', '--count'] if command == 'list' else ['stats', first])
+        return lambda: run_cli(args, out_dir)
+    return stage
+
+
+def csv_names(path):
+    import csv
+    with open(path, encoding='utf-8-sig') as f:
+        return iter(next(csv.reader(f))[1:])
+
+
+STAGES = {
+    'split_cities': stage_split_cities,
+    'extract_pm25_2022': stage_extract_pm25_2022,
+    'static_chart': stage_static_chart,
+    'plain_stripes': stage_plain_stripes,
+    'stripe_atlas': stage_stripe_atlas,
+    'animation': stage_animation,
+    'coordinate_matcher': stage_coordinate_matcher,
+    'list_cities': _aqs_core_stage('list'),
+    'city_stats': _aqs_core_stage('stats'),
+}
+
+
+def output_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def run_stage(name, data_dir, out_dir, options):
+    """Body of the child process: prints the measurements of one stage as JSON"""
+    import warnings
+    warnings.filterwarnings('ignore')
+    start = time.perf_counter()
+    run = STAGES[name](data_dir, out_dir, options)
+    setup = time.perf_counter() - start
+    prepared = output_bytes(out_dir)
+    quiet = open(os.devnull, 'w')
+    stdout, sys.stdout = sys.stdout, quiet
+    try:
+        start = time.perf_counter()
+        extra = run()
+        seconds = time.perf_counter() - start
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+    result = {'seconds': seconds, 'setup_seconds': setup, 'peak_rss_mb': peak_rss_mb(),
+              'output_bytes': output_bytes(out_dir) - prepared}
+    result.update(extra or {})
+    print(json.dumps(result))
+
+
+def measure(name, data_dir, options, repeat):
+    """Best wall time and highest peak memory of repeat runs, each in a new process and output folder"""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as out_dir:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-stage', name,
+                                   '--data-dir', data_dir, '--out-dir', out_dir,
+                                   '--options', json.dumps(options)],
+                                  cwd=out_dir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {'error': (proc.stderr.strip().splitlines() or ['exit status %d' % proc.returncode])[-1]}
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r['seconds'])
+    best['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+    best['runs'] = [round(r['seconds'], 4) for r in runs]
+    return best
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return proc.stdout.strip() or None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def previous_result(history, dataset, options, name):
+    """Last recorded result of a stage on a dataset of the same size, with the same options"""
+    for record in reversed(history):
+        if record.get('dataset') == dataset and record.get('options') == options and name in record['stages']:
+            return record['stages'][name]
+    return None
+
+
+def format_metric(metric, value):
+    if metric == 'output_bytes':
+        return f"{value / 1024 / 1024:.2f} MB"
+    if metric == 'peak_rss_mb':
+        return f"{value:.0f} MB"
+    if metric == 'import_ms':
+        return f"{value:.0f} ms"
+    return f"{value:.3f}s"
+
+
+def compare(results, history, dataset, options, tolerance):
+    """Print every stage next to its previous run; returns the names of the regressed stages"""
+    regressed = []
+    print(f"\n{'stage':<20} {'seconds':>10} {'peak RSS':>10} {'output':>11} {'imports':>8}   vs previous")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<20} failed: {result['error']}")
+            regressed.append(name)
+            continue
+        line = (f"{name:<20} {format_metric('seconds', result['seconds']):>10} "
+                f"{format_metric('peak_rss_mb', result['peak_rss_mb']):>10} "
+                f"{format_metric('output_bytes', result['output_bytes']):>11} "
+                f"{format_metric('import_ms', result['import_ms']) if 'import_ms' in result else '':>8}  ")
+        before = previous_result(history, dataset, options, name)
+        if before is None or 'error' in before:
+            print(line + " (no previous run)")
+            continue
+        changes = []
+        for metric in METRICS:
+            if not before.get(metric) or metric not in result:
+                continue
+            change = result[metric] / before[metric] - 1
+            flag = ''
+            if change > tolerance and result[metric] - before[metric] > NOISE[metric]:
+                flag = '!'
+                if name not in regressed:
+                    regressed.append(name)
+            changes.append(f"{metric} {change:+.1%}{flag}")
+        print(line + ' ' + ', '.join(changes))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='Preset dataset size')
+    for key, kind in (('cities', int), ('years', int), ('grid_step', float), ('grid_years', int),
+                      ('worldcities', int)):
+        parser.add_argument('--' + key.replace('_', '-'), dest=key, type=kind, default=None,
+                            help='Override the preset')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--charts', type=int, default=20, help='Charts rendered by static_chart')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is kept')
+    parser.add_argument('--data-dir', default=None,
+                        help='Dataset folder, reused when it holds a dataset of the same size (default: temporary)')
+    parser.add_argument('--history', default=HISTORY_FILE, help='JSON history file (default: %(default)s)')
+    parser.add_argument('--label', default=None, help='Note stored with the run, e.g. the change being measured')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative change flagged as a regression (default: %(default)s)')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 on a regression')
+    parser.add_argument('--no-save', action='store_true', help='Do not append the run to the history')
+    # Internal: run a single stage in this process
+    parser.add_argument('--run-stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--out-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--options', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.data_dir, args.out_dir, json.loads(args.options))
+        return 0
+
+    import synthetic
+    sizes = dict(SIZES[args.size])
+    sizes.update({key: getattr(args, key) for key in sizes if getattr(args, key) is not None})
+    temporary = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        temporary = tempfile.TemporaryDirectory(prefix='bench_data_')
+        data_dir = temporary.name
+    try:
+        dataset = synthetic.generate(os.path.abspath(data_dir), **sizes)
+        options = {'charts': args.charts}
+        results = {}
+        for name in args.stages:
+            print(f"Running {name}...", flush=True)
+            results[name] = measure(name, os.path.abspath(data_dir), options, args.repeat)
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    history = load_history(args.history)
+    regressed = compare(results, history, dataset, options, args.tolerance)
+    record = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'commit': git_commit(),
+        'platform': {'python': platform.python_version(), 'system': platform.platform(),
+                     'cpus': os.cpu_count()},
+        'dataset': dataset,
+        'options': options,
+        'stages': results,
+    }
+    if not args.no_save:
+        history.append(record)
+        with open(args.history, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=2)
+        print(f"\nAppended to {args.history} ({len(history)} runs)")
+    if regressed:
+        print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+    return 1 if args.check and regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
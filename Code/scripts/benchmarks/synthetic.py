@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Synthetic datasets shaped like the inputs of the pipeline
+
+Every generator is deterministic for a given seed, so datasets of the same
+size are identical across runs and machines:
+- worldcities.csv: a worldcities-style table (city, city_ascii, country,
+  admin_name, lat, lng, population) of made-up, pronounceable names
+- V1pt6_Cities_Data_PM2pt5.csv: the year x city matrix (a Year column plus
+  one "City, Country" column per city, ~5% missing values). The cities are
+  drawn from the worldcities table, a share of them with a typo or an
+  unknown name, so the coordinate matcher has fuzzy and failed lookups to do
+- cities_json/: one JSON file per city, as written by split_cities.py
+- pm25_grid.nc: a global (time, lat, lon) PM2.5 grid at a given resolution,
+  yearly time steps in "days since" units, NaN over blocky "oceans"
+
+Usage:
+    python synthetic.py /tmp/aqs_data --cities 2000 --years 173 --grid-step 0.25
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+# pandas and split_cities are imported by the generators that need them, so
+# the light benchmark stages can read the file names below for free
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'air-quality-animation'))
+
+CSV_FILE = 'V1pt6_Cities_Data_PM2pt5.csv'
+JSON_DIR = 'cities_json'
+GRID_FILE = 'pm25_grid.nc'
+WORLDCITIES_FILE = 'worldcities.csv'
+PARAMS_FILE = 'dataset.json'
+
+LAST_YEAR = 2022
+N_COUNTRIES = 200
+SYLLABLES = ['ka', 'lo', 'ma', 'ri', 'an', 'be', 'do', 'sa', 'ten', 'vi', 'ur', 'no', 'gal', 'pe', 'zu',
+             'ho', 'lin', 'mar', 'os', 'ta', 'qui', 'ber', 'e', 'ya', 'shi', 'ro', 'nd', 'ville', 'burg', 'port']
+
+
+def made_up_names(rng, n, min_syllables=2, max_syllables=4):
+    """n distinct capitalized names built from SYLLABLES"""
+    names = []
+    seen = set()
+    while len(names) < n:
+        count = rng.integers(min_syllables, max_syllables + 1, size=n)
+        picks = rng.integers(0, len(SYLLABLES), size=(n, max_syllables))
+        for k, row in zip(count, picks):
+            name = ''.join(SYLLABLES[i] for i in row[:k]).capitalize()
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+                if len(names) == n:
+                    break
+    return names
+
+
+def typo(rng, name):
+    """name with one letter dropped, doubled or swapped with its neighbour"""
+    i = int(rng.integers(1, len(name) - 1))
+    kind = rng.integers(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def worldcities_table(n_rows, seed=0):
+    """DataFrame in the layout of worldcities.csv"""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    countries = made_up_names(rng, N_COUNTRIES, 2, 3)
+    cities = made_up_names(rng, n_rows)
+    return pd.DataFrame({
+        'city': cities,
+        'city_ascii': cities,
+        'country': [countries[i] for i in rng.integers(0, N_COUNTRIES, size=n_rows)],
+        'admin_name': [f"Province {i}" for i in rng.integers(0, 50, size=n_rows)],
+        'lat': np.round(rng.uniform(-60, 70, size=n_rows), 4),
+        'lng': np.round(rng.uniform(-180, 180, size=n_rows), 4),
+        'population': np.round(rng.lognormal(10, 2, size=n_rows)),
+    })
+
+
+def city_columns(worldcities, n_cities, seed=0, typo_share=0.15, unknown_share=0.05):
+    """"City, Country" names drawn from the worldcities table, some misspelled or unknown"""
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.choice(len(worldcities), size=n_cities, replace=False)
+    kinds = rng.random(n_cities)
+    unknown = iter(made_up_names(np.random.default_rng(seed + 2), n_cities, 5, 5))
+    names = []
+    seen = set()
+    for row, kind in zip(rows, kinds):
+        city, country = worldcities['city'].iat[row], worldcities['country'].iat[row]
+        if kind < unknown_share:
+            city = next(unknown)
+        elif kind < unknown_share + typo_share and len(city) > 4:
+            city = typo(rng, city)
+        name = f"{city}, {country}"
+        # Duplicate columns are not possible in the CSV
+        names.append(name if name not in seen else f"{worldcities['city'].iat[row]}, {country}")
+        seen.add(names[-1])
+    return names
+
+
+def series_matrix(n_cities, n_years, seed=0):
+    """Year axis ending in LAST_YEAR and a year x city matrix of plausible PM2.5 series"""
+    rng = np.random.default_rng(seed)
+    years = np.arange(LAST_YEAR - n_years + 1, LAST_YEAR + 1)
+    level = rng.gamma(2.0, 12.0, size=n_cities)
+    trend = np.linspace(0.6, 1.4, n_years)[:, None] ** rng.normal(1.0, 0.5, size=n_cities)
+    noise = rng.normal(1.0, 0.08, size=(n_years, n_cities))
+    values = np.round(np.clip(level * trend * noise, 0.5, None), 8)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    return years, values
+
+
+def write_cities_csv(path, names, years, values):
+    import pandas as pd
+    frame = pd.DataFrame(values, columns=names)
+    frame.insert(0, 'Year', years)
+    frame.to_csv(path, index=False)
+
+
+def write_grid(path, grid_step, n_steps, seed=0):
+    """Global (time, lat, lon) NetCDF grid at grid_step degrees, one step per year up to LAST_YEAR"""
+    import netCDF4 as nc
+    rng = np.random.default_rng(seed)
+    n_lats, n_lons = int(round(180 / grid_step)), int(round(360 / grid_step))
+    lats = -90 + grid_step * (np.arange(n_lats) + 0.5)
+    lons = -180 + grid_step * (np.arange(n_lons) + 0.5)
+    field = 20 + 15 * np.sin(np.radians(lats))[:, None] * np.cos(np.radians(2 * lons))[None, :]
+    block = max(1, int(round(3 / grid_step)))
+    ocean = rng.random((n_lats // block + 1, n_lons // block + 1)) < 0.4
+    ocean = np.kron(ocean, np.ones((block, block), dtype=bool))[:n_lats, :n_lons]
+    with nc.Dataset(path, 'w') as dataset:
+        dataset.createDimension('time', n_steps)
+        dataset.createDimension('lat', n_lats)
+        dataset.createDimension('lon', n_lons)
+        time_var = dataset.createVariable('time', 'f8', ('time',))
+        time_var.units = 'days since 1900-01-01'
+        time_var.calendar = 'standard'
+        first = LAST_YEAR - n_steps + 1
+        time_var[:] = [(np.datetime64(f"{year}-07-01") - np.datetime64('1900-01-01')).astype(int)
+                       for year in range(first, LAST_YEAR + 1)]
+        dataset.createVariable('lat', 'f4', ('lat',))[:] = lats
+        dataset.createVariable('lon', 'f4', ('lon',))[:] = lons
+        pm25 = dataset.createVariable('PM25', 'f4', ('time', 'lat', 'lon'), fill_value=np.float32(-999),
+                                      zlib=False)
+        pm25.units = 'ug/m3'
+        for step in range(n_steps):
+            values = np.clip(field * (0.9 + 0.05 * step) + rng.gamma(2.0, 4.0, size=field.shape), 0, None)
+            values[ocean] = np.nan
+            pm25[step] = np.ma.masked_invalid(values).astype(np.float32)
+
+
+def generate(data_dir, cities, years, grid_step, grid_years, worldcities, seed=0, log=print):
+    """
+    Write every synthetic input under data_dir, unless a dataset of the same
+    parameters is already there. Returns the parameters.
+    """
+    import split_cities
+    params = {'cities': cities, 'years': years, 'grid_step': grid_step, 'grid_years': grid_years,
+              'worldcities': max(worldcities, cities), 'seed': seed}
+    params_path = os.path.join(data_dir, PARAMS_FILE)
+    if os.path.exists(params_path):
+        with open(params_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == params:
+                log(f"Reusing the dataset in {data_dir}")
+                return params
+    os.makedirs(data_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    table = worldcities_table(params['worldcities'], seed)
+    table.to_csv(os.path.join(data_dir, WORLDCITIES_FILE), index=False)
+    names = city_columns(table, cities, seed)
+    year_axis, values = series_matrix(cities, years, seed)
+    write_cities_csv(os.path.join(data_dir, CSV_FILE), names, year_axis, values)
+    split_cities.export_city_json(names, year_axis, values, os.path.join(data_dir, JSON_DIR))
+    write_grid(os.path.join(data_dir, GRID_FILE), grid_step, grid_years, seed)
+    with open(params_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
+    log(f"Generated {cities} cities x {years} years, a {grid_step} degree grid x {grid_years} years "
+        f"and {params['worldcities']} worldcities rows in {time.perf_counter() - start:.1f}s")
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir', help='Output folder')
+    parser.add_argument('--cities', type=int, default=200, help='City columns')
+    parser.add_argument('--years', type=int, default=173, help='Years per city series')
+    parser.add_argument('--grid-step', type=float, default=1.0, help='Grid resolution in degrees')
+    parser.add_argument('--grid-years', type=int, default=3, help='Yearly time steps of the grid')
+    parser.add_argument('--worldcities', type=int, default=5000, help='Rows of the worldcities table')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.data_dir, args.cities, args.years, args.grid_step, args.grid_years, args.worldcities, args.seed)
+
+
+if __name__ == '__main__':
+    main()